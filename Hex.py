@@ -23,10 +23,32 @@ It will record all moves and the end state of the game. Check
 the documentation pdf for more details.
 * "-switch" or "-s" will invert the order of agents playing. Use
 this argument to quickly test your agent as Blue instead of Red.
+* "metrics=path" saves per-move latency, traffic and engine overhead
+metrics at the end of the match. Paths ending in .prom are written in
+the Prometheus text format, anything else gets one JSON line per match.
+* "clock=wall", "clock=cpu" or "clock=both" selects the time agents are
+charged against their 5 minutes: the wall time they take to answer (the
+default), the CPU time their processes use, or both, where whichever
+runs out first loses. The CPU clock keeps results fair on a busy host,
+but it is only as precise as the kernel's clock tick. Both times are
+reported at the end of the match either way.
+* "cpus=0-1:2-3" pins the first agent to cores 0-1 and the second to
+2-3, "cpus=0-3" pins both to the same cores. Agents are told to use that
+many threads through HEX_THREADS unless "threads=n" says otherwise.
+* "memory=2G" caps the address space of every agent process.
+* "nice=n" runs the agents at niceness n.
+* "port=n" serves the match on port n instead of 1234, so matches can run
+side by side. Agents find it in HEX_PORT. src/Tournament.py uses all of
+these to run a tournament several matches at a time.
+* "-forkserver" or "-fs" forks Python agents from a server that has
+already imported them, instead of starting a new interpreter each match.
+See src/Launcher.py.
+
+The match runs in this interpreter, so each game pays for one Python
+startup rather than two.
 """
-import shlex
-import subprocess
-from sys import argv, platform
+import sys
+from sys import argv
 from os.path import realpath, sep
 
 def extract_agents(arguments):
@@ -42,7 +64,7 @@ def extract_agents(arguments):
         if ("a=" in argument or "-agent" in argument):
             try:
                 name, cmd = argument.split("=")[1].split(";")
-                agents.append(f'"{argument}"')
+                agents.append(argument)
             except Exception:
                 print(f"Agent '{argument}' is not in correct format.")
         else:
@@ -50,25 +72,9 @@ def extract_agents(arguments):
     return (agents, other_args[1:])
 
 
-def get_main_cmd():
-    """Checks the OS to specify python or python3 and creates a relative path
-    command to src/main.py.
-    """
-
-    main_cmd = "python"
-    if (platform != "win32"):
-        main_cmd += "3"
-
-    main_path = sep.join(realpath(__file__).split(sep)[:-1])
-    main_path += f"{sep}src{sep}main.py"
-
-    main_cmd += " " + main_path
-    return main_cmd
-
-
 def main():
     """Checks that at most two agents are specified and that they
-    are unique, then runs the main script with the given args.
+    are unique, then runs src/main.py in this process with the given args.
     """
 
     agents, arguments = extract_agents(argv)
@@ -78,15 +84,11 @@ def main():
     elif (len(agents) != len(set(agents))):
         print("ERROR: Agent strings must be unique. Aborted.")
 
-    cmd = (
-        get_main_cmd() + " " +
-        " ".join(arguments) + " " +
-        " ".join(agents)
-    )
-    if (platform != "win32"):
-        cmd = shlex.split(cmd)
+    src_path = sep.join(realpath(__file__).split(sep)[:-1]) + f"{sep}src"
+    sys.path.insert(0, src_path)
+    import main as match
 
-    subprocess.run(cmd)
+    match.main([f"{src_path}{sep}main.py"] + arguments + agents)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import socket
+from os import environ
 from random import choice
 from time import sleep
 
@@ -9,7 +10,7 @@ class NaiveAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(environ.get("HEX_PORT", 1234))
 
     def run(self):
         """A finite-state machine that cycles through waiting for input
@@ -21,6 +22,7 @@ class NaiveAgent():
         self._colour = ""
         self._turn_count = 1
         self._choices = []
+        self._buffer = ""
         
         states = {
             1: NaiveAgent._connect,
@@ -49,7 +51,7 @@ class NaiveAgent():
         answers if it is Red or waits if it is Blue.
         """
         
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._read_message().split(";")
         if (data[0] == "START"):
             self._board_size = int(data[1])
             for i in range(self._board_size):
@@ -86,7 +88,7 @@ class NaiveAgent():
 
         self._turn_count += 1
 
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._read_message().split(";")
         if (data[0] == "END" or data[-1] == "END"):
             return 5
         else:
@@ -102,6 +104,21 @@ class NaiveAgent():
 
         return 4
 
+    def _read_message(self):
+        """Returns the next newline-terminated message from the socket.
+        Several messages can arrive in one read, so the rest are kept
+        for the following calls. Returns "END" if the socket closes.
+        """
+
+        while ("\n" not in self._buffer):
+            data = self._s.recv(1024)
+            if (not data):
+                return "END"
+            self._buffer += data.decode("utf-8")
+
+        message, self._buffer = self._buffer.split("\n", 1)
+        return message.strip()
+
     def _close(self):
         """Closes the socket."""
 
@@ -0,0 +1,86 @@
+import socket
+from os import environ
+from random import Random
+from sys import argv
+
+
+class StubAgent():
+    """This class describes an agent that answers instantly, used to
+    benchmark the engine. Like the default agent it plays random valid
+    moves, but it draws them from a shuffled list of cells and skips the
+    taken ones, so each move is O(1) amortised. It never swaps. An
+    optional "seed=n" argument makes its games repeatable.
+    """
+
+    HOST = "127.0.0.1"
+    PORT = int(environ.get("HEX_PORT", 1234))
+
+    def __init__(self, seed=None):
+        self._random = Random(seed)
+
+    def run(self):
+        """Reads newline separated messages and answers whenever it is
+        its turn, until the game ends.
+        """
+
+        self._s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._s.connect((StubAgent.HOST, StubAgent.PORT))
+
+        buffer = ""
+        while (True):
+            data = self._s.recv(1024)
+            if (not data):
+                break
+            buffer += data.decode("utf-8")
+            while ("\n" in buffer):
+                line, buffer = buffer.split("\n", 1)
+                if (not self._handle(line.strip().split(";"))):
+                    self._s.close()
+                    return
+        self._s.close()
+
+    def _handle(self, data):
+        """Handles one message. Returns False once the game is over."""
+
+        if (data[0] == "START"):
+            size = int(data[1])
+            self._colour = data[2]
+            self._cells = [(i, j) for i in range(size) for j in range(size)]
+            self._random.shuffle(self._cells)
+            self._taken = set()
+            if (self._colour == "R"):
+                self._make_move()
+
+        elif (data[0] == "CHANGE"):
+            if (data[1] == "SWAP"):
+                self._colour = "B" if self._colour == "R" else "R"
+            else:
+                x, y = data[1].split(",")
+                self._taken.add((int(x), int(y)))
+            if (data[-1] == "END"):
+                return False
+            if (data[-1] == self._colour):
+                self._make_move()
+
+        elif (data[0] == "END"):
+            return False
+
+        return True
+
+    def _make_move(self):
+        """Sends the next untaken cell of the shuffled list."""
+
+        move = self._cells.pop()
+        while (move in self._taken):
+            move = self._cells.pop()
+        self._taken.add(move)
+        self._s.sendall(bytes(f"{move[0]},{move[1]}\n", "utf-8"))
+
+
+if (__name__ == "__main__"):
+    seed = None
+    for argument in argv[1:]:
+        if (argument.startswith("seed=")):
+            seed = int(argument.split("=", 1)[1])
+    agent = StubAgent(seed)
+    agent.run()
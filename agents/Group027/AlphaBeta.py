@@ -2,6 +2,10 @@ from random import random
 from time import perf_counter
 from copy import deepcopy
 from BoardSupport import BoardSupport
+from CellAnalysis import CellAnalysis
+from PositionCache import PositionCache
+from Profiler import Profiler
+from VirtualConnections import VirtualConnections
 
 class AlphaBeta():
     """ This class contains the functions for Min Max Alpha Beta Pruning
@@ -12,18 +16,40 @@ class AlphaBeta():
         """ Initialisation function that sets board_size and a default evaluation function """
         self._board_size = board_size
         self.evaluate_board = self.random_board_evaluation
+        self.evaluate_leaf = self.leaf_value
 
 
-    def make_move(self, board, player, eval_fn, depth=2):
+    def make_move(self, board, player, eval_fn, depth=2, use_vc=True):
         """ Runs the Alpha Beta min max pruning using eval_fn to evaluate board states
-            upto depth """
+            upto depth. eval_fn(board, player) must return a value where higher is
+            better for player. Non-terminal values should lie within (-1, 1) so that
+            wins (1) and losses (-1) always dominate, eg. TwoDistance.evaluate_board.
+            Dead and captured cells are never searched, and with use_vc the root
+            moves are pruned by virtual connections. Leaf values are kept in the
+            PositionCache, so eval_fn must be a pure function of the position """
         # set this runs functions
         self.evaluate_board = eval_fn
+        self.evaluate_leaf = Profiler.wrap(
+            PositionCache.wrap(
+                self.leaf_value, ("alphabeta.leaf", eval_fn),
+                rotate=getattr(eval_fn, "rotate", True)
+            ),
+            "alphabeta.eval"
+        )
         self.node_count = 0
         start_time = perf_counter()
 
-        choices = BoardSupport.get_empty(board)
+        # dominated cells depend on the player to move, so only drop cells
+        # that are inferior for both players as choices are shared down the tree
+        choices = CellAnalysis.candidate_moves(board, player, BoardSupport.get_empty(board), dominated=False)
+        if use_vc:
+            choices, winning = VirtualConnections.prune_moves(board, player, choices)
+            if winning:
+                return choices[0]
         val, move = self.alpha_beta(deepcopy(board), choices, player, depth)
+        if Profiler.ENABLED:
+            Profiler.record("alphabeta.search", perf_counter() - start_time)
+            Profiler.count("alphabeta.nodes", self.node_count)
 
         #print(f"ab finish: val={val}; move={move}; nodes={self.node_count} time={perf_counter() - start_time}")
         return move
@@ -40,10 +66,8 @@ class AlphaBeta():
         # return win state or board evaluation
         # if no more possible moves or at max depth
         if depth == 0 or len(choices) == 0:
-            win = BoardSupport.check_winner(deepcopy(board))
-            if win == 0:
-                return self.evaluate_board(board, player), best_move
-            return win, best_move
+            # evaluate from Red's view as Red is maximising
+            return self.evaluate_leaf(board, "R"), best_move
 
         # maximising
         if player == "R":
@@ -91,6 +115,13 @@ class AlphaBeta():
             # return lowest found
             return best_val, best_move
 
+    def leaf_value(self, board, player):
+        """ 1 if player has won, -1 if they have lost, else the evaluation """
+        win = BoardSupport.check_winner(board)
+        if win == 0:
+            return self.evaluate_board(board, player)
+        return win if player == "R" else -win
+
     # simple random board evaluation for testing
     def random_board_evaluation(self, board, player):
         """ return value of current board according to player as float """
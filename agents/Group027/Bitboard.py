@@ -0,0 +1,164 @@
+class Bitboard():
+    """ Hex position stored as one Python int per colour.
+        Cell (i, j) is bit i * (size + 1) + j. The spare bit at the end of each
+        row keeps shifted rows from wrapping into each other, and it lines up
+        with the commas of the engine's protocol board string, so conversion is a
+        single translate.
+        Red joins row 0 to row size-1, Blue joins column 0 to column size-1. """
+
+    # protocol character -> bit character for each colour
+    RED_BITS = str.maketrans({"R": "1", "B": "0", "0": "0", ",": "0"})
+    BLUE_BITS = str.maketrans({"R": "0", "B": "1", "0": "0", ",": "0"})
+
+    # board and edge masks cached per board size
+    _masks = {}
+
+    def __init__(self, size, red=0, blue=0):
+        self.size = size
+        self.stride = size + 1
+        self.red = red
+        self.blue = blue
+        self.board_mask, self.edge_masks = Bitboard.get_masks(size)
+
+    @staticmethod
+    def get_masks(size):
+        """ Returns the mask of all cells and colour -> (front, back) edge masks """
+        masks = Bitboard._masks.get(size)
+        if masks is None:
+            stride = size + 1
+            row = (1 << size) - 1
+            board_mask = sum(row << (i * stride) for i in range(size))
+            column = sum(1 << (i * stride) for i in range(size))
+            edge_masks = {
+                "R": (row, row << ((size - 1) * stride)),
+                "B": (column, column << (size - 1))
+            }
+            masks = (board_mask, edge_masks)
+            Bitboard._masks[size] = masks
+        return masks
+
+    ### CONVERSION
+
+    @staticmethod
+    def from_string(string_input):
+        """ Loads a protocol-formatted board string, rows separated by commas """
+        size = string_input.index(",") if "," in string_input else len(string_input)
+        reverse = string_input[::-1]
+        return Bitboard(
+            size,
+            int(reverse.translate(Bitboard.RED_BITS), 2),
+            int(reverse.translate(Bitboard.BLUE_BITS), 2)
+        )
+
+    @staticmethod
+    def from_board(board):
+        """ Loads an agent board of "0"/"R"/"B" lists """
+        return Bitboard.from_string(",".join("".join(row) for row in board))
+
+    def to_string(self):
+        """ Returns the protocol-formatted board string """
+        length = self.size * self.stride - 1
+        red = format(self.red, "b").zfill(length)[::-1]
+        blue = format(self.blue, "b").zfill(length)[::-1]
+        chars = []
+        for k in range(length):
+            if red[k] == "1":
+                chars.append("R")
+            elif blue[k] == "1":
+                chars.append("B")
+            elif k % self.stride == self.size:
+                chars.append(",")
+            else:
+                chars.append("0")
+        return "".join(chars)
+
+    def to_board(self):
+        """ Returns an agent board of "0"/"R"/"B" lists """
+        return [list(line) for line in self.to_string().split(",")]
+
+    ### CELLS
+
+    def bit(self, i, j):
+        return 1 << (i * self.stride + j)
+
+    def coord(self, index):
+        """ Bit index -> (row, column) """
+        return divmod(index, self.stride)
+
+    def get(self, i, j):
+        b = self.bit(i, j)
+        if self.red & b:
+            return "R"
+        if self.blue & b:
+            return "B"
+        return "0"
+
+    def play(self, i, j, colour):
+        if colour == "R":
+            self.red |= self.bit(i, j)
+        else:
+            self.blue |= self.bit(i, j)
+
+    def copy(self):
+        return Bitboard(self.size, self.red, self.blue)
+
+    def stones(self, colour):
+        return self.red if colour == "R" else self.blue
+
+    def empty(self):
+        """ Mask of the empty cells """
+        return self.board_mask & ~(self.red | self.blue)
+
+    def cells(self, mask):
+        """ (row, column) of every set bit of mask """
+        coords = []
+        while mask:
+            low = mask & -mask
+            coords.append(divmod(low.bit_length() - 1, self.stride))
+            mask ^= low
+        return coords
+
+    def empty_cells(self):
+        return self.cells(self.empty())
+
+    ### CONNECTIVITY
+
+    def expand(self, mask):
+        """ mask grown by one step in all six directions, clipped to the board """
+        s = self.stride
+        return (mask | mask << 1 | mask >> 1 | mask << s | mask >> s
+                | mask << (s - 1) | mask >> (s - 1)) & self.board_mask
+
+    def flood(self, seed, within):
+        """ All cells of within connected to seed through within """
+        reached = seed & within
+        while True:
+            grown = self.expand(reached) & within
+            if grown == reached:
+                return reached
+            reached = grown
+
+    def connects(self, colour, stones=None):
+        """ Checks if stones (default colour's stones) join colour's two edges """
+        if stones is None:
+            stones = self.stones(colour)
+        front, back = self.edge_masks[colour]
+        return (self.flood(stones & front, stones) & back) != 0
+
+    def winner(self):
+        """ Return 1 for Red win, -1 for Blue win, 0 for no winner """
+        if self.connects("R"):
+            return 1
+        if self.connects("B"):
+            return -1
+        return 0
+
+
+if (__name__ == "__main__"):
+    bb = Bitboard.from_string(
+        "0R000B00000,0R000000000,0RBB0000000,0R000000000,0R00B000000," +
+        "0R000BB0000,0R0000B0000,0R00000B000,0R000000B00,0R0000000B0," +
+        "0R00000000B"
+    )
+    print(bb.to_string())
+    print(bb.winner(), len(bb.empty_cells()))
@@ -1,4 +1,5 @@
-from copy import deepcopy
+from Bitboard import Bitboard
+from HexTables import HexTables
 import sys
 
 class BoardSupport():
@@ -6,19 +7,13 @@ class BoardSupport():
         involving the board and coordinates
     """
 
-    # all possible neighbouring directions as coordinates of (dx, dy)
-    DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1), (-1, 1), (1, -1)]
+    # all possible neighbouring directions as coordinates of (dx, dy), clockwise from top left
+    DIRECTIONS = list(zip(HexTables.I_DISPLACEMENTS, HexTables.J_DISPLACEMENTS))
 
     @staticmethod
     def get_neighbours(board, coord):
-        """ Return list of coordinates of neighbouring cells inside board space """
-        neighbours = []
-        for dx, dy in BoardSupport.DIRECTIONS:
-            x = coord[0] + dx
-            y = coord[1] + dy
-            if x >= 0 and x < len(board) and y >= 0 and y < len(board):
-                neighbours.append((x, y))
-        return neighbours
+        """ Return shared tuple of coordinates of neighbouring cells inside board space """
+        return HexTables.get(len(board)).neighbour_coords[coord[0]][coord[1]]
             
     @staticmethod
     def get_empty(board):
@@ -35,90 +30,15 @@ class BoardSupport():
         """ Creates new empty board of (board_size x board_size) """
         return [["0"]*board_size for i in range(board_size)]
     
-    @staticmethod
-    def dfs(board, player, coord, front, back):
-        """ Depth First Search for win checking 
-            Red top->bottom
-            Blue left->right """
-        
-        i = coord[0]
-        j = coord[1]
-        
-        # print(f"dfs: i={i}; j={j}; board={board}")
-        board_size = len(board)
-
-        # success if at vertical edges for Blue
-        if (i == 0) and player == "B":
-            front = True
-        if (i == board_size - 1 and player == "B"):
-            back = True
-
-        # success if at horizontal edges for Red
-        if j == 0 and player == "R":
-            front = True
-        if j == board_size - 1 and player == "R":
-            back = True
-
-        # update board to mark where we've been
-        if board[i][j] == player:
-            board[i][j] = "#"
-        # ignore if coord to inspect has already been travelled or is empty
-        else:
-            return front, back
-
-        # iterate through checking neighbours
-        for n in BoardSupport.get_neighbours(board, (i,j)):
-            # check neighbours
-            next_front, next_back = BoardSupport.dfs(board, player, n, front, back)
-            if next_front and next_back:
-                return True, True
-
-        # no neighbours or connections to edges
-        return front, back
-
     @staticmethod
     def check_winner(board):
         """ Checks if there is a connection from one side of the board to the other
+            using bit-parallel flood fills
             Red top->bottom
             Blue left->right
             Return 1 for Red win, -1 for Blue win, 0 for no winner """
 
-        board_size = len(board)
-        end_idx = board_size - 1
-        
-        # used for static analsyis optimisation
-        empty_line = ["0"]*board_size
-        skip_horizontal = False
-        skip_vertical = False
-
-        # static analysis for speed
-        for i in range(board_size):
-            if board[i] == empty_line:
-                skip_horizontal = True
-                break
-
-        if not (skip_horizontal):
-            # iterate over top row to start dfs search
-            for i in range(board_size):
-                front, back = BoardSupport.dfs(deepcopy(board), "R", (i, 0), False, False)
-                if board[i][0] == 'R' and front and back:
-                    return 1
-        
-        # build columns as cant just grab like rows
-        for j in range(0, end_idx):
-            test_line = [row[j] for row in board]
-            if test_line == empty_line:
-                skip_vertical = True
-                break
-
-        # static analysis to optimise performance
-        if not (skip_vertical):
-            #  iterate over left column to start dfs search
-            for j in range(board_size):
-                front, back = BoardSupport.dfs(deepcopy(board), "B", (0, j), False, False)
-                if board[0][j] == 'B' and front and back:
-                    return -1
-        return 0
+        return Bitboard.from_board(board).winner()
     
     @staticmethod
     def evaluate_is_win(end_state, player):
@@ -0,0 +1,169 @@
+from HexTables import HexTables
+
+
+class CellAnalysis():
+    """ Inferior cell analysis from local patterns around each empty cell.
+        The six neighbours of a cell are coded clockwise from top left as empty
+        (0), the viewing colour (1) or the opponent (2), with off-board
+        neighbours counting as the colour owning that edge. A precomputed table
+        over all 3^6 codes says whether the cell is useless to the viewing
+        colour: every two usable neighbours that are not adjacent are already
+        joined by an arc of the colour's stones around the cell.
+
+        * dead: useless to both colours, its colour never matters
+        * captured: a pair of adjacent empty cells where each becomes dead once
+          the capturing colour answers in the other, so both can be filled in
+        * dominated: for the player to move, c is dominated by a neighbour k if
+          playing k makes c dead, as the stone at k plus a free stone at c is at
+          least as good as a stone at c alone """
+
+    # ring code -> True if the cell is useless to the viewing colour
+    USELESS = []
+
+    # colour -> board size -> per cell (base code from edges, [(weight, neighbour)])
+    _rings = {"R": {}, "B": {}}
+
+    @staticmethod
+    def build_useless():
+        table = []
+        for code in range(3 ** 6):
+            ring = [code // 3 ** k % 3 for k in range(6)]
+            usable = [k for k in range(6) if ring[k] != 2]
+            useless = True
+            for a in usable:
+                for b in usable:
+                    if b <= a or (b - a) % 6 in (1, 5):
+                        continue
+                    # walk both arcs from a to b looking for one made of stones
+                    inner = [ring[(a + s) % 6] for s in range(1, b - a)]
+                    outer = [ring[(b + s) % 6] for s in range(1, 6 - (b - a))]
+                    if not (all(v == 1 for v in inner) or all(v == 1 for v in outer)):
+                        useless = False
+            table.append(useless)
+        return table
+
+    @staticmethod
+    def get_rings(size, colour):
+        """ Per cell ring coding for colour's view, built once per board size """
+
+        rings = CellAnalysis._rings[colour].get(size)
+        if rings is None:
+            tables = HexTables.get(size)
+            rings = []
+            for c, (i, j) in enumerate(tables.coords):
+                base, on_board = 0, []
+                for k in range(HexTables.NEIGHBOUR_COUNT):
+                    n = tables.ring[c][k]
+                    if n >= 0:
+                        on_board.append((3 ** k, n))
+                        continue
+                    x = i + HexTables.I_DISPLACEMENTS[k]
+                    row_off = x < 0 or x >= size
+                    # Red owns the top and bottom edges, Blue the left and right
+                    own_edge = row_off if colour == "R" else not row_off
+                    base += 3 ** k * (1 if own_edge else 2)
+                rings.append((base, tuple(on_board)))
+            CellAnalysis._rings[colour][size] = rings
+        return rings
+
+    @staticmethod
+    def is_useless(cells, c, size, colour):
+        base, on_board = CellAnalysis.get_rings(size, colour)[c]
+        code = base
+        for weight, n in on_board:
+            v = cells[n]
+            if v == colour:
+                code += weight
+            elif v != "0":
+                code += 2 * weight
+        return CellAnalysis.USELESS[code]
+
+    @staticmethod
+    def is_dead(cells, c, size):
+        return (CellAnalysis.is_useless(cells, c, size, "R") and
+                CellAnalysis.is_useless(cells, c, size, "B"))
+
+    @staticmethod
+    def is_dead_with(cells, c, size, other, colour):
+        """ Checks if c is dead once other is given to colour """
+        previous = cells[other]
+        cells[other] = colour
+        dead = CellAnalysis.is_dead(cells, c, size)
+        cells[other] = previous
+        return dead
+
+    @staticmethod
+    def analyse(board, player):
+        """ Returns (dead, captured, dominated) for player to move, where dead is
+            a set of cells, captured maps colour -> set of cells it can fill in
+            and dominated maps a cell to the neighbour dominating it. Cells are
+            flat indices. Captured cells are filled in before the rest of the
+            analysis, repeating until nothing new is captured """
+
+        size = len(board)
+        tables = HexTables.get(size)
+        cells = [c for row in board for c in row]
+        captured = {"R": set(), "B": set()}
+
+        changed = True
+        while changed:
+            changed = False
+            for c in range(tables.cells):
+                if cells[c] != "0":
+                    continue
+                for n in tables.neighbours[c]:
+                    if n < c or cells[n] != "0":
+                        continue
+                    for colour in ["R", "B"]:
+                        if (CellAnalysis.is_dead_with(cells, c, size, n, colour) and
+                                CellAnalysis.is_dead_with(cells, n, size, c, colour)):
+                            cells[c] = cells[n] = colour
+                            captured[colour].update((c, n))
+                            changed = True
+                            break
+                    if cells[c] != "0":
+                        break
+
+        dead = set()
+        for c in range(tables.cells):
+            if cells[c] == "0" and CellAnalysis.is_dead(cells, c, size):
+                dead.add(c)
+
+        dominated = {}
+        for c in range(tables.cells):
+            if cells[c] != "0" or c in dead:
+                continue
+            for k in tables.neighbours[c]:
+                if cells[k] == "0" and k not in dead and k not in dominated:
+                    if CellAnalysis.is_dead_with(cells, c, size, k, player):
+                        dominated[c] = k
+                        break
+
+        return dead, captured, dominated
+
+    @staticmethod
+    def candidate_moves(board, player, moves=None, dominated=True):
+        """ Filters moves (default every empty cell) for player down to cells
+            that are not dead, captured or, if dominated is set, dominated for
+            player. Without dominated cells the result holds for both players.
+            Falls back to the given moves if nothing would be left """
+
+        size = len(board)
+        if moves is None:
+            moves = [(i, j) for i in range(size) for j in range(size) if board[i][j] == "0"]
+        dead, captured, dominators = CellAnalysis.analyse(board, player)
+        inferior = dead | captured["R"] | captured["B"]
+        if dominated:
+            inferior |= set(dominators.keys())
+        pruned = [m for m in moves if m[0] * size + m[1] not in inferior]
+        return pruned if pruned else moves
+
+
+CellAnalysis.USELESS = CellAnalysis.build_useless()
+
+
+if (__name__ == "__main__"):
+    board = [list(line) for line in "0R000,RR000,00B00,000B0,00000".split(",")]
+    dead, captured, dominated = CellAnalysis.analyse(board, "B")
+    print(dead, captured, dominated)
+    print(CellAnalysis.candidate_moves(board, "B"))
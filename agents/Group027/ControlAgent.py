@@ -1,12 +1,19 @@
 import socket
+from os import environ
 from random import choice
-from time import sleep, perf_counter
+from time import sleep
 from AlphaBeta import AlphaBeta
 from Resistance import Resistance
 from BoardSupport import BoardSupport
 from MCTS import MCTS
 from MoHex import MoHex
+from GTPClient import GTPError
 from Dijkstra import Dijkstra
+from Solver import Solver
+from CellAnalysis import CellAnalysis
+from OpeningBook import OpeningBook
+from TimeManager import TimeManager
+from Profiler import Profiler
 
 class ControlAgent():
     """This class describes the our ControlAgent. It interfaces with MoHex and
@@ -14,21 +21,10 @@ class ControlAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
-
-    OPENING_WEIGHTS = [
-        [0.312, 0.356, 0.318, 0.301, 0.325, 0.294, 0.297, 0.285, 0.299, 0.324, 0.573],
-        [0.449, 0.460, 0.462, 0.445, 0.414, 0.411, 0.399, 0.423, 0.464, 0.708, 0.595],
-        [0.446, 0.669, 0.656, 0.624, 0.614, 0.585, 0.569, 0.611, 0.739, 0.558, 0.404],
-        [0.583, 0.495, 0.739, 0.673, 0.653, 0.731, 0.627, 0.749, 0.627, 0.709, 0.613],
-        [0.594, 0.700, 0.609, 0.726, 0.678, 0.681, 0.748, 0.592, 0.748, 0.701, 0.549],
-        [0.574, 0.716, 0.707, 0.723, 0.723, 0.709, 0.732, 0.672, 0.706, 0.706, 0.564],
-        [0.603, 0.679, 0.730, 0.613, 0.776, 0.693, 0.705, 0.730, 0.636, 0.674, 0.597],
-        [0.607, 0.701, 0.672, 0.734, 0.638, 0.668, 0.665, 0.686, 0.726, 0.529, 0.547],
-        [0.451, 0.578, 0.729, 0.627, 0.565, 0.575, 0.604, 0.572, 0.630, 0.622, 0.431],
-        [0.611, 0.701, 0.451, 0.428, 0.414, 0.396, 0.405, 0.411, 0.443, 0.449, 0.431],
-        [0.607, 0.329, 0.315, 0.287, 0.306, 0.266, 0.260, 0.257, 0.251, 0.273, 0.301]
-    ]
+    PORT = int(environ.get("HEX_PORT", 1234))
+
+    # book moves within this win rate of the best are picked at random
+    BOOK_SPREAD = 0.02
 
     def __init__(self, board_size=11):
         self.s = socket.socket(
@@ -41,12 +37,16 @@ class ControlAgent():
         self.board = []
         self.colour = ""
         self.turn_count = 0
-        self.turn_time = 0
+        self.timer = TimeManager(board_size)
         self.ab = AlphaBeta(board_size)
         self.resistance = Resistance(board_size)
         self.mcts = MCTS(board_size)
         self.mohex = MoHex()
         self.dijkstra = Dijkstra()
+        self.solver = Solver()
+        self.book = OpeningBook.load()
+        # whether MoHex's board matches ours, only true after MoHex chose our move
+        self.mohex_synced = True
 
     def run(self):
         """Reads data until it receives an END message or the socket closes."""
@@ -57,6 +57,7 @@ class ControlAgent():
                 break
             if (self.interpret_data(data)):
                 break
+        self.mcts.stop_ponder()
 
     def interpret_data(self, data):
         """Checks the type of message and responds accordingly. Returns True
@@ -70,6 +71,7 @@ class ControlAgent():
                 self.board_size = int(s[1])
                 self.colour = s[2]
                 self.board = BoardSupport.create_board(self.board_size)
+                self.timer = TimeManager(self.board_size)
 
                 if self.colour == "R":
                     self.make_move(None, True)
@@ -95,65 +97,97 @@ class ControlAgent():
 
     def make_move(self, opp_move, opp_swapped = False):
 
+        self.timer.start()
+        Profiler.start_move()
+        # MoHex and our MCTS would fight over the cores
+        self.mcts.stop_ponder()
         use_ai_move = True
         move = None
-
-        # If first move we either need to make the first move or choose to swap
-        if self.turn_count == 0:
-            if self.colour == "B":
-                #we have the chance to swap
-                if self.OPENING_WEIGHTS[opp_move[0]][opp_move[1]] > 0.6:
-                    self.s.sendall(bytes("SWAP\n", "utf-8"))
-                    self.turn_count += 1
-                    return
-            else:
-                # we make the first move
-                move_options = []
-                for x in range(0, 11):
-                    for y in range(0, 11):
-                        if self.OPENING_WEIGHTS[x][y] > 0.7:
-                            move_options.append((x, y))
-                move = choice(move_options)
+        mohex_moved = False
+
+        # If first move as Blue we have the chance to swap
+        if self.turn_count == 0 and self.colour == "B":
+            if self.book.should_swap(self.board):
+                self.s.sendall(bytes("SWAP\n", "utf-8"))
+                Profiler.end_move(turn=self.turn_count, colour=self.colour, move="SWAP", clock=self.timer.stop())
+                self.turn_count += 1
+                self.mohex_synced = False
+                self.stop_mohex_ponder()
+                return
+
+        # play straight from the opening book while it knows the position
+        book_move = self.book.best_move(self.board, spread=self.BOOK_SPREAD)
+        if book_move is not None:
+            move = book_move
+            use_ai_move = False
 
         if use_ai_move:
             # If need to generate AI move (eg. it is not the first move)
-            start_time = perf_counter()
+            allocated = self.timer.allocate(self.board, self.colour)
             # Get shortest path across board to win
             dijkstra_path = self.dijkstra.make_path(self.board, self.colour)
 
             # If one move away from winning then play that move
             if len(dijkstra_path) == 1:
                 move = dijkstra_path[0]
-            # if we are running out of time or moves use MCTS at 3s
-            elif (self.turn_count > 60 or self.turn_time > 200):
-                move = self.mcts.make_move(self.board, self.colour, max_time=3)
+            # if we are running out of moves or clock try to prove a win, else use MCTS
+            elif (self.turn_count > 60 or self.timer.remaining() < 100):
+                move = self.solver.solve(self.board, self.colour, max_time=allocated / 3)
+                if move is None:
+                    move = self.mcts.make_move(self.board, self.colour, max_time=self.timer.budget(allocated))
             else:
                 # Else use mohex
                 try:
-                    move = self.mohex.make_move(self.colour, opp_move, opp_swapped)
+                    self.mohex.set_max_time(allocated)
+                    self.mohex.set_ponder(True)
+                    if self.mohex_synced:
+                        move = self.mohex.make_move(self.colour, opp_move, opp_swapped)
+                    else:
+                        # our board already holds the opponent's move
+                        self.mohex.set_board(self.board)
+                        move = self.mohex.make_move(self.colour, None, True)
+                    mohex_moved = move != False
                 except:
                     # If mohex crashes then use Dijkstra
                     move = False
 
                 # if mohex crashes
                 if move == False:
-                    # if close to winning then play dijkstra path
-                    if (len(dijkstra_path) <= 3):
-                        move = choice(dijkstra_path)
-                    # otherwise try mcts at 5s
+                    # if close to winning then play dijkstra path, an empty path means every path is cut
+                    if (0 < len(dijkstra_path) <= 3):
+                        move = choice(CellAnalysis.candidate_moves(self.board, self.colour, dijkstra_path))
+                    # otherwise try to prove a win then mcts with what is left of the allocation
                     else:
-                        move = self.mcts.make_move(self.board, self.colour, max_time=5)
-
-            # accumulate turn time
-            self.turn_time = perf_counter() - start_time
+                        budget = self.timer.budget(allocated)
+                        move = self.solver.solve(self.board, self.colour, max_time=budget / 3)
+                        if move is None:
+                            move = self.mcts.make_move(self.board, self.colour, max_time=self.timer.budget(allocated))
 
         # send move
         self.s.sendall(bytes(f"{move[0]},{move[1]}\n", "utf-8"))
+        Profiler.end_move(turn=self.turn_count, colour=self.colour, move=list(move), clock=self.timer.stop())
         self.board[move[0]][move[1]] = self.colour
 
+        # any move MoHex did not choose is missing from its board
+        self.mohex_synced = mohex_moved
+
+        # MoHex ponders by itself, otherwise stop it searching a stale position
+        # and grow our MCTS tree while waiting
+        if not mohex_moved:
+            self.stop_mohex_ponder()
+            self.mcts.ponder(self.board, self.opp_colour())
+
         # increment turn counter
         self.turn_count += 1
 
+    def stop_mohex_ponder(self):
+        """Turns MoHex's pondering off, unless it is restarting, in which case
+        the next move that does not come from MoHex tries again."""
+        try:
+            self.mohex.set_ponder(False)
+        except GTPError:
+            pass
+
     def _close(self):
         """Closes the socket."""
 
@@ -1,87 +1,118 @@
+import heapq
 from random import choice
+from HexTables import HexTables
+from PositionCache import PositionCache
+from Profiler import Profiler
 
 class Dijkstra():
     """Dijkstra's algorithm for finding the shortest path across the board."""
-    def make_path(self, board, colour):
+
+    # adjacency tables cached per board size
+    _tables = {}
+
+    @PositionCache.cached("dijkstra.make_path", PositionCache.map_path)
+    def make_path(self, board, colour, bridges=False):
         # opp_colour = "B" if colour == "R" else "R"
-        prev, dist, path = self.pathfind(board, colour)
+        prev, dist, path = self.pathfind(board, colour, bridges)
         return path
-    
-    def pathfind(self, board, colour):
-        start = (-1, 0) if colour == "B" else (0, -1)
-        end   = (11, 0) if colour == "B" else (0, 11) 
 
-        dist = { start: 0 }
-        prev = {}
-        Q = { start }
-        disc = { start }
-                
-        while len(Q) != 0:
-            u = min(Q, key=lambda x: dist[x])
-            Q.remove(u)
+    @PositionCache.cached("dijkstra.distance")
+    def distance(self, board, colour, bridges=False):
+        """ Number of cells colour still needs to claim to connect its edges,
+            float('inf') if the opponent has already cut every path """
+        prev, dist, path = self.pathfind(board, colour, bridges)
+        return dist[len(board) * len(board) + 1]
+
+    @Profiler.timed("dijkstra.pathfind")
+    def pathfind(self, board, colour, bridges=False):
+        """ Heap based Dijkstra over the flat cell graph between two virtual edge
+            nodes. Entering an own stone costs 0, an empty cell costs 1 and
+            opponent stones are impassable. With bridges=True two cells joined by
+            a bridge (or a cell joined to its edge by an edge template) whose
+            carrier is empty count as adjacent.
+            Returns prev and dist indexed by node and the (row, column) cells of
+            the shortest path that are still empty """
+        size = len(board)
+        start = size * size
+        end = start + 1
+        adjacency = self.get_tables(size)[colour]
+        cells = [c for row in board for c in row]
+        opp_colour = "R" if colour == "B" else "B"
+
+        dist = [float("inf")] * (end + 1)
+        prev = [None] * (end + 1)
+        dist[start] = 0
+        heap = [(0, start)]
+
+        while len(heap) != 0:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == end:
+                break
+
+            for v, carrier in adjacency[u]:
+                if carrier:
+                    if not bridges or cells[carrier[0]] != "0" or cells[carrier[1]] != "0":
+                        continue
+                if v >= start:
+                    alt = d
+                elif cells[v] == colour:
+                    alt = d
+                elif cells[v] == opp_colour:
+                    continue
+                else:
+                    alt = d + 1
+                if alt < dist[v]:
+                    dist[v] = alt
+                    prev[v] = u
+                    heapq.heappush(heap, (alt, v))
 
-            neighbours = self.calculate_neighbours(u, board, colour)
-            for v, w in neighbours.items():
-                if v not in disc:
-                    disc.add(v)
-                    Q.add(v)
-                    dist[v] = 1000000
-                    prev[v] = None
-                if v in Q:
-                    alt = dist[u] + w
-                    if alt < dist[v]:
-                        dist[v] = alt
-                        prev[v] = u
-        
         path = []
-        c = end
+        if prev[end] is None:
+            return prev, dist, path
+        c = prev[end]
         while c != start:
-            if c[0] >= 0 and c[0] < 11 and c[1] >= 0 and c[1] < 11 and board[c[1]][c[0]] != colour:
-                path.append((c[1], c[0]))
+            if cells[c] != colour:
+                path.append(divmod(c, size))
             c = prev[c]
-        
+
         return prev, dist, path
-    
-    # number of neighbours a tile has
-    NEIGHBOUR_COUNT = 6
 
-    # relative positions of neighbours, clockwise from top left
-    I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
-    J_DISPLACEMENTS = [0, 1, 1, 0, -1, -1]
+    @staticmethod
+    def get_tables(size):
+        """ Builds the adjacency lists of every node for both colours once per
+            board size from the shared HexTables. Nodes are flat cell indices
+            followed by the virtual start and end edge nodes. Each entry is a
+            (node, carrier) pair where carrier is empty for adjacent cells and
+            holds the two flat indices that must stay empty for a bridge or edge
+            template """
+        if size in Dijkstra._tables:
+            return Dijkstra._tables[size]
+
+        hex_tables = HexTables.get(size)
+        start = size * size
+        end = start + 1
 
-    BRIDGE_NEIGHBOURS = [[0,1], [0,2], [1,3], [2,4], [3,5], [4,5]]
-    I_BRIDGE_DISPLACEMENTS = [-2, -1, -1, 1, 1, 2]
-    J_BRIDGE_DISPLACEMENTS = [1, -1, 2, -2, 1, -1]
+        cell_adjacency = []
+        for c in range(hex_tables.cells):
+            adjacent = [(n, ()) for n in hex_tables.neighbours[c]]
+            adjacent += [(n, (a, b)) for n, a, b in hex_tables.bridges[c]]
+            cell_adjacency.append(adjacent)
 
-    def calculate_neighbours(self, node, board, colour):
-        opp_colour = ("R" if colour == "B" else "B")
-        neighbours = {}
-        if node[0] == -1:
-            neighbours = {(0,x):(1 if board[x][0] == colour else 1) for x in range(0,11) if board[x][0] != opp_colour}
-        elif node[1] == -1:
-            neighbours = {(x,0):(1 if board[0][x] == colour else 1) for x in range(0,11) if board[0][x] != opp_colour}
-        elif node[0] == 11:
-            neighbours = {(10,x):(1 if board[x][10] == colour else 1) for x in range(0,11) if board[x][0] != opp_colour}
-        elif node[1] == 11:
-            neighbours = {(x,10):(1 if board[10][x] == colour else 1) for x in range(0,11) if board[0][x] != opp_colour}
-        else:
-            for idx in range(self.NEIGHBOUR_COUNT):
-                n = (node[0] + self.I_DISPLACEMENTS[idx], node[1] + self.J_DISPLACEMENTS[idx])
-                if (n[0] == -1):
-                    if colour == "B":
-                        neighbours[(-1, 0)] = 0
-                elif (n[1] == -1):
-                    if colour == "R":
-                        neighbours[(0, -1)] = 0
-                elif (n[0] == 11):
-                    if colour == "B":
-                        neighbours[(11, 0)] = 0
-                elif (n[1] == 11):
-                    if colour == "R":
-                        neighbours[(0, 11)] = 0
-                elif board[n[1]][n[0]] == colour:
-                    neighbours[n] = 0
-                elif board[n[1]][n[0]] != opp_colour:
-                    neighbours[n] = 1
+        tables = {}
+        for colour in ["R", "B"]:
+            adjacency = [list(adjacent) for adjacent in cell_adjacency] + [[], []]
+            front, back = hex_tables.edges[colour]
+            front_templates, back_templates = hex_tables.edge_templates[colour]
+            for edge_node, cells, templates in [(start, front, front_templates), (end, back, back_templates)]:
+                for c in cells:
+                    adjacency[edge_node].append((c, ()))
+                    adjacency[c].append((edge_node, ()))
+                for c, a, b in templates:
+                    adjacency[edge_node].append((c, (a, b)))
+                    adjacency[c].append((edge_node, (a, b)))
+            tables[colour] = adjacency
 
-        return neighbours
\ No newline at end of file
+        Dijkstra._tables[size] = tables
+        return tables
@@ -0,0 +1,220 @@
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class GTPError(Exception):
+    """Raised for a failed GTP command or a lost engine."""
+    pass
+
+
+class GTPClient():
+    """Asynchronous GTP connection to an engine subprocess.
+
+    Commands are written straight away with a numeric id and return a Future,
+    so several can be in flight at once. A reader thread blocks on the
+    engine's stdout, parses each "=id text" / "?id text" response up to its
+    terminating blank line and resolves the matching Future. Responses come
+    back in the order commands were sent.
+
+    The client remembers the commands that define the engine's state: the
+    latest value of every setting (boardsize, param_* ...) and the moves of
+    the current game, with genmove results recorded as plays. If the engine
+    dies, pending commands fail with GTPError and a background thread starts
+    a new engine and replays that state, while new commands wait for it.
+    """
+
+    def __init__(self, args, cwd=None, max_restarts=3, start_timeout=30.0):
+        self.args = args
+        self.cwd = cwd
+        self.max_restarts = max_restarts
+        self.start_timeout = start_timeout
+        self.restarts = 0
+
+        self._process = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closed = False
+        self._next_id = 1
+        # (id, command, future) in sending order
+        self._pending = deque()
+
+        # replayable state
+        self._settings = {}
+        self._moves = []
+
+    ### PROCESS
+
+    def start(self):
+        """Starts the engine and waits until it answers a command."""
+        self._spawn()
+        self._wait_ready()
+
+    def _spawn(self):
+        self._process = subprocess.Popen(
+            self.args, cwd=self.cwd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True, bufsize=1
+        )
+        reader = threading.Thread(target=self._read_loop, args=(self._process,), daemon=True)
+        reader.start()
+
+    def _wait_ready(self):
+        # the engine only reads stdin once it has initialised
+        self._write("name").result(self.start_timeout)
+        for command in list(self._settings.values()) + self._moves:
+            self._write(command)
+        self._write("name").result(self.start_timeout)
+        self._ready.set()
+
+    def _restart(self):
+        try:
+            if self._process is not None:
+                self._process.kill()
+                self._process.wait()
+            self._spawn()
+            self._wait_ready()
+        except Exception:
+            # leave the client unusable rather than loop on a broken engine
+            self._closed = True
+            self._ready.set()
+
+    def _lost(self, process):
+        """Called by a reader thread when its engine's output ends."""
+        with self._lock:
+            if process is not self._process:
+                return
+            self._ready.clear()
+            pending, self._pending = self._pending, deque()
+        for command_id, command, future in pending:
+            if not future.done():
+                future.set_exception(GTPError(f"engine exited during '{command}'"))
+        if self._closed:
+            self._ready.set()
+            return
+        if self.restarts >= self.max_restarts:
+            self._closed = True
+            self._ready.set()
+            return
+        self.restarts += 1
+        threading.Thread(target=self._restart, daemon=True).start()
+
+    def close(self):
+        """Stops the engine, failing anything still pending."""
+        self._closed = True
+        process = self._process
+        if process is not None and process.poll() is None:
+            try:
+                self._write("quit")
+                process.wait(timeout=1)
+            except Exception:
+                process.kill()
+
+    def is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    ### COMMANDS
+
+    def send(self, command, timeout=None):
+        """Queues command and returns a Future of its response text. Waits up
+        to timeout seconds for a restarting engine to come back."""
+        if not self._ready.wait(timeout):
+            raise GTPError("engine is restarting")
+        if self._closed:
+            raise GTPError("engine is closed")
+        return self._write(command)
+
+    def command(self, command, timeout=None):
+        """Sends command and waits up to timeout seconds for its response."""
+        return self.send(command, timeout).result(timeout)
+
+    def _write(self, command):
+        future = Future()
+        with self._lock:
+            if self._process.poll() is not None:
+                future.set_exception(GTPError(f"engine exited before '{command}'"))
+                return future
+            command_id = self._next_id
+            self._next_id += 1
+            self._pending.append((command_id, command, future))
+            try:
+                self._process.stdin.write(f"{command_id} {command}\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                # the reader thread notices the exit and fails the future
+                pass
+        return future
+
+    ### RESPONSES
+
+    def _read_loop(self, process):
+        lines = None
+        for line in process.stdout:
+            line = line.rstrip("\r\n")
+            if lines is None:
+                # skip anything outside a response
+                if line[:1] in ("=", "?"):
+                    lines = [line]
+                continue
+            if line == "":
+                self._resolve(lines)
+                lines = None
+            else:
+                lines.append(line)
+        self._lost(process)
+
+    def _resolve(self, lines):
+        status, head = lines[0][0], lines[0][1:]
+        response_id, _, text = head.partition(" ")
+        if not response_id.isdigit():
+            response_id, text = "", head
+        text = "\n".join([text.strip()] + lines[1:]).strip()
+
+        stale = []
+        with self._lock:
+            # commands written to an engine as it died never get answered
+            while response_id and self._pending and self._pending[0][0] < int(response_id):
+                stale.append(self._pending.popleft())
+            if len(self._pending) == 0:
+                return
+            command_id, command, future = self._pending.popleft()
+        for stale_id, stale_command, stale_future in stale:
+            stale_future.set_exception(GTPError(f"no response to '{stale_command}'"))
+        if response_id and int(response_id) != command_id:
+            future.set_exception(GTPError(f"response {response_id} does not match command {command_id}"))
+            return
+        if status == "?":
+            future.set_exception(GTPError(text))
+            return
+        self._record(command, text)
+        future.set_result(text)
+
+    def _record(self, command, response):
+        """Keeps the state changing commands that succeeded for replay."""
+        words = command.split()
+        if len(words) == 0:
+            return
+        name = words[0]
+        if name == "boardsize":
+            self._settings[name] = command
+            self._moves = []
+        elif name.startswith("param_") and len(words) > 2:
+            self._settings[f"{name} {words[1]}"] = command
+        elif name == "clear_board":
+            self._moves = []
+        elif name == "play":
+            self._moves.append(command)
+        elif name == "genmove" and len(words) > 1 and response[:1].isalpha() and response != "resign":
+            self._moves.append(f"play {words[1]} {response}")
+        elif name == "undo" and self._moves:
+            self._moves.pop()
+
+
+if (__name__ == "__main__"):
+    client = GTPClient(["./agents/Group027/mohex/mohex"])
+    client.start()
+    futures = [client.send(c) for c in ["boardsize 5 5", "param_mohex max_time 1", "play b c3", "genmove w"]]
+    for future in futures:
+        print(future.result(10))
+    client.close()
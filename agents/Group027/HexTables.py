@@ -0,0 +1,106 @@
+class HexTables():
+    """ Lookup tables for one board size, built once and shared by every module
+        so hot loops only do index lookups.
+        Cells are flat indices i * size + j where i is the row and j the column.
+        Red joins row 0 (front) to row size-1 (back), Blue joins column 0 (front)
+        to column size-1 (back). """
+
+    # number of neighbours a tile has
+    NEIGHBOUR_COUNT = 6
+
+    # relative positions of neighbours, clockwise from top left
+    I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
+    J_DISPLACEMENTS = [0, 1, 1, 0, -1, -1]
+
+    # pairs of neighbour indices forming the carrier of each bridge
+    BRIDGE_NEIGHBOURS = [[0, 1], [5, 0], [1, 2], [4, 5], [2, 3], [3, 4]]
+    I_BRIDGE_DISPLACEMENTS = [-2, -1, -1, 1, 1, 2]
+    J_BRIDGE_DISPLACEMENTS = [1, -1, 2, -2, 1, -1]
+
+    # tables cached per board size
+    _cache = {}
+
+    @staticmethod
+    def get(size):
+        """ Returns the shared tables for a board size """
+        tables = HexTables._cache.get(size)
+        if tables is None:
+            tables = HexTables(size)
+            HexTables._cache[size] = tables
+        return tables
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = size * size
+
+        # flat index -> (row, column)
+        self.coords = [divmod(c, size) for c in range(self.cells)]
+
+        # flat index -> 6 ring entries clockwise from top left, -1 if off board
+        self.ring = []
+        for i, j in self.coords:
+            ring = []
+            for k in range(HexTables.NEIGHBOUR_COUNT):
+                x = i + HexTables.I_DISPLACEMENTS[k]
+                y = j + HexTables.J_DISPLACEMENTS[k]
+                ring.append(x * size + y if self.on_board(x, y) else -1)
+            self.ring.append(tuple(ring))
+
+        # flat index -> on board neighbours as flat indices and as coordinates
+        self.neighbours = [tuple(n for n in ring if n >= 0) for ring in self.ring]
+        self.neighbour_coords = [
+            [tuple(self.coords[n] for n in self.neighbours[i * size + j]) for j in range(size)]
+            for i in range(size)
+        ]
+
+        # flat index -> (other end, carrier a, carrier b) for every on board bridge
+        self.bridges = []
+        for c, (i, j) in enumerate(self.coords):
+            bridges = []
+            for k in range(HexTables.NEIGHBOUR_COUNT):
+                x = i + HexTables.I_BRIDGE_DISPLACEMENTS[k]
+                y = j + HexTables.J_BRIDGE_DISPLACEMENTS[k]
+                if self.on_board(x, y):
+                    a, b = HexTables.BRIDGE_NEIGHBOURS[k]
+                    bridges.append((x * size + y, self.ring[c][a], self.ring[c][b]))
+            self.bridges.append(tuple(bridges))
+
+        # colour -> (front cells, back cells) as flat index tuples
+        # colour -> (front templates, back templates) as (cell, carrier a, carrier b)
+        # colour -> (front mask, back mask) as ints with bit c set for cell c
+        self.edges = {}
+        self.edge_templates = {}
+        self.edge_masks = {}
+        for colour in ["R", "B"]:
+            def cell(a, b):
+                return a * size + b if colour == "R" else b * size + a
+
+            front = tuple(cell(0, k) for k in range(size))
+            back = tuple(cell(size - 1, k) for k in range(size))
+            self.edges[colour] = (front, back)
+            self.edge_masks[colour] = (
+                sum(1 << c for c in front), sum(1 << c for c in back)
+            )
+
+            # second row cells joined to the edge by the two edge cells below them
+            front_templates, back_templates = [], []
+            if size > 2:
+                for k in range(size - 1):
+                    front_templates.append((cell(1, k), cell(0, k), cell(0, k + 1)))
+                    back_templates.append((cell(size - 2, k + 1), cell(size - 1, k), cell(size - 1, k + 1)))
+            self.edge_templates[colour] = (tuple(front_templates), tuple(back_templates))
+
+        self.full_mask = (1 << self.cells) - 1
+
+    def on_board(self, i, j):
+        return i >= 0 and i < self.size and j >= 0 and j < self.size
+
+    def index(self, i, j):
+        return i * self.size + j
+
+
+if (__name__ == "__main__"):
+    tables = HexTables.get(3)
+    print(tables.neighbours)
+    print(tables.bridges[4])
+    print(tables.edge_templates["R"])
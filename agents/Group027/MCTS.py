@@ -1,19 +1,33 @@
 import random
 import math
-from copy import deepcopy
+import threading
 from time import perf_counter
+from Bitboard import Bitboard
 from BoardSupport import BoardSupport
+from CellAnalysis import CellAnalysis
+from Playout import PlayoutPolicy
+from Profiler import Profiler
+from VirtualConnections import VirtualConnections
 import sys
 
 class Node:
     """ Node data structure is for the tree in the MCTS implementation
         No board data should be tied to the node itself """
 
-    def __init__(self, move, player, parent, layer): 
+    # weight of the progressive bias added by a move prior
+    PRIOR_WEIGHT = 1.0
+
+    # trees kept across moves get large, so skip the per node dict
+    __slots__ = ("move", "player", "parent", "layer", "children", "prior", "wins", "visits")
+
+    def __init__(self, move, player, parent, layer, prior=None): 
         # move is from parent to node
         self.move, self.player, self.parent, self.layer = move, player, parent, layer
         self.children = []
 
+        # heuristic prior in [0, 1] or None if not given
+        self.prior = prior
+
         # set unvistied
         self.wins, self.visits = 0, 0
 
@@ -21,11 +35,24 @@ class Node:
     # calculate upper bound score from visit and wins
     def ucb_score(self, exploration_constant=1.5):
         if self.visits == 0:
-            return float('inf')
+            # unvisited children are still tried first, best prior first
+            if self.prior is None:
+                return float('inf')
+            return 1000 + self.prior
         # current win rate
         exploitation = self.wins / self.visits
         exploration = exploration_constant * math.sqrt(math.log(self.parent.visits + 1) / self.visits)
-        return exploitation + exploration
+        if self.prior is None:
+            return exploitation + exploration
+        # progressive bias fades as the node collects real results
+        return exploitation + exploration + Node.PRIOR_WEIGHT * self.prior / (self.visits + 1)
+
+    def puct_score(self, c_puct):
+        """ AlphaZero style score where prior is a move probability. Unvisited
+            nodes count as even, so the prior alone orders them """
+        exploitation = self.wins / self.visits if self.visits > 0 else 0.5
+        prior = self.prior if self.prior is not None else 1 / len(self.parent.children)
+        return exploitation + c_puct * prior * math.sqrt(self.parent.visits + 1) / (self.visits + 1)
 
     # update node values according to win
     def update(self, is_win):
@@ -42,8 +69,9 @@ class Node:
         return self.parent is not None
     
     @staticmethod
-    def tree_policy_child(node):
-        """ Select best child of given node, random if all children equal otherwise always front indexed """
+    def tree_policy_child(node, c_puct=None):
+        """ Select best child of given node, random if all children equal otherwise always front indexed.
+            Children are scored by PUCT when c_puct is given, else by UCB """
 
         best_children = []
         best_score = -float('inf')
@@ -51,7 +79,7 @@ class Node:
         # iterate through children
         for child in node.children:
             # calculate ucb score
-            score = child.ucb_score()
+            score = child.ucb_score() if c_puct is None else child.puct_score(c_puct)
             # update best
             if score > best_score:
                 best_score = score
@@ -65,28 +93,85 @@ class Node:
         return random.choice(best_children)
 
 class MCTS:
-    """ Monte Carlo Tree Search Implementation"""
+    """ Monte Carlo Tree Search Implementation
+        The tree is kept between moves: when the next position follows from the
+        last root by moves already in the tree, the matching subtree becomes
+        the new root. Pondering grows the tree in a background thread while
+        the opponent thinks, so their reply usually lands on a searched subtree """
+
+    # pondering stops once the tree holds this many nodes
+    MAX_PONDER_NODES = 500000
 
-    def __init__(self, board_size):
+    # exploration weight of PUCT selection with a network
+    C_PUCT = 1.5
+
+    def __init__(self, board_size, prior_fn=None, prior_layers=2, weighted_playouts=True,
+                 prune_inferior=True, net=None, batch_size=16):
+        """ prior_fn(board, player) may return a dictionary of move -> prior in
+            [0, 1] for player, eg. TwoDistance.move_priors. It is only called when
+            expanding nodes less than prior_layers below the root to bound its cost.
+            weighted_playouts uses the bridge and locality aware PlayoutPolicy
+            instead of uniformly shuffled playouts.
+            prune_inferior drops dead, captured and dominated cells when expanding
+            nodes less than prior_layers below the root.
+            net, a PolicyValueNet, replaces playouts and prior_fn: each iteration
+            selects batch_size leaves by PUCT, evaluates them in one forward pass,
+            expands them with the policy as priors and backs up the values """
         self.board_size = board_size
+        self.prior_fn = prior_fn
+        self.prior_layers = prior_layers
+        self.prune_inferior = prune_inferior
+        self.playout = PlayoutPolicy() if weighted_playouts else None
+        self.net = net
+        self.batch_size = batch_size
+        self.c_puct = MCTS.C_PUCT if net is not None else None
+
+        # persistent tree, the bitboard at its root and the root's layer
+        self.root_node = None
+        self.root_board = None
+        self.root_layer = 0
+        self.node_count = 0
+        self.iterations = 0
+
+        self._ponder_thread = None
+        self._ponder_stop = threading.Event()
     
     # select best child iteratively until at leaf
     def selection(self, board, n):
-        """ Iterative selection, updates board with given node """
+        """ Iterative selection, updates bitboard with given node """
         while not n.is_leaf():
-            n = Node.tree_policy_child(n)
-            board[n.move[0]][n.move[1]] = n.player
+            n = Node.tree_policy_child(n, self.c_puct)
+            board.play(n.move[0], n.move[1], n.player)
         return n
 
     # expand given node n with all possible moves from node
-    def expansion(self, board, n):
-        if BoardSupport.check_winner(board) == 0:
-            empty = BoardSupport.get_empty(board)
+    def expansion(self, board, n, policy=None):
+        """ policy, a flat array of move probabilities from the network indexed
+            i * size + j, gives the children their priors instead of prior_fn """
+        if board.winner() == 0:
+            empty = board.empty_cells()
             opp_player = BoardSupport.opp_player(n.player)
 
-            for move in empty:
-                new_child = Node(move, opp_player, n, n.layer + 1)
-                n.children.append(new_child)
+            priors = {}
+            near_root = n.layer - self.root_layer < self.prior_layers
+            prior_fn = self.prior_fn if policy is None else None
+            if near_root and (self.prune_inferior or prior_fn is not None):
+                node_board = board.to_board()
+                if self.prune_inferior:
+                    empty = CellAnalysis.candidate_moves(node_board, opp_player, empty)
+                if prior_fn is not None:
+                    priors = prior_fn(node_board, opp_player)
+            if policy is not None:
+                # renormalise over the moves left after pruning
+                size = board.size
+                total = sum(policy[i * size + j] for i, j in empty)
+                if total > 0:
+                    priors = {(i, j): policy[i * size + j] / total for i, j in empty}
+
+            children = [Node(move, opp_player, n, n.layer + 1, priors.get(move)) for move in empty]
+            self.node_count += len(children)
+            # publish the children at once so a pondering thread never sees a partial list
+            n.children = children
 
     # run simulation of given board and moves for speed
     def simulate_move(self, board, moves, player):
@@ -94,18 +179,23 @@ class MCTS:
 
         # catch if no moves sent
         if len(moves) == 0:
-            moves = BoardSupport.get_empty(board)
+            moves = board.empty_cells()
         
         # shuffle moves
         random.shuffle(moves)
         opp_player = BoardSupport.opp_player(player)
 
-        for i, move in enumerate(moves):
-            if i % 2 == 0:
-                board[move[0]][move[1]] = player
-            else:
-                board[move[0]][move[1]] = opp_player
-        win_state = BoardSupport.check_winner(board)
+        # fill the board by or-ing each side's half of the moves into its word
+        stride = board.stride
+        player_bits = sum(1 << (move[0] * stride + move[1]) for move in moves[0::2])
+        opp_bits = sum(1 << (move[0] * stride + move[1]) for move in moves[1::2])
+        if player == "R":
+            board.red |= player_bits
+            board.blue |= opp_bits
+        else:
+            board.red |= opp_bits
+            board.blue |= player_bits
+        win_state = board.winner()
         return win_state
 
     # run a simulation on node n
@@ -113,64 +203,228 @@ class MCTS:
         """ Perform a simulation safely copying all necessary objects"""
         
         # copy for safe simulation
-        sim_board = deepcopy(board)
+        sim_board = board.copy()
         sim_player = BoardSupport.opp_player(n.player)
 
         # get moves and catch if no moves left
-        sim_moves = BoardSupport.get_empty(sim_board)
+        sim_moves = sim_board.empty_cells()
         if len(sim_moves) == 0:
-            return BoardSupport.check_winner(board)
+            return board.winner()
+        if self.playout is not None:
+            return self.playout.simulate(sim_board, sim_player, n.move)
         return self.simulate_move(sim_board, sim_moves, sim_player)
 
     # backpropogate result of simulation through node structure
-    def backpropagation(self, is_win, n):
-        while n.has_parent(): 
-                n.update(is_win)
-                n = n.parent
+    def backpropagation(self, end_state, n):
+        """ Updates every node up to and including the root, each from the view of
+            the player who made its move """
+        while n is not None:
+            n.update(BoardSupport.evaluate_is_win(end_state, n.player))
+            n = n.parent
+
+    def backpropagate_value(self, value, player, n):
+        """ Backs up value in [-1, 1] for player from n to the root. Selection
+            already counted the visits, which act as virtual losses so the rest
+            of a batch spreads over other leaves """
+        while n is not None:
+            n.wins += (1 + value) / 2 if n.player == player else (1 - value) / 2
+            n = n.parent
 
     # select best move from root nodes children
-    # choose most winning node
+    # choose most visited node, the most robust estimate
     def best_move(self):
-        best_wins = 0
-        best_child = None
-        for child in self.root_node.children:
-            if child.wins > best_wins:
-                best_wins = child.wins
-                best_child = child
+        best_child = max(self.root_node.children, key=lambda child: (child.visits, child.wins))
         return best_child.move
-    
-    # create new MCTS
-    def make_move(self, board, player, max_time=5):
-        safe_board = deepcopy(board)
-        start_time = perf_counter()
-        self.iterations = 0
 
-        self.root_node = Node(None, None, None, 0)
-        self.expansion(safe_board, self.root_node)
-        while ((perf_counter() - start_time)) < max_time:
-            self.iterations += 1
-            # copy for safe usage
-            n, b = self.root_node, deepcopy(safe_board)
+    def iterate(self):
+        """ Runs one select, expand, simulate and backpropagate cycle """
+        if self.net is not None:
+            return self.iterate_batch()
+        if Profiler.ENABLED:
+            return self._profiled_iterate()
+        self.iterations += 1
+        # copy for safe usage
+        n, b = self.root_node, self.root_board.copy()
 
-            # initial selection
-            n = self.selection(b, n)
+        # initial selection
+        n = self.selection(b, n)
+
+        # expand
+        self.expansion(b, n)
 
-            # expand
-            self.expansion(b, n)
+        # reselect after expansion
+        n = self.selection(b, n)
+        # simulate
+        end_state = self.simulation(b, n)
 
-            # reselect after expansion
+        # propagate
+        self.backpropagation(end_state, n)
+
+    def iterate_batch(self):
+        """ Selects up to batch_size leaves, each visit counted on the way down,
+            then evaluates the undecided ones with one forward pass of the net.
+            Each leaf is expanded with its policy and its value backed up, won
+            positions back up their result """
+        start_time = perf_counter()
+        leaves = []
+        for k in range(self.batch_size):
+            n, b = self.root_node, self.root_board.copy()
             n = self.selection(b, n)
-            # simulate
-            end_state = self.simulation(b, n)
+            visited = n
+            while visited is not None:
+                visited.visits += 1
+                visited = visited.parent
+            leaves.append((n, b, b.winner()))
 
-            # check if end state is win
-            is_win = BoardSupport.evaluate_is_win(end_state, player)
+        undecided = [(n, b) for n, b, winner in leaves if winner == 0]
+        if len(undecided) > 0:
+            net_time = perf_counter()
+            policies, values = self.net.evaluate(
+                [b.to_board() for n, b in undecided],
+                [BoardSupport.opp_player(n.player) for n, b in undecided]
+            )
+            if Profiler.ENABLED:
+                Profiler.record("mcts.net", perf_counter() - net_time)
+            for (n, b), policy, value in zip(undecided, policies, values):
+                # a leaf picked twice in the batch is only expanded once
+                if n.is_leaf():
+                    self.expansion(b, n, policy)
+                self.backpropagate_value(float(value), BoardSupport.opp_player(n.player), n)
 
-            # propagate
-            self.backpropagation(is_win, n)
+        for n, b, winner in leaves:
+            if winner != 0:
+                self.backpropagate_value(1.0, "R" if winner == 1 else "B", n)
+
+        self.iterations += len(leaves)
+        if Profiler.ENABLED:
+            Profiler.record("mcts.batch", perf_counter() - start_time)
+            Profiler.count("mcts.iterations", len(leaves))
+
+    def _profiled_iterate(self):
+        """ iterate with every phase timed """
+        self.iterations += 1
+        nodes = self.node_count
+        t0 = perf_counter()
+        n, b = self.root_node, self.root_board.copy()
+        t1 = perf_counter()
+        n = self.selection(b, n)
+        t2 = perf_counter()
+        self.expansion(b, n)
+        t3 = perf_counter()
+        n = self.selection(b, n)
+        t4 = perf_counter()
+        end_state = self.simulation(b, n)
+        t5 = perf_counter()
+        self.backpropagation(end_state, n)
+        t6 = perf_counter()
+
+        Profiler.record("mcts.copy", t1 - t0)
+        Profiler.record("mcts.selection", t2 - t1)
+        Profiler.record("mcts.expansion", t3 - t2)
+        Profiler.record("mcts.selection2", t4 - t3)
+        Profiler.record("mcts.simulation", t5 - t4)
+        Profiler.record("mcts.backpropagation", t6 - t5)
+        Profiler.record("mcts.iteration", t6 - t0)
+        Profiler.count("mcts.iterations")
+        Profiler.count("mcts.nodes", self.node_count - nodes)
+
+    def set_root(self, board, player):
+        """ Moves the root to the position of board with player to move, reusing
+            the subtree that reaches it from the last root if there is one """
+        safe_board = Bitboard.from_board(board)
+        last_mover = BoardSupport.opp_player(player)
+        n = self._find_subtree(safe_board, last_mover)
+        if n is None:
+            # root holds the last move made so its children are played by player
+            n = Node(None, last_mover, None, 0)
+            self.node_count = 1
+        else:
+            # the discarded siblings no longer count towards the tree
+            self.node_count = MCTS._count_nodes(n)
+        n.parent = None
+        self.root_node, self.root_board, self.root_layer = n, safe_board, n.layer
+        if n.is_leaf():
+            policy = None
+            if self.net is not None and safe_board.winner() == 0:
+                policy = self.net.evaluate([board], [player])[0][0]
+            self.expansion(safe_board, n, policy)
+
+    @staticmethod
+    def _count_nodes(n):
+        """ Returns the number of nodes in the tree rooted at n """
+        count, stack = 0, [n]
+        while stack:
+            n = stack.pop()
+            count += 1
+            stack.extend(n.children)
+        return count
+
+    def _find_subtree(self, safe_board, last_mover):
+        """ Follows the stones added since the last root down the tree, returns
+            the matching node or None if the tree cannot be reused """
+        if self.root_node is None or self.root_board.size != safe_board.size:
+            return None
+        old = self.root_board
+        if old.red & ~safe_board.red or old.blue & ~safe_board.blue:
+            return None
+        added = {"R": set(old.cells(safe_board.red & ~old.red)), "B": set(old.cells(safe_board.blue & ~old.blue))}
+
+        n = self.root_node
+        while added["R"] or added["B"]:
+            to_move = BoardSupport.opp_player(n.player)
+            if len(added[to_move]) == 0:
+                return None
+            children = [child for child in n.children if child.move in added[to_move]]
+            if len(children) == 0:
+                return None
+            n = children[0]
+            added[to_move].discard(n.move)
+        return n if n.player == last_mover else None
+
+    # create new MCTS
+    def make_move(self, board, player, max_time=5, use_vc=True):
+        self.stop_ponder()
+        start_time = perf_counter()
+        self.iterations = 0
+        self.set_root(board, player)
+
+        # prune the root to the opponent's mustplay or play a virtual win
+        if use_vc:
+            moves = [child.move for child in self.root_node.children]
+            moves, winning = VirtualConnections.prune_moves(board, player, moves)
+            if winning:
+                return moves[0]
+            allowed = set(moves)
+            self.root_node.children = [c for c in self.root_node.children if c.move in allowed]
+        while ((perf_counter() - start_time)) < max_time:
+            self.iterate()
         # select best move from node tree
         return self.best_move()
 
+    ### PONDERING
+
+    def ponder(self, board, player):
+        """ Keeps searching board, where player is to move, in a background
+            thread until stop_ponder is called or the tree is full """
+        self.stop_ponder()
+        self.set_root(board, player)
+        if self.root_node.is_leaf():
+            return
+        self._ponder_stop.clear()
+        self._ponder_thread = threading.Thread(target=self._ponder_loop, daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder_loop(self):
+        while not self._ponder_stop.is_set() and self.node_count < MCTS.MAX_PONDER_NODES:
+            self.iterate()
+
+    def stop_ponder(self):
+        """ Stops the pondering thread, returns once it has finished its iteration """
+        if self._ponder_thread is not None:
+            self._ponder_stop.set()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+
 if __name__ == "__main__":
     # Initialize MCTS with time and iteration limits
     mcts = MCTS(11)
@@ -178,6 +432,5 @@ if __name__ == "__main__":
     board_size = 11
     board = BoardSupport.create_board(board_size)
     player = "R"
-    best_move = MCTS.make_move(board, player)
+    best_move = mcts.make_move(board, player)
     print("Best move:", best_move)
-
@@ -1,36 +1,54 @@
-import subprocess
-import time
-import select
+from os import cpu_count, environ
+from concurrent.futures import TimeoutError
+from GTPClient import GTPClient, GTPError
+
+
+def available_threads():
+    """ The HEX_THREADS hint when the engine sandboxes the agent, else one
+        thread per core this process may run on """
+    if environ.get("HEX_THREADS", "").isdigit():
+        return max(1, int(environ["HEX_THREADS"]))
+    try:
+        from os import sched_getaffinity
+        return len(sched_getaffinity(0))
+    except ImportError:
+        return cpu_count() or 1
 
 class MoHex():
     """Class for playing Hex using the MoHex engine."""
 
-    def __init__(self, board_size=11, eval_func=1):
+    # seconds to wait for a restarting mohex before treating it as unavailable
+    READY_TIMEOUT = 0.5
+
+    def __init__(self, board_size=11, eval_func=1, ponder=True, num_threads=None):
+        """With ponder, MoHex keeps searching after each genmove while it waits
+        for the next command, and reuses the subtree of the move played.
+        num_threads defaults to available_threads()."""
         self.mohex_colour_map = {'R': 'Bl', 'Bl': 'R', 'B': 'W', 'W': 'B'}
         self._board_size = board_size
+        self._max_time = 5
+        self._ponder = ponder
+        self._num_threads = num_threads or available_threads()
         self._start_subprocess()
     
     def _start_subprocess(self):
-        self._process = subprocess.Popen(["./agents/Group027/mohex/mohex"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,  
-                                         stderr=subprocess.DEVNULL, 
-                                         text=True)
-        # Wait for the subprocess to start
-        time.sleep(1)
-        # send inital commands & parameters to mohex
-        self._send_mohex_command("boardsize 11 11")
-        response = self._read_mohex_response()
-        self._send_mohex_command("param_mohex num_threads 24")
-        response = self._read_mohex_response()
-        self._send_mohex_command("param_mohex max_time 5")
-        response = self._read_mohex_response()
-        self._send_mohex_command("param_mohex lock_free 1")
-        response = self._read_mohex_response()
-        self._send_mohex_command("param_mohex ponder 0")
-        response = self._read_mohex_response()
+        self._gtp = GTPClient(["./agents/Group027/mohex/mohex"])
+        # returns once mohex answers, then the parameters are pipelined
+        self._gtp.start()
+        futures = [self._gtp.send(command) for command in [
+            f"boardsize {self._board_size} {self._board_size}",
+            f"param_mohex num_threads {self._num_threads}",
+            f"param_mohex max_time {self._max_time}",
+            "param_mohex lock_free 1",
+            f"param_mohex ponder {int(self._ponder)}",
+            "param_mohex reuse_subtree 1"
+        ]]
+        for future in futures:
+            future.result(15)
     
     def _terminate_subprocess(self):
         # Terminate the subprocess when the agent is closed
-        self._process.terminate()
+        self._gtp.close()
     
     def _close(self):
         # Terminate the subprocess
@@ -50,25 +68,14 @@ class MoHex():
         else:
             return "None"
     
-    def _send_mohex_command(self, command):
-        if self._process.poll() is None:  # Check if the process is still running
-            self._process.stdin.write(command + '\n') # Send command to mohex
-            self._process.stdin.flush()
-        else:
-            raise Exception("Cannot send command: The process has terminated")
-
-    def _read_mohex_response(self, timeout=15.0):
-        response = 'timeout' # Default response if we time out
-        end_time = time.time() + timeout
-        while time.time() < end_time:
-            ready, _, _ = select.select([self._process.stdout], [], [], end_time - time.time())
-            if ready:
-                output = self._process.stdout.readline().strip()
-                if output == '' or output.endswith('\n'):
-                    continue  # Skip empty or incomplete lines
-                response = output
-                break
-        return response
+    def command(self, command, timeout=15.0):
+        """Sends a GTP command and returns its response, or 'timeout' if mohex
+        fails to answer in time or has crashed. A crashed mohex is restarted
+        in the background with its position replayed."""
+        try:
+            return self._gtp.command(command, timeout)
+        except (GTPError, TimeoutError):
+            return 'timeout'
     
     def mohex_to_hex_board(self, val1, val2): # Convert mohex positions to board positions
         firstval = int(val2)-1 # Mohex is column indexed
@@ -85,26 +92,94 @@ class MoHex():
         number = ''.join(char for char in input_str if char.isdigit())
         return letter, number
     
+    def set_max_time(self, max_time):
+        """Sets MoHex's search time per move in seconds. Raises GTPError if
+        mohex is unavailable."""
+        max_time = round(max_time, 2)
+        if max_time != self._max_time:
+            # no need to wait, later commands are answered after this one
+            self._gtp.send(f"param_mohex max_time {max_time}", MoHex.READY_TIMEOUT)
+            self._max_time = max_time
+
+    def set_ponder(self, ponder):
+        """Turns MoHex's pondering on or off. Any command stops a search in
+        progress, so turning it off leaves MoHex idle until it is asked to
+        move again. Raises GTPError if mohex is unavailable."""
+        if ponder != self._ponder:
+            self._gtp.send(f"param_mohex ponder {int(ponder)}", MoHex.READY_TIMEOUT)
+            self._ponder = ponder
+
+    def set_board(self, board):
+        """Replaces MoHex's board with the given agent board, for when moves
+        were made without MoHex."""
+        futures = [self._gtp.send("clear_board", MoHex.READY_TIMEOUT)]
+        for i, row in enumerate(board):
+            for j, tile in enumerate(row):
+                if tile != "0":
+                    x, y = self.hex_to_mohex_board(i, str(j))
+                    futures.append(self._gtp.send(f"play {self.mohex_colour_map[tile][0]} {x}{y}", MoHex.READY_TIMEOUT))
+        for future in futures:
+            future.result(15)
+
+    def play(self, colour, move):
+        """Plays move (row, column) for colour, returns False if it failed."""
+        x, y = self.hex_to_mohex_board(move[0], str(move[1]))
+        return self.command(f"play {self.mohex_colour_map[colour][0]} {x}{y}") != 'timeout'
+
+    def undo(self):
+        return self.command("undo") != 'timeout'
+
+    def search(self, colour):
+        """Searches for colour's best move without playing it. Returns the move
+        as (row, column), or False if mohex failed or resigned."""
+        response = self.command(f"reg_genmove {self.mohex_colour_map[colour][0]}", timeout=self._max_time + 10)
+        letter, number = self.separate_letter_and_number(response)
+        if response == 'timeout' or letter == '' or number == '':
+            return False
+        return self.mohex_to_hex_board(letter, number)
+
+    def values(self):
+        """Returns {(row, column): (win rate, visits)} for the mover from the
+        root of the last search. Proven wins and losses count as 1 and 0."""
+        response = self.command("mohex-values")
+        if response == 'timeout':
+            return {}
+        values = {}
+        words = response.split()
+        for cell, stats in zip(words[0::2], words[1::2]):
+            value, _, visits = stats.partition("@")
+            if value == "W":
+                value = 1.0
+            elif value == "L":
+                value = 0.0
+            else:
+                value = float(value)
+            scale = 1000 if visits.endswith("k") else 1
+            visits = float(visits.rstrip("k") or 0) * scale
+            letter, number = self.separate_letter_and_number(cell)
+            values[self.mohex_to_hex_board(letter, number)] = (value, int(visits))
+        return values
+
     def make_move(self, colour, opp_move, opp_swapped = False):
         """Play a round of Hex."""
         opp_colour = "R" if colour == "B" else "B"
         # First we need to play opponents last move on MoHex
         # Check if opponent swapped or not
+        play = None
         if not opp_swapped:
-            # Play opponents last move
+            # Play opponents last move, pipelined with the genmove
             opp_move = self.hex_to_mohex_board(opp_move[0], str(opp_move[1]))
             opp_mohex_colour = self.mohex_colour_map[opp_colour][0]
-            self._send_mohex_command(f"play {opp_mohex_colour} {opp_move[0]+str(opp_move[1])}")
-            response = self._read_mohex_response()
-            if response == 'timeout':
-                return False
+            play = self._gtp.send(f"play {opp_mohex_colour} {opp_move[0]+str(opp_move[1])}", MoHex.READY_TIMEOUT)
         
         # Then we need to generate our move
         mohex_colour = self.mohex_colour_map[colour][0]
-        self._send_mohex_command(f"genmove {mohex_colour}")
-        response = self._read_mohex_response()
+        response = self.command(f"genmove {mohex_colour}", timeout=self._max_time + 10)
         if response == 'timeout':
             return False
+        # the play was answered first, if it failed the move is for the wrong board
+        if play is not None and (not play.done() or play.exception() is not None):
+            return False
         
         # Send move to server
         move = self.separate_letter_and_number(response)
@@ -0,0 +1,112 @@
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from MoHex import MoHex, available_threads
+
+
+class MoHexPool():
+    """ A pool of warm MoHex engines for analysing many positions at once.
+        The available cores, or the engine's HEX_THREADS hint, are split
+        evenly between the engines. Positions are given as lists of
+        (colour, (row, column)) moves from the empty board. Each engine
+        remembers the moves on its board and is brought to a new position by
+        undoing back to the common prefix and playing the rest, so analysing
+        positions from the same game costs a few moves each.
+        Queries run on a thread per engine and return Futures. """
+
+    def __init__(self, size=2, board_size=11, max_time=1.0, cores=None):
+        cores = cores or available_threads()
+        self.size = size
+        self.threads = max(1, cores // size)
+        self.max_time = max_time
+
+        # start the engines together, each start waits for its engine
+        with ThreadPoolExecutor(max_workers=size) as starter:
+            self.engines = list(starter.map(
+                lambda k: MoHex(board_size, ponder=False, num_threads=self.threads), range(size)
+            ))
+        for engine in self.engines:
+            engine.set_max_time(max_time)
+
+        self._moves = [[] for engine in self.engines]
+        self._free = Queue()
+        for k in range(size):
+            self._free.put(k)
+        self._executor = ThreadPoolExecutor(max_workers=size)
+
+    def _sync(self, k, moves):
+        """ Brings engine k to the position after moves """
+        engine, current = self.engines[k], self._moves[k]
+        common = 0
+        while common < min(len(current), len(moves)) and current[common] == moves[common]:
+            common += 1
+        while len(current) > common:
+            if not engine.undo():
+                # unknown state, replay the position from an empty board
+                engine.command("clear_board")
+                current.clear()
+                common = 0
+                break
+            current.pop()
+        for colour, move in moves[common:]:
+            if not engine.play(colour, move):
+                # unknown state, start from an empty board next time
+                engine.command("clear_board")
+                current.clear()
+                raise RuntimeError(f"MoHex could not play {colour} {move}")
+            current.append((colour, move))
+
+    def _run(self, moves, query):
+        k = self._free.get()
+        try:
+            self._sync(k, list(moves))
+            return query(self.engines[k])
+        finally:
+            self._free.put(k)
+
+    ### QUERIES
+
+    def genmove(self, moves, colour):
+        """ Future of colour's best move (row, column) after moves, False if
+            MoHex failed. The move is not played """
+        return self._executor.submit(self._run, moves, lambda engine: engine.search(colour))
+
+    def evaluate(self, moves, colour):
+        """ Future of (win rate, move values) for colour to move after moves,
+            where move values maps each searched move to (win rate, visits) """
+        def query(engine):
+            if engine.search(colour) is False:
+                return (0.5, {})
+            values = engine.values()
+            if len(values) == 0:
+                return (0.5, values)
+            # the value of the most searched move, as MoHex selects by count
+            return (max(values.values(), key=lambda v: v[1])[0], values)
+        return self._executor.submit(self._run, moves, query)
+
+    def genmove_all(self, positions):
+        """ Best moves for a list of (moves, colour), analysed in parallel """
+        futures = [self.genmove(moves, colour) for moves, colour in positions]
+        return [future.result() for future in futures]
+
+    def evaluate_all(self, positions):
+        """ (win rate, move values) for a list of (moves, colour), in parallel """
+        futures = [self.evaluate(moves, colour) for moves, colour in positions]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for engine in self.engines:
+            engine._close()
+
+
+if (__name__ == "__main__"):
+    from time import perf_counter
+
+    pool = MoHexPool(size=2, max_time=1.0)
+    opening = [("R", (5, 5))]
+    positions = [(opening, "B"), (opening + [("B", (3, 6))], "R"), (opening + [("B", (4, 5))], "R")]
+    start_time = perf_counter()
+    print(pool.genmove_all(positions))
+    print([value for value, values in pool.evaluate_all(positions)])
+    print(f"{perf_counter() - start_time:.2f}s with {pool.threads} threads per engine")
+    pool.close()
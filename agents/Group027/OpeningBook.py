@@ -0,0 +1,353 @@
+import mmap
+import struct
+from os import listdir
+from os.path import exists, isdir, join, realpath, sep
+from random import Random, choice
+from sys import argv
+from Bitboard import Bitboard
+
+
+class OpeningBook():
+    """ Opening book of positions hashed with Zobrist keys.
+        A position is canonicalised over Hex's 180 degree rotation, which keeps
+        both players' edges, by hashing the board and its rotation and keeping
+        the smaller hash. Moves are stored as flat cells in the orientation
+        that produced the canonical hash and rotated back on lookup.
+        The file is a header followed by fixed size records sorted by hash, so
+        a lookup is a binary search over an mmap of the file. Records hold the
+        mover's estimated win rate for a move and the number of games behind
+        it. The board size is part of every hash, so one book can hold openings
+        for any number of sizes. """
+
+    MAGIC = b"HEXBOOK1"
+    # magic, record count
+    HEADER = struct.Struct("<8sI")
+    # position hash, move cell, mover's win rate, games
+    RECORD = struct.Struct("<QHfI")
+    SWAP = 0xFFFF
+
+    DEFAULT_PATH = sep.join(realpath(__file__).split(sep)[:-1]) + f"{sep}opening.book"
+
+    # swap if the first stone wins at least this often for Red
+    SWAP_THRESHOLD = 0.6
+
+    # Red's win rate for each first move on 11x11, used to seed the book
+    SEED_WEIGHTS = [
+        [0.312, 0.356, 0.318, 0.301, 0.325, 0.294, 0.297, 0.285, 0.299, 0.324, 0.573],
+        [0.449, 0.460, 0.462, 0.445, 0.414, 0.411, 0.399, 0.423, 0.464, 0.708, 0.595],
+        [0.446, 0.669, 0.656, 0.624, 0.614, 0.585, 0.569, 0.611, 0.739, 0.558, 0.404],
+        [0.583, 0.495, 0.739, 0.673, 0.653, 0.731, 0.627, 0.749, 0.627, 0.709, 0.613],
+        [0.594, 0.700, 0.609, 0.726, 0.678, 0.681, 0.748, 0.592, 0.748, 0.701, 0.549],
+        [0.574, 0.716, 0.707, 0.723, 0.723, 0.709, 0.732, 0.672, 0.706, 0.706, 0.564],
+        [0.603, 0.679, 0.730, 0.613, 0.776, 0.693, 0.705, 0.730, 0.636, 0.674, 0.597],
+        [0.607, 0.701, 0.672, 0.734, 0.638, 0.668, 0.665, 0.686, 0.726, 0.529, 0.547],
+        [0.451, 0.578, 0.729, 0.627, 0.565, 0.575, 0.604, 0.572, 0.630, 0.622, 0.431],
+        [0.611, 0.701, 0.451, 0.428, 0.414, 0.396, 0.405, 0.411, 0.443, 0.449, 0.431],
+        [0.607, 0.329, 0.315, 0.287, 0.306, 0.266, 0.260, 0.257, 0.251, 0.273, 0.301]
+    ]
+    # games the seed weights count as
+    SEED_GAMES = 100
+
+    # Zobrist keys cached per board size
+    _keys = {}
+
+    def __init__(self, data=b""):
+        """ data is the raw book, either bytes or an mmap of a book file """
+        self._data = data
+        self._file = None
+        self.count = 0
+        if len(data) >= OpeningBook.HEADER.size:
+            magic, self.count = OpeningBook.HEADER.unpack_from(data, 0)
+            if magic != OpeningBook.MAGIC:
+                raise ValueError("Not an opening book")
+
+    @staticmethod
+    def load(path=DEFAULT_PATH):
+        """ Maps the book file at path, or returns an empty book if it is missing """
+        if not exists(path):
+            return OpeningBook()
+        f = open(path, "rb")
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            f.close()
+            return OpeningBook()
+        book = OpeningBook(data)
+        book._file = f
+        return book
+
+    def close(self):
+        if self._file is not None:
+            self._data.close()
+            self._file.close()
+            self._file = None
+
+    ### HASHING
+
+    @staticmethod
+    def get_keys(size):
+        """ Returns (size key, red keys, blue keys) for a board size. Keys come
+            from a fixed seed so books stay valid between runs """
+        keys = OpeningBook._keys.get(size)
+        if keys is None:
+            rng = Random(size)
+            cells = size * size
+            keys = (
+                rng.getrandbits(64),
+                [rng.getrandbits(64) for c in range(cells)],
+                [rng.getrandbits(64) for c in range(cells)]
+            )
+            OpeningBook._keys[size] = keys
+        return keys
+
+    @staticmethod
+    def hash_board(board):
+        """ Returns (canonical hash, rotated) where rotated says if the hash is
+            of the board turned by 180 degrees """
+        size = len(board)
+        size_key, red_keys, blue_keys = OpeningBook.get_keys(size)
+        last = size * size - 1
+        h, h_rot = size_key, size_key
+        c = 0
+        for row in board:
+            for tile in row:
+                if tile == "R":
+                    h ^= red_keys[c]
+                    h_rot ^= red_keys[last - c]
+                elif tile == "B":
+                    h ^= blue_keys[c]
+                    h_rot ^= blue_keys[last - c]
+                c += 1
+        if h_rot < h:
+            return h_rot, True
+        return h, False
+
+    ### LOOKUP
+
+    def _record(self, k):
+        return OpeningBook.RECORD.unpack_from(self._data, OpeningBook.HEADER.size + k * OpeningBook.RECORD.size)
+
+    def probe(self, board):
+        """ Returns every book move for the position as a list of
+            (move, win rate, games), where move is (row, column) or "SWAP" """
+        if self.count == 0:
+            return []
+        h, rotated = OpeningBook.hash_board(board)
+
+        # binary search for the first record of the position
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._record(mid)[0] < h:
+                low = mid + 1
+            else:
+                high = mid
+
+        size = len(board)
+        last = size * size - 1
+        moves = []
+        while low < self.count:
+            record_hash, cell, value, games = self._record(low)
+            if record_hash != h:
+                break
+            if cell == OpeningBook.SWAP:
+                moves.append(("SWAP", value, games))
+            else:
+                moves.append((divmod(last - cell if rotated else cell, size), value, games))
+            low += 1
+        return moves
+
+    def best_move(self, board, min_games=1, spread=0.0):
+        """ Picks a book stone move for the position, randomly among those whose
+            win rate is within spread of the best. Swapping is left to
+            should_swap. Returns None if the position has no move backed by at
+            least min_games games """
+        moves = [m for m in self.probe(board) if m[0] != "SWAP" and m[2] >= min_games]
+        if len(moves) == 0:
+            return None
+        best = max(value for move, value, games in moves)
+        return choice([move for move, value, games in moves if value >= best - spread])
+
+    def should_swap(self, board):
+        """ Checks if the book says to swap the position """
+        for move, value, games in self.probe(board):
+            if move == "SWAP":
+                return value > OpeningBook.SWAP_THRESHOLD
+        return False
+
+
+class BookBuilder():
+    """ Collects move statistics from games and writes them as an OpeningBook.
+        Positions are only recorded for the first max_plies moves of a game. """
+
+    def __init__(self, max_plies=8):
+        self.max_plies = max_plies
+        # canonical hash -> canonical cell -> [mover's wins, games]
+        self.stats = {}
+
+    def add(self, board, move, value, games):
+        """ Adds games worth of results for move, won by the mover value of the time """
+        h, rotated = OpeningBook.hash_board(board)
+        size = len(board)
+        if move == "SWAP":
+            cell = OpeningBook.SWAP
+        else:
+            cell = move[0] * size + move[1]
+            if rotated:
+                cell = size * size - 1 - cell
+        entry = self.stats.setdefault(h, {}).setdefault(cell, [0.0, 0])
+        entry[0] += value * games
+        entry[1] += games
+
+    def add_game(self, size, moves, winner):
+        """ Adds a finished game of moves ((row, column) or "SWAP") won by
+            winner ("R" or "B"). Stones keep their colour through a swap, and
+            the swapping player takes over Red """
+        bb = Bitboard(size)
+        red = blue = 0
+        for ply, move in enumerate(moves[:self.max_plies]):
+            board = bb.to_board()
+            if move == "SWAP":
+                self.add(board, move, 1.0 if winner == "R" else 0.0, 1)
+                continue
+            colour = "R" if red == blue else "B"
+            self.add(board, move, 1.0 if winner == colour else 0.0, 1)
+            bb.play(move[0], move[1], colour)
+            if colour == "R":
+                red += 1
+            else:
+                blue += 1
+
+    def add_seed(self):
+        """ Adds the seed weights: Red's first moves valued as the side Blue
+            leaves after deciding whether to swap, and Blue's swap decisions """
+        weights = OpeningBook.SEED_WEIGHTS
+        size = len(weights)
+        empty = Bitboard(size).to_board()
+        for i in range(size):
+            for j in range(size):
+                w = weights[i][j]
+                self.add(empty, (i, j), min(w, 1 - w), OpeningBook.SEED_GAMES)
+                first = Bitboard(size)
+                first.play(i, j, "R")
+                self.add(first.to_board(), "SWAP", w, OpeningBook.SEED_GAMES)
+
+    @staticmethod
+    def read_log(path):
+        """ Reads an engine CSV log. Returns (size, moves, winner) for games
+            that ended in a win, None otherwise """
+        with open(path) as f:
+            lines = [line.strip() for line in f]
+        size, moves = None, []
+        for line in lines:
+            if line.startswith("Board is "):
+                size = int(line[len("Board is "):].split("x")[0])
+            fields = line.split(",")
+            if len(fields) < 4 or not fields[0].isdigit():
+                continue
+            if fields[0] == "0":
+                if fields[2] == "End":
+                    if fields[3] != "Win" or size is None:
+                        return None
+                    # the winner made the last stone move
+                    stones = [m for m in moves if m != "SWAP"]
+                    red_turn = len(stones) % 2 == 1
+                    return size, moves, "R" if red_turn else "B"
+                continue
+            if fields[3] == "SWAP":
+                moves.append("SWAP")
+            elif fields[2].lstrip("-").isdigit() and int(fields[2]) >= 0:
+                moves.append((int(fields[2]), int(fields[3])))
+        return None
+
+    def add_logs(self, path):
+        """ Adds every won game from a CSV log file or directory of them """
+        paths = [path]
+        if isdir(path):
+            paths = [join(path, name) for name in sorted(listdir(path)) if name.endswith(".csv")]
+        games = 0
+        for log_path in paths:
+            game = BookBuilder.read_log(log_path)
+            if game is not None:
+                self.add_game(*game)
+                games += 1
+        return games
+
+    def add_mohex_games(self, games, size=11, max_time=1.0):
+        """ Plays MoHex against itself from random first moves and adds the
+            games. Slow, meant to be run offline """
+        from MoHex import MoHex
+
+        mohex = MoHex(board_size=size, ponder=False)
+        mohex.set_max_time(max_time)
+        rng = Random()
+        try:
+            for game in range(games):
+                mohex.command("clear_board")
+                bb = Bitboard(size)
+                moves = []
+                colour = "R"
+                while bb.winner() == 0:
+                    gtp_colour = mohex.mohex_colour_map[colour][0]
+                    if len(moves) == 0:
+                        move = rng.choice(bb.empty_cells())
+                        x, y = mohex.hex_to_mohex_board(move[0], str(move[1]))
+                        mohex.command(f"play {gtp_colour} {x}{y}")
+                    else:
+                        response = mohex.command(f"genmove {gtp_colour}", timeout=max_time + 10)
+                        letter, number = mohex.separate_letter_and_number(response)
+                        if letter == "" or number == "":
+                            # resigned or failed, score the game for the other side
+                            break
+                        move = mohex.mohex_to_hex_board(letter, number)
+                    bb.play(move[0], move[1], colour)
+                    moves.append(move)
+                    colour = "B" if colour == "R" else "R"
+                winner = {1: "R", -1: "B"}.get(bb.winner(), "B" if colour == "R" else "R")
+                self.add_game(size, moves, winner)
+        finally:
+            mohex._close()
+
+    def write(self, path):
+        """ Writes the collected statistics as a book file sorted by hash """
+        records = []
+        for h, moves in self.stats.items():
+            for cell, (wins, games) in moves.items():
+                records.append((h, cell, wins / games, int(round(games))))
+        records.sort()
+        with open(path, "wb") as f:
+            f.write(OpeningBook.HEADER.pack(OpeningBook.MAGIC, len(records)))
+            for record in records:
+                f.write(OpeningBook.RECORD.pack(*record))
+        return len(records)
+
+
+if (__name__ == "__main__"):
+    # python3 OpeningBook.py [out=path] [-seed] [logs=path] [mohex=games] [plies=n] [b=size] [time=s]
+    out, logs, mohex_games, plies, size, max_time = OpeningBook.DEFAULT_PATH, None, 0, 8, 11, 1.0
+    seed = "-seed" in argv
+    for argument in argv[1:]:
+        if "=" in argument:
+            key, value = argument.split("=", 1)
+            if key == "out":
+                out = value
+            elif key == "logs":
+                logs = value
+            elif key == "mohex":
+                mohex_games = int(value)
+            elif key == "plies":
+                plies = int(value)
+            elif key in ("b", "board_size"):
+                size = int(value)
+            elif key == "time":
+                max_time = float(value)
+
+    builder = BookBuilder(max_plies=plies)
+    if seed:
+        builder.add_seed()
+    if logs is not None:
+        print(f"read {builder.add_logs(logs)} games from {logs}")
+    if mohex_games > 0:
+        builder.add_mohex_games(mohex_games, size, max_time)
+    print(f"wrote {builder.write(out)} records to {out}")
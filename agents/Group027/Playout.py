@@ -0,0 +1,108 @@
+from random import random, randrange, choice
+from Bitboard import Bitboard
+from HexTables import HexTables
+
+
+class PlayoutPolicy():
+    """ Weighted playout policy for MCTS simulations.
+        Each move first answers an intrusion into one of the mover's bridges or
+        edge templates, otherwise it plays next to the last move with probability
+        local_prob, otherwise it plays uniformly at random. Every lookup is into
+        tables precomputed per board size, so a move costs O(1). """
+
+    # response tables cached per board size
+    _tables = {}
+
+    def __init__(self, local_prob=0.5):
+        self.local_prob = local_prob
+
+    @staticmethod
+    def get_tables(size):
+        """ Returns colour -> table where table[p] lists (a, b, q) meaning: if the
+            opponent just played p while a and b are the mover's stones and q is
+            empty, the mover saves the connection by playing q. b is -1 when the
+            connection is an edge template, as the edge always belongs to the mover """
+
+        tables = PlayoutPolicy._tables.get(size)
+        if tables is None:
+            hex_tables = HexTables.get(size)
+            bridge_responses = [[] for c in range(hex_tables.cells)]
+            for c in range(hex_tables.cells):
+                for other, p, q in hex_tables.bridges[c]:
+                    # each bridge is listed from both ends, keep one
+                    if c < other:
+                        bridge_responses[p].append((c, other, q))
+                        bridge_responses[q].append((c, other, p))
+
+            tables = {}
+            for colour in ["R", "B"]:
+                responses = [list(r) for r in bridge_responses]
+                for templates in hex_tables.edge_templates[colour]:
+                    for c, p, q in templates:
+                        responses[p].append((c, -1, q))
+                        responses[q].append((c, -1, p))
+                tables[colour] = [tuple(r) for r in responses]
+            PlayoutPolicy._tables[size] = tables
+        return tables
+
+    def simulate(self, board, player, last_move=None):
+        """ Plays out the Bitboard position with player to move until the board is
+            full. Return 1 for Red win, -1 for Blue win """
+
+        size = board.size
+        hex_tables = HexTables.get(size)
+        neighbours = hex_tables.neighbours
+        tables = self.get_tables(size)
+        local_prob = self.local_prob
+
+        cells = list(board.to_string().replace(",", ""))
+        empties = [c for c in range(hex_tables.cells) if cells[c] == "0"]
+        position = [-1] * hex_tables.cells
+        for k, c in enumerate(empties):
+            position[c] = k
+
+        last = -1 if last_move is None else last_move[0] * size + last_move[1]
+        to_move = player
+        opp = "B" if player == "R" else "R"
+
+        while empties:
+            move = -1
+            if last >= 0:
+                # save a bridge or edge template the opponent just intruded on
+                for a, b, q in tables[to_move][last]:
+                    if cells[q] == "0" and cells[a] == to_move and (b < 0 or cells[b] == to_move):
+                        move = q
+                        break
+                # otherwise often reply next to the last move
+                if move < 0 and random() < local_prob:
+                    near = [n for n in neighbours[last] if cells[n] == "0"]
+                    if near:
+                        move = choice(near)
+            if move < 0:
+                move = empties[randrange(len(empties))]
+
+            # swap remove move from the empty list
+            k = position[move]
+            tail = empties.pop()
+            if tail != move:
+                empties[k] = tail
+                position[tail] = k
+
+            cells[move] = to_move
+            last = move
+            to_move, opp = opp, to_move
+
+        # on a full board exactly one side is connected
+        line = "".join(cells)
+        full = Bitboard.from_string(",".join(line[i * size:(i + 1) * size] for i in range(size)))
+        return 1 if full.connects("R") else -1
+
+
+if (__name__ == "__main__"):
+    from time import perf_counter
+
+    policy = PlayoutPolicy()
+    board = Bitboard(11)
+    start_time = perf_counter()
+    results = [policy.simulate(board, "R") for i in range(1000)]
+    print(f"red wins {results.count(1)} / 1000 in {perf_counter() - start_time:.2f}s")
@@ -0,0 +1,218 @@
+from itertools import count
+import numpy as np
+from HexTables import HexTables
+from PositionCache import PositionCache
+
+
+class PolicyValueNet():
+    """ Small convolutional policy/value network over the hex grid, run on the
+        CPU with numpy. Positions are always seen by the player to move in Red's
+        orientation: Blue's positions are transposed with the colours swapped, so
+        one set of weights plays both sides.
+
+        The input is INPUT_PLANES planes over the board padded by one cell on
+        every side: the mover's stones, the opponent's stones and the empty
+        cells. The padding rows hold the mover's stones and the padding columns
+        the opponent's, so the edges look like connected stones. Each hidden
+        layer is a hex convolution, whose kernel covers a cell and its six
+        neighbours, followed by a ReLU. The policy head is a 1x1 convolution
+        giving a logit per cell, softmaxed over the empty cells. The value head
+        is a 1x1 convolution and ReLU, averaged over the board into a dense
+        layer and a tanh, giving a value in (-1, 1) for the mover.
+
+        Weights are an .npz archive as written by save, with arrays:
+        * "hidden_w{k}" (out, in, 7) and "hidden_b{k}" (out) for layer k, the
+        kernel taps in the order of TAPS,
+        * "policy_w" (channels) and "policy_b" (),
+        * "value_w" (value_channels, channels) and "value_b" (value_channels),
+        * "value_fc_w" (value_channels) and "value_fc_b" ().
+        None of them depend on the board size, so weights trained on one size
+        run on any other. Training from self-play records happens outside the
+        agent, any trainer writing this layout will do. """
+
+    INPUT_PLANES = 3
+
+    # kernel taps as (row, column) offsets: the cell, then its neighbours
+    # clockwise from top left
+    TAPS = [(0, 0)] + list(zip(HexTables.I_DISPLACEMENTS, HexTables.J_DISPLACEMENTS))
+
+    # evaluations are cached per network
+    _ids = count()
+
+    def __init__(self, hidden, policy, value, value_fc):
+        """ hidden is a list of (w, b) per layer, policy is (w, b), value is
+            (w, b) and value_fc is (w, b), shaped as in the weights file """
+        self._hidden = [
+            (np.asarray(w, dtype=np.float32).reshape(len(w), -1), np.asarray(b, dtype=np.float32))
+            for w, b in hidden
+        ]
+        self._policy = tuple(np.asarray(x, dtype=np.float32) for x in policy)
+        self._value = tuple(np.asarray(x, dtype=np.float32) for x in value)
+        self._value_fc = tuple(np.asarray(x, dtype=np.float32) for x in value_fc)
+
+        # the net only knows the colour swap, so rotations are separate entries
+        self.evaluate_board = PositionCache.wrap(
+            self._evaluate_board, ("policyvaluenet.evaluate", next(PolicyValueNet._ids)), rotate=False
+        )
+
+    ### WEIGHTS
+
+    @staticmethod
+    def load(path):
+        """ Reads a network from an .npz weights file, see the class docstring """
+        with np.load(path) as weights:
+            layers = 0
+            while f"hidden_w{layers}" in weights:
+                layers += 1
+            return PolicyValueNet(
+                [(weights[f"hidden_w{k}"], weights[f"hidden_b{k}"]) for k in range(layers)],
+                (weights["policy_w"], weights["policy_b"]),
+                (weights["value_w"], weights["value_b"]),
+                (weights["value_fc_w"], weights["value_fc_b"])
+            )
+
+    def save(self, path):
+        """ Writes the network to an .npz weights file """
+        taps = len(PolicyValueNet.TAPS)
+        weights = {}
+        for k, (w, b) in enumerate(self._hidden):
+            weights[f"hidden_w{k}"] = w.reshape(len(w), -1, taps)
+            weights[f"hidden_b{k}"] = b
+        weights["policy_w"], weights["policy_b"] = self._policy
+        weights["value_w"], weights["value_b"] = self._value
+        weights["value_fc_w"], weights["value_fc_b"] = self._value_fc
+        np.savez(path, **weights)
+
+    @staticmethod
+    def random(channels=32, layers=4, value_channels=8, seed=None):
+        """ An untrained network with He initialised weights, for testing and
+            benchmarking. Its priors and values are noise """
+        rng = np.random.default_rng(seed)
+        taps = len(PolicyValueNet.TAPS)
+        hidden = []
+        inputs = PolicyValueNet.INPUT_PLANES
+        for k in range(layers):
+            scale = np.sqrt(2 / (inputs * taps))
+            hidden.append((rng.normal(0, scale, (channels, inputs, taps)), np.zeros(channels)))
+            inputs = channels
+        return PolicyValueNet(
+            hidden,
+            (rng.normal(0, np.sqrt(1 / channels), channels), np.zeros(())),
+            (rng.normal(0, np.sqrt(2 / channels), (value_channels, channels)), np.zeros(value_channels)),
+            (rng.normal(0, np.sqrt(1 / value_channels), value_channels), np.zeros(()))
+        )
+
+    ### INFERENCE
+
+    @staticmethod
+    def encode(board, player):
+        """ Input planes of board with player to move, shaped (INPUT_PLANES,
+            size + 2, size + 2), in the orientation where player is Red """
+        cells = np.array(board)
+        if player == "B":
+            cells = cells.T
+            own, other = cells == "B", cells == "R"
+        else:
+            own, other = cells == "R", cells == "B"
+
+        size = len(board)
+        planes = np.zeros((PolicyValueNet.INPUT_PLANES, size + 2, size + 2), dtype=np.float32)
+        planes[0, 1:-1, 1:-1] = own
+        planes[1, 1:-1, 1:-1] = other
+        planes[2, 1:-1, 1:-1] = cells == "0"
+        planes[0, [0, -1], 1:-1] = 1
+        planes[1, 1:-1, [0, -1]] = 1
+        return planes
+
+    @staticmethod
+    def _hex_conv(x, w, b):
+        """ Hex convolution of x (batch, in, height, width) with w (out, in * 7),
+            keeping the size by zero padding """
+        batch, channels, height, width = x.shape
+        padded = np.pad(x, ((0, 0), (0, 0), (1, 1), (1, 1)))
+        taps = np.stack([
+            padded[:, :, 1 + di:1 + di + height, 1 + dj:1 + dj + width]
+            for di, dj in PolicyValueNet.TAPS
+        ], axis=2).reshape(batch, channels * len(PolicyValueNet.TAPS), height * width)
+        out = np.matmul(w, taps) + b[:, None]
+        return out.reshape(batch, len(w), height, width)
+
+    def forward(self, planes):
+        """ Runs a batch of encoded positions (batch, INPUT_PLANES, size + 2,
+            size + 2). Returns the policy logits (batch, size * size) and the
+            values (batch), both in the encoded orientation """
+        x = planes
+        for w, b in self._hidden:
+            x = np.maximum(PolicyValueNet._hex_conv(x, w, b), 0)
+        # drop the padding, the heads only look at the board
+        x = x[:, :, 1:-1, 1:-1]
+        batch = len(x)
+        features = x.reshape(batch, x.shape[1], -1)
+
+        policy_w, policy_b = self._policy
+        logits = np.einsum("c,bcn->bn", policy_w, features) + policy_b
+
+        value_w, value_b = self._value
+        hidden = np.maximum(np.matmul(value_w, features) + value_b[:, None], 0).mean(axis=2)
+        value_fc_w, value_fc_b = self._value_fc
+        values = np.tanh(hidden @ value_fc_w + value_fc_b)
+        return logits, values
+
+    def evaluate(self, boards, players):
+        """ Evaluates many positions in one forward pass, boards being lists of
+            lists of the same size and players who is to move in each. Returns
+            (policies, values): policies (batch, size * size) holds move
+            probabilities over each board's empty cells indexed i * size + j,
+            values (batch) is in (-1, 1) for the player to move """
+        size = len(boards[0])
+        planes = np.stack([PolicyValueNet.encode(board, player) for board, player in zip(boards, players)])
+        logits, values = self.forward(planes)
+
+        # back to each board's own orientation, Blue's positions were transposed
+        logits = logits.reshape(-1, size, size)
+        blue = np.array([player == "B" for player in players])
+        logits[blue] = logits[blue].transpose(0, 2, 1)
+        logits = logits.reshape(-1, size * size)
+
+        empty = planes[:, 2, 1:-1, 1:-1]
+        empty[blue] = empty[blue].transpose(0, 2, 1)
+        empty = empty.reshape(-1, size * size) > 0
+        logits = np.where(empty, logits, -np.inf)
+        logits -= logits.max(axis=1, keepdims=True)
+        policies = np.exp(logits)
+        policies /= policies.sum(axis=1, keepdims=True)
+        return policies, values
+
+    def move_priors(self, board, player):
+        """ Returns a dictionary of empty cell -> prior in (0, 1], the policy
+            scaled so the best move gets 1, for MCTS's prior_fn """
+        policies, values = self.evaluate([board], [player])
+        policy = policies[0]
+        best = policy.max()
+        size = len(board)
+        return {
+            divmod(int(c), size): float(policy[c] / best)
+            for c in np.flatnonzero(policy > 0)
+        }
+
+    def _evaluate_board(self, board, player):
+        """ Returns the value in (-1, 1) for player, for AlphaBeta's eval_fn """
+        policies, values = self.evaluate([board], [player])
+        return max(-0.999, min(0.999, float(values[0])))
+
+
+if (__name__ == "__main__"):
+    from time import perf_counter
+    from BoardSupport import BoardSupport
+
+    board_size = 11
+    net = PolicyValueNet.random(seed=0)
+    board = BoardSupport.create_board(board_size)
+    board[5][5] = "R"
+
+    for batch in [1, 16, 64]:
+        start_time = perf_counter()
+        net.evaluate([board] * batch, ["B"] * batch)
+        elapsed = perf_counter() - start_time
+        print(f"batch {batch:>3}: {elapsed * 1000:.2f}ms, {batch / elapsed:.0f} positions/s")
+    print(net.evaluate_board(board, "B"))
@@ -0,0 +1,211 @@
+import os
+import sys
+from collections import OrderedDict
+from functools import partial
+
+
+class PositionCache():
+    """ Process wide cache of position evaluations, shared by the evaluators.
+        Positions are keyed by a canonical form under the symmetries of hex:
+        the 180 degree rotation, and swapping the colours while transposing the
+        board, which turns Red's top-bottom game into Blue's left-right one.
+        Either symmetry maps a position onto one that evaluates the same for
+        the mapped player, so the four forms of a position share one entry.
+
+        Entries are kept in least recently used order and evicted once their
+        estimated size passes HEX_CACHE_BYTES (64MB by default). The cache is
+        on unless the HEX_CACHE environment variable is "" or "0"; ENABLED is
+        checked on every call so benchmarks can turn it off at run time.
+
+        Only pure functions of the position may be cached. Results that depend
+        on the orientation, like cells or winners, need a transform that maps
+        them between a position and its canonical form, eg. map_path. Functions
+        that are not symmetric under rotation, like Resistance which treats its
+        two edges differently, are cached with rotate=False. """
+
+    ENABLED = os.environ.get("HEX_CACHE", "1") not in ("", "0")
+    MAX_BYTES = int(os.environ.get("HEX_CACHE_BYTES", 64 * 2**20))
+
+    # symmetries taking a position to its canonical form, as bit flags
+    IDENTITY = 0
+    ROTATE = 1
+    SWAP = 2
+
+    # rough bytes of bookkeeping per entry: the ordered dict node and key tuple
+    ENTRY_OVERHEAD = 200
+
+    _SWAP_COLOURS = str.maketrans("RB", "BR")
+    _MISSING = object()
+
+    # key -> (value, estimated bytes)
+    _entries = OrderedDict()
+    _bytes = 0
+    hits = 0
+    misses = 0
+
+    ### CANONICAL FORM
+
+    @staticmethod
+    def canonical(board, player=None, rotate=True):
+        """ Returns (key, symmetry) where key is the smallest of the position's
+            four symmetric forms as a string, with the mapped player appended,
+            and symmetry the flags that take the position there. Without
+            rotate only the colour swap is considered """
+        size = len(board)
+        cells = "".join(map("".join, board))
+        swapped = "".join(cells[j::size] for j in range(size)).translate(PositionCache._SWAP_COLOURS)
+        if player is None:
+            player = other = ""
+        else:
+            other = "B" if player == "R" else "R"
+
+        key, symmetry = cells + player, PositionCache.IDENTITY
+        forms = [(swapped + other, PositionCache.SWAP)]
+        if rotate:
+            forms += [
+                (cells[::-1] + player, PositionCache.ROTATE),
+                (swapped[::-1] + other, PositionCache.ROTATE | PositionCache.SWAP)
+            ]
+        for form, flags in forms:
+            if form < key:
+                key, symmetry = form, flags
+        return key, symmetry
+
+    @staticmethod
+    def map_cell(cell, size, symmetry):
+        """ Maps a (row, column) cell through symmetry, which is its own inverse """
+        i, j = cell
+        if symmetry & PositionCache.SWAP:
+            i, j = j, i
+        if symmetry & PositionCache.ROTATE:
+            i, j = size - 1 - i, size - 1 - j
+        return (i, j)
+
+    @staticmethod
+    def map_path(path, size, symmetry):
+        """ Transform for functions returning a list of cells, always a new list
+            so callers can not change the cached one """
+        if symmetry == PositionCache.IDENTITY:
+            return list(path)
+        return [PositionCache.map_cell(cell, size, symmetry) for cell in path]
+
+    @staticmethod
+    def map_winner(winner, size, symmetry):
+        """ Transform for check_winner style results, 1 for Red and -1 for Blue """
+        return -winner if symmetry & PositionCache.SWAP else winner
+
+    ### STORE
+
+    @staticmethod
+    def get(key, default=None):
+        entry = PositionCache._entries.get(key)
+        if entry is None:
+            PositionCache.misses += 1
+            return default
+        PositionCache.hits += 1
+        PositionCache._entries.move_to_end(key)
+        return entry[0]
+
+    @staticmethod
+    def put(key, value):
+        """ Stores value under key, evicting the least recently used entries
+            while the cache is over MAX_BYTES """
+        entries = PositionCache._entries
+        old = entries.pop(key, None)
+        if old is not None:
+            PositionCache._bytes -= old[1]
+        size = PositionCache.ENTRY_OVERHEAD + sys.getsizeof(key[-1]) + PositionCache._size(value)
+        entries[key] = (value, size)
+        PositionCache._bytes += size
+        while PositionCache._bytes > PositionCache.MAX_BYTES and len(entries) > 1:
+            _, (_, evicted) = entries.popitem(last=False)
+            PositionCache._bytes -= evicted
+
+    @staticmethod
+    def _size(value):
+        """ Estimated bytes of a value, counting one level of containers """
+        size = sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            size += sum(sys.getsizeof(item) for item in value)
+        return size
+
+    @staticmethod
+    def clear():
+        PositionCache._entries.clear()
+        PositionCache._bytes = 0
+        PositionCache.hits = 0
+        PositionCache.misses = 0
+
+    @staticmethod
+    def stats():
+        return {
+            "entries": len(PositionCache._entries),
+            "bytes": PositionCache._bytes,
+            "hits": PositionCache.hits,
+            "misses": PositionCache.misses
+        }
+
+    ### WRAPPING
+
+    @staticmethod
+    def call(fn, name, transform, rotate, board, player, *args, **kwargs):
+        """ fn(board, player, ...) through the cache under name, which must
+            tell fn apart from every other cached function. transform(result,
+            size, symmetry) maps a result to and from the canonical position,
+            results that do not depend on the orientation need none """
+        if not PositionCache.ENABLED:
+            return fn(board, player, *args, **kwargs)
+        position, symmetry = PositionCache.canonical(board, player, rotate)
+        key = (name, args, tuple(kwargs.items()), position)
+        result = PositionCache.get(key, PositionCache._MISSING)
+        if result is PositionCache._MISSING:
+            result = fn(board, player, *args, **kwargs)
+            canonical_result = result
+            if transform is not None:
+                canonical_result = transform(result, len(board), symmetry)
+            PositionCache.put(key, canonical_result)
+            return result
+        if transform is not None:
+            result = transform(result, len(board), symmetry)
+        return result
+
+    @staticmethod
+    def wrap(fn, name, transform=None, rotate=True):
+        """ fn(board, player, *args) with its results cached, see call """
+
+        def cached_fn(board, player, *args, **kwargs):
+            return PositionCache.call(fn, name, transform, rotate, board, player, *args, **kwargs)
+        cached_fn.__name__ = getattr(fn, "__name__", str(name))
+        cached_fn.__doc__ = getattr(fn, "__doc__", None)
+        cached_fn.rotate = rotate
+        return cached_fn
+
+    @staticmethod
+    def cached(name, transform=None, rotate=True):
+        """ Decorator form of wrap for methods, whose results must not depend
+            on the instance beyond what name says """
+
+        def decorator(method):
+            def cached_method(self, board, player, *args, **kwargs):
+                return PositionCache.call(
+                    partial(method, self), name, transform, rotate, board, player, *args, **kwargs
+                )
+            cached_method.__name__ = method.__name__
+            cached_method.__doc__ = method.__doc__
+            # lets callers caching on top, like AlphaBeta, use the same symmetries
+            cached_method.rotate = rotate
+            return cached_method
+        return decorator
+
+
+if (__name__ == "__main__"):
+    from BoardSupport import BoardSupport
+
+    board = BoardSupport.create_board(5)
+    board[0][1] = "R"
+    rotated = BoardSupport.create_board(5)
+    rotated[4][3] = "R"
+    swapped = BoardSupport.create_board(5)
+    swapped[1][0] = "B"
+    for b, player in [(board, "R"), (rotated, "R"), (swapped, "B")]:
+        print(PositionCache.canonical(b, player))
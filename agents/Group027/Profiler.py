@@ -0,0 +1,133 @@
+import json
+import os
+from time import perf_counter
+
+
+class Profiler():
+    """ Process wide instrumentation for the search code.
+        Enabled by setting the HEX_PROFILE environment variable to anything but
+        "" or "0". Timers keep a count, total, maximum and a histogram of their
+        durations in power of two microsecond buckets, counters are plain sums.
+        end_move appends one JSON object per move with every timer, counter and
+        their per second rates to HEX_PROFILE_FILE (hex_profile.jsonl by
+        default), then starts afresh.
+
+        When disabled, timed and wrap hand back the function unchanged and hot
+        loops guard their timing with "if Profiler.ENABLED", so the cost is one
+        attribute lookup per phase. """
+
+    ENABLED = os.environ.get("HEX_PROFILE", "") not in ("", "0")
+    PATH = os.environ.get("HEX_PROFILE_FILE", "hex_profile.jsonl")
+
+    # name -> [count, total seconds, max seconds, {bucket: count}]
+    _timers = {}
+    # name -> total
+    _counters = {}
+    _move_start = None
+    _moves = 0
+
+    ### RECORDING
+
+    @staticmethod
+    def record(name, seconds):
+        """ Adds one timing of seconds to the timer name """
+        timer = Profiler._timers.get(name)
+        if timer is None:
+            timer = Profiler._timers[name] = [0, 0.0, 0.0, {}]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        timer[3][bucket] = timer[3].get(bucket, 0) + 1
+
+    @staticmethod
+    def count(name, amount=1):
+        Profiler._counters[name] = Profiler._counters.get(name, 0) + amount
+
+    @staticmethod
+    def wrap(fn, name):
+        """ fn timed under name, or fn itself when profiling is off """
+        if not Profiler.ENABLED:
+            return fn
+
+        def timed_fn(*args, **kwargs):
+            start_time = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                Profiler.record(name, perf_counter() - start_time)
+        timed_fn.__name__ = getattr(fn, "__name__", name)
+        timed_fn.__doc__ = getattr(fn, "__doc__", None)
+        timed_fn.__dict__.update(getattr(fn, "__dict__", {}))
+        return timed_fn
+
+    @staticmethod
+    def timed(name):
+        """ Decorator form of wrap """
+        return lambda fn: Profiler.wrap(fn, name)
+
+    ### REPORTING
+
+    @staticmethod
+    def start_move():
+        if Profiler.ENABLED:
+            Profiler.reset()
+
+    @staticmethod
+    def snapshot():
+        """ Everything recorded since the last reset as a JSON ready dict """
+        elapsed = 0.0
+        if Profiler._move_start is not None:
+            elapsed = perf_counter() - Profiler._move_start
+        timers = {}
+        for name, (count, total, longest, buckets) in Profiler._timers.items():
+            timers[name] = {
+                "count": count,
+                "total": total,
+                "mean": total / count,
+                "max": longest,
+                # upper bound in microseconds -> count
+                "histogram": {str(1 << bucket): n for bucket, n in sorted(buckets.items())}
+            }
+        rates = {}
+        if elapsed > 0:
+            rates = {name: total / elapsed for name, total in Profiler._counters.items()}
+            rates.update({f"{name}.calls": timer["count"] / elapsed for name, timer in timers.items()})
+        return {
+            "time": elapsed,
+            "timers": timers,
+            "counters": dict(Profiler._counters),
+            "per_second": rates
+        }
+
+    @staticmethod
+    def end_move(**info):
+        """ Appends the move's stats and info to the profile file """
+        if not Profiler.ENABLED:
+            return
+        Profiler._moves += 1
+        stats = {"move": Profiler._moves, **info, **Profiler.snapshot()}
+        with open(Profiler.PATH, "a") as f:
+            f.write(json.dumps(stats) + "\n")
+        Profiler.reset()
+
+    @staticmethod
+    def reset():
+        Profiler._timers = {}
+        Profiler._counters = {}
+        Profiler._move_start = perf_counter()
+
+
+if (__name__ == "__main__"):
+    # summarise a profile file: mean time of every timer across moves
+    from sys import argv
+
+    totals = {}
+    with open(argv[1] if len(argv) > 1 else Profiler.PATH) as f:
+        for line in f:
+            for name, timer in json.loads(line)["timers"].items():
+                count, total = totals.get(name, (0, 0.0))
+                totals[name] = (count + timer["count"], total + timer["total"])
+    for name, (count, total) in sorted(totals.items()):
+        print(f"{name:<28} {count:>10} calls {total / count * 1e6:>12.1f}us mean")
@@ -4,6 +4,8 @@ from time import sleep, perf_counter
 from copy import deepcopy
 import numpy as np
 from BoardSupport import BoardSupport
+from PositionCache import PositionCache
+from Profiler import Profiler
 import sys
 
 
@@ -58,6 +60,7 @@ class Resistance():
                         connections[cell].add(coord)
         return connections
 
+    @Profiler.timed("resistance.solve")
     def resistance(self, board, player):
         """ Calculate the resistance heuristic of the board over empty nodes
         """
@@ -160,6 +163,9 @@ class Resistance():
         return I_board, C
     
     # pass evaluate function to AB to evaluate board positions then chose best move
+    # the edges are not handled alike, so only the colour swap is a symmetry
+    @Profiler.timed("resistance.evaluate")
+    @PositionCache.cached("resistance.evaluate", rotate=False)
     def evaluate_board(self, board, player):
         sim_board = deepcopy(board)
 
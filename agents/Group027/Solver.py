@@ -0,0 +1,234 @@
+from time import perf_counter
+from Bitboard import Bitboard
+from BoardSupport import BoardSupport
+
+
+class Solver():
+    """ Depth-first proof-number search (df-pn) for endgame positions.
+        Proof and disproof numbers are kept in negamax form: phi is the proof
+        number and delta the disproof number for the player to move. Positions
+        are keyed by their two bitboard words in a transposition table.
+        Leaves are cut early by a virtual connection check: stones linked by
+        bridges and edge templates whose carriers are empty and pairwise disjoint
+        form a full connection, since the owner can answer every intrusion
+        inside the same carrier. """
+
+    INF = 10**9
+
+    # bridges as (displacement, carrier a, carrier b) in (row, column) steps,
+    # one per pair as the opposite direction finds the same bridges
+    BRIDGES = [
+        ((-2, 1), (-1, 0), (-1, 1)),
+        ((-1, -1), (0, -1), (-1, 0)),
+        ((-1, 2), (-1, 1), (0, 1))
+    ]
+
+    # bridge and edge template shift tables cached per board size
+    _tables = {}
+
+    def __init__(self, max_entries=2000000):
+        self.max_entries = max_entries
+        self.tt = {}
+        self.nodes = 0
+
+    @staticmethod
+    def get_tables(size):
+        """ Returns (bridges, templates) as bit shifts on a Bitboard of size.
+            bridges lists (source mask, partner shift, carrier shifts) and
+            templates maps colour -> list of (source mask, carrier shifts) """
+
+        tables = Solver._tables.get(size)
+        if tables is None:
+            stride = size + 1
+
+            def cells(test):
+                mask = 0
+                for i in range(size):
+                    for j in range(size):
+                        if test(i, j):
+                            mask |= 1 << (i * stride + j)
+                return mask
+
+            def on_board(i, j):
+                return 0 <= i < size and 0 <= j < size
+
+            bridges = []
+            for (di, dj), (ai, aj), (bi, bj) in Solver.BRIDGES:
+                bridges.append((
+                    # cells whose displaced partner is still on the board
+                    cells(lambda i, j: on_board(i + di, j + dj)),
+                    di * stride + dj,
+                    (ai * stride + aj, bi * stride + bj)
+                ))
+
+            # second row cells and the two edge cells joining them to the edge
+            templates = {"R": [], "B": []}
+            if size > 2:
+                templates["R"] = [
+                    (cells(lambda i, j: i == 1 and j < size - 1), (-stride, -stride + 1)),
+                    (cells(lambda i, j: i == size - 2 and j > 0), (stride - 1, stride))
+                ]
+                templates["B"] = [
+                    (cells(lambda i, j: j == 1 and i < size - 1), (-1, stride - 1)),
+                    (cells(lambda i, j: j == size - 2 and i > 0), (1, -stride + 1))
+                ]
+            tables = (bridges, templates)
+            Solver._tables[size] = tables
+        return tables
+
+    @staticmethod
+    def shift(mask, offset):
+        return mask << offset if offset > 0 else mask >> -offset
+
+    def virtual_connects(self, bb, colour):
+        """ Checks if colour's stones join its edges when every intact bridge and
+            edge template whose carrier shares no cell with another one counts as
+            a link. Carriers are never filled in, only their end points are joined """
+
+        bridges, templates = self.get_tables(bb.size)
+        shift = Solver.shift
+        stones = bb.stones(colour)
+        empty = bb.empty()
+        links = []
+
+        for source, offset, carrier in bridges:
+            found = stones & source & shift(stones, -offset)
+            for c in carrier:
+                found &= shift(empty, -c)
+            links.append((found, carrier, offset))
+        for source, carrier in templates[colour]:
+            found = stones & source
+            for c in carrier:
+                found &= shift(empty, -c)
+            links.append((found, carrier, None))
+
+        # drop every link whose carrier is claimed twice
+        seen, shared = 0, 0
+        for found, carrier, offset in links:
+            for c in carrier:
+                cells = shift(found, c)
+                shared |= seen & cells
+                seen |= cells
+        for k, (found, carrier, offset) in enumerate(links):
+            for c in carrier:
+                found &= ~shift(shared, -c)
+            links[k] = found
+
+        front, back = bb.edge_masks[colour]
+        front_templates, back_templates = (links[-2], links[-1]) if templates[colour] else (0, 0)
+        bridge_links = [(links[k], bridges[k][1]) for k in range(len(bridges))]
+
+        # flood through adjacent stones and linked bridge ends
+        reached = stones & front | front_templates
+        while True:
+            grown = bb.expand(reached) & stones
+            for found, offset in bridge_links:
+                grown |= shift(reached & found, offset) | shift(reached & shift(found, offset), -offset)
+            grown |= reached
+            if grown == reached:
+                break
+            reached = grown
+        return (reached & (back | back_templates)) != 0
+
+    def evaluate(self, bb, to_move):
+        """ Returns (phi, delta) if the position is decided, None otherwise """
+
+        opp = BoardSupport.opp_player(to_move)
+        if bb.connects(opp):
+            return (Solver.INF, 0)
+        if self.virtual_connects(bb, opp):
+            return (Solver.INF, 0)
+        if self.virtual_connects(bb, to_move):
+            return (0, Solver.INF)
+        return None
+
+    def lookup(self, bb, to_move):
+        """ Transposition table entry of a position, evaluating it on first sight """
+
+        key = (bb.red, bb.blue, to_move)
+        entry = self.tt.get(key)
+        if entry is None:
+            entry = self.evaluate(bb, to_move) or (1, 1)
+            self.store(key, entry)
+        return entry
+
+    def store(self, key, entry):
+        if len(self.tt) >= self.max_entries:
+            self.tt.clear()
+        self.tt[key] = entry
+
+    def children(self, bb, to_move):
+        children = []
+        for move in bb.empty_cells():
+            child = bb.copy()
+            child.play(move[0], move[1], to_move)
+            children.append((move, child))
+        return children
+
+    def mid(self, bb, to_move, thphi, thdelta):
+        """ Multiple iterative deepening: expands the position until its phi or
+            delta reaches its threshold or the time runs out """
+
+        self.nodes += 1
+        if perf_counter() > self._end_time:
+            self._stopped = True
+            return
+
+        key = (bb.red, bb.blue, to_move)
+        phi, delta = self.lookup(bb, to_move)
+        if phi == 0 or delta == 0:
+            return
+
+        opp = BoardSupport.opp_player(to_move)
+        children = self.children(bb, to_move)
+        while True:
+            phi, delta = Solver.INF, 0
+            best, best_phi, delta2 = None, 0, Solver.INF
+            for move, child in children:
+                c_phi, c_delta = self.lookup(child, opp)
+                delta = min(Solver.INF, delta + c_phi)
+                if c_delta < phi:
+                    delta2 = phi
+                    phi = c_delta
+                    best, best_phi = child, c_phi
+                elif c_delta < delta2:
+                    delta2 = c_delta
+
+            self.store(key, (phi, delta))
+            if phi >= thphi or delta >= thdelta or self._stopped:
+                return
+
+            c_thphi = min(Solver.INF, thdelta - (delta - best_phi))
+            c_thdelta = min(thphi, delta2 + 1)
+            self.mid(best, opp, c_thphi, c_thdelta)
+            if self._stopped:
+                return
+
+    def solve(self, board, player, max_time=1.0):
+        """ Searches board with player to move for up to max_time seconds.
+            Returns a proven winning move for player, or None if the position
+            could not be proven a win in time """
+
+        bb = Bitboard.from_board(board)
+        self._end_time = perf_counter() + max_time
+        self._stopped = False
+        self.nodes = 0
+
+        self.mid(bb, player, Solver.INF, Solver.INF)
+        phi, delta = self.lookup(bb, player)
+        if phi != 0:
+            return None
+
+        opp = BoardSupport.opp_player(player)
+        for move, child in self.children(bb, player):
+            if self.lookup(child, opp)[1] == 0:
+                return move
+        return None
+
+
+if (__name__ == "__main__"):
+    solver = Solver()
+    board = BoardSupport.create_board(4)
+    start_time = perf_counter()
+    move = solver.solve(board, "R", max_time=30)
+    print(f"move={move}; nodes={solver.nodes}; time={perf_counter() - start_time:.2f}")
@@ -0,0 +1,102 @@
+from time import perf_counter
+from Dijkstra import Dijkstra
+
+
+class TimeManager():
+    """ Per-move time allocation against the game clock.
+        The engine charges each player for the time between sending a move
+        request and reading the reply, up to Game.MAXIMUM_TIME for the whole
+        game. The manager accumulates the time spent in every move, splits
+        what is left over an estimate of the moves still to play and scales
+        each share by how critical the position is. """
+
+    # Game.MAXIMUM_TIME in seconds
+    TOTAL_TIME = 5 * 60
+    # kept back for socket and process overhead the agent cannot measure
+    RESERVE = 10.0
+    # never plan for fewer moves than this
+    MIN_MOVES_LEFT = 4
+    # share of the empty cells one player is expected to fill before the game ends
+    FILL_RATE = 0.3
+
+    def __init__(self, board_size=11, total_time=TOTAL_TIME, min_time=0.1, max_time=20.0):
+        self.board_size = board_size
+        self.total_time = total_time
+        self.min_time = min_time
+        self.max_time = max_time
+        self.used = 0.0
+        self.moves = 0
+        self._start_time = None
+        self._dijkstra = Dijkstra()
+
+    ### CLOCK
+
+    def start(self):
+        """ Starts the clock for a move, call as soon as the request arrives """
+        self._start_time = perf_counter()
+
+    def stop(self):
+        """ Stops the clock after the move is sent, returns the move's time """
+        if self._start_time is None:
+            return 0.0
+        elapsed = perf_counter() - self._start_time
+        self.used += elapsed
+        self.moves += 1
+        self._start_time = None
+        return elapsed
+
+    def elapsed(self):
+        """ Time spent on the current move so far """
+        if self._start_time is None:
+            return 0.0
+        return perf_counter() - self._start_time
+
+    def remaining(self):
+        """ Clock time left for the rest of the game, including this move """
+        return max(0.0, self.total_time - self.used - self.elapsed())
+
+    ### ALLOCATION
+
+    def moves_left(self, board):
+        """ Estimated number of moves this player still has to make """
+        empty = sum(row.count("0") for row in board)
+        return max(TimeManager.MIN_MOVES_LEFT, empty * TimeManager.FILL_RATE)
+
+    def criticality(self, board, colour):
+        """ Multiplier in [0.5, 2] for the share of time a position deserves.
+            Positions where both players are a similar, short distance from
+            connecting decide the game and get more time, one sided ones less """
+        opp = "B" if colour == "R" else "R"
+        own = self._dijkstra.distance(board, colour)
+        other = self._dijkstra.distance(board, opp)
+        if own == float("inf") or other == float("inf"):
+            return 0.5
+        # how close the race is and how near its end, both in [0, 1]
+        balance = 1 - abs(own - other) / max(own, other, 1)
+        urgency = 1 - min(own, other) / self.board_size
+        return 0.5 + 1.5 * balance * max(0.0, urgency)
+
+    def allocate(self, board, colour):
+        """ Returns the seconds to spend on the current move """
+        available = self.remaining() - TimeManager.RESERVE
+        if available <= 0:
+            return self.min_time
+        share = available / self.moves_left(board) * self.criticality(board, colour)
+        # never bet more than a quarter of the clock on one move
+        share = min(share, available / 4, self.max_time)
+        return max(self.min_time, share)
+
+    def budget(self, allocated):
+        """ Time left of an allocation after what the move has already used """
+        return max(self.min_time, allocated - self.elapsed())
+
+
+if (__name__ == "__main__"):
+    from BoardSupport import BoardSupport
+
+    timer = TimeManager(11)
+    board = BoardSupport.create_board(11)
+    print(f"empty board: {timer.allocate(board, 'R'):.2f}s")
+    board[5][5] = "R"
+    board[4][6] = "B"
+    print(f"two stones: {timer.allocate(board, 'R'):.2f}s")
@@ -0,0 +1,142 @@
+import numpy as np
+from BoardSupport import BoardSupport
+from HexTables import HexTables
+from PositionCache import PositionCache
+
+
+class TwoDistance():
+    """ This class describes the Queenbee two-distance heuristic calculation.
+        A cell's two-distance to an edge is one more than the second best
+        two-distance among its neighbours, so a single opponent block does not
+        change it. Stones of the measured colour are collapsed into their empty
+        neighbours and opponent stones are removed. """
+
+    # two-distance given to cells that cannot reach an edge
+    UNREACHABLE = 1000
+
+    def __init__(self, board_size=11):
+        """ pass in board size """
+
+        self._board_size = board_size
+        self._tables = {}
+
+    def get_tables(self, size):
+        """ cell adjacency matrix and edge masks for a board size, built once """
+
+        if size not in self._tables:
+            hex_tables = HexTables.get(size)
+            adjacency = np.zeros((hex_tables.cells, hex_tables.cells), dtype=np.int32)
+            for c in range(hex_tables.cells):
+                adjacency[c, list(hex_tables.neighbours[c])] = 1
+            edges = {}
+            for player in ["R", "B"]:
+                front = np.zeros(hex_tables.cells, dtype=np.int32)
+                back = np.zeros(hex_tables.cells, dtype=np.int32)
+                front[list(hex_tables.edges[player][0])] = 1
+                back[list(hex_tables.edges[player][1])] = 1
+                edges[player] = (front, back)
+            self._tables[size] = (adjacency, edges)
+        return self._tables[size]
+
+    def two_distance(self, board, player):
+        """ Returns the two-distances of every cell to both of player's edges as
+            two flat arrays (UNREACHABLE for stones and cut off cells) and whether
+            player has already connected the edges """
+
+        size = len(board)
+        adjacency, edges = self.get_tables(size)
+        cells = np.array([c for row in board for c in row])
+        empty = np.flatnonzero(cells == "0")
+        stones = np.flatnonzero(cells == player)
+
+        # reachability between own stones through chains of own stones
+        reach = adjacency[np.ix_(stones, stones)] + np.eye(len(stones), dtype=np.int32)
+        reach = (reach > 0).astype(np.int32)
+        while True:
+            grown = ((reach @ reach) > 0).astype(np.int32)
+            if np.array_equal(grown, reach):
+                break
+            reach = grown
+
+        # empty cells are adjacent directly or through a shared own group
+        touching = adjacency[np.ix_(empty, stones)]
+        through = touching @ reach
+        graph = adjacency[np.ix_(empty, empty)] + (through @ touching.T)
+        np.fill_diagonal(graph, 0)
+        graph = (graph > 0).astype(np.int32)
+
+        front, back = edges[player]
+        connected = bool(front[stones] @ reach @ back[stones])
+
+        result = []
+        for edge in (front, back):
+            # cells touching the edge directly or through an own group start at 1
+            source = (edge[empty] + through @ edge[stones]) > 0
+            dist = np.full(len(empty), self.UNREACHABLE)
+            dist[source] = 1
+            level = 1
+            while True:
+                count = graph @ (dist <= level)
+                new = (dist == self.UNREACHABLE) & (count >= 2)
+                if not new.any():
+                    break
+                level += 1
+                dist[new] = level
+            board_dist = np.full(size * size, self.UNREACHABLE)
+            board_dist[empty] = dist
+            result.append(board_dist)
+
+        return result[0], result[1], connected
+
+    def potential(self, board, player):
+        """ Returns the lowest sum of front and back two-distances over all cells
+            and the number of cells achieving it (mobility) """
+
+        front, back, connected = self.two_distance(board, player)
+        if connected:
+            return 0, 0
+        total = np.minimum(front + back, self.UNREACHABLE)
+        best = int(total.min())
+        return best, int((total == best).sum())
+
+    # pass evaluate function to AB to evaluate board positions then chose best move
+    @PositionCache.cached("twodistance.evaluate")
+    def evaluate_board(self, board, player):
+        """ Returns a value in (-1, 1) for player, higher is better. The potential
+            difference dominates and mobility breaks ties """
+
+        p1, m1 = self.potential(board, player)
+        p2, m2 = self.potential(board, BoardSupport.opp_player(player))
+        if p1 + p2 == 0:
+            return 0.0
+
+        value = (p2 - p1) / (p1 + p2) + (m1 - m2) / (1000 * len(board) * len(board))
+        return max(-0.999, min(0.999, value))
+
+    def move_priors(self, board, player):
+        """ Returns a dictionary of empty cell -> prior in (0, 1]. Cells on either
+            player's best two-distance paths get 1, cells further away less """
+
+        size = len(board)
+        priors = {}
+        totals = []
+        for colour in [player, BoardSupport.opp_player(player)]:
+            front, back, connected = self.two_distance(board, colour)
+            total = np.minimum(front + back, self.UNREACHABLE)
+            totals.append((total, max(int(total.min()), 1)))
+
+        for i, j in BoardSupport.get_empty(board):
+            cell = i * size + j
+            priors[(i, j)] = max(best / total[cell] for total, best in totals)
+        return priors
+
+
+if (__name__ == "__main__"):
+    board_size = 5
+    player = "R"
+    td = TwoDistance(board_size)
+    board = BoardSupport.create_board(board_size)
+    board[2][2] = "R"
+
+    print(td.potential(board, "R"), td.potential(board, "B"))
+    print(td.evaluate_board(board, player))
@@ -0,0 +1,328 @@
+from collections import defaultdict
+from HexTables import HexTables
+from BoardSupport import BoardSupport
+
+
+class VirtualConnections():
+    """ Anshelevich H-search for one colour.
+        Nodes are empty cells, groups of the colour's stones (named by one of
+        their cells) and the colour's two edges. A full connection between two
+        nodes holds even if the opponent moves first, a semi connection holds if
+        the colour moves first at its key. Connections are stored with their
+        carriers (the empty cells they need) as ints over flat cell indices, and
+        only minimal carriers are kept.
+        AND rule: two disjoint full connections through a midpoint give a full
+        connection if the midpoint is a group and a semi connection keyed at the
+        midpoint if it is empty. OR rule: semi connections whose carriers have an
+        empty intersection give a full connection.
+        To stay tractable in Python, connections between two empty cells are
+        only the base adjacencies, edges are never used as AND midpoints and
+        each pair keeps at most max_fulls / max_semis connections. """
+
+    def __init__(self, board, colour, max_fulls=4, max_semis=6):
+        self.size = len(board)
+        self.colour = colour
+        self.opp_colour = BoardSupport.opp_player(colour)
+        self.max_fulls = max_fulls
+        self.max_semis = max_semis
+
+        self._tables = HexTables.get(self.size)
+        self.cells = [c for row in board for c in row]
+        self.front = self._tables.cells
+        self.back = self._tables.cells + 1
+
+        # node pair (low, high) -> list of carriers / list of (carrier, key)
+        self.fulls = {}
+        self.semis = {}
+        # node -> nodes it shares a full connection with
+        self.partners = defaultdict(set)
+        self._worklist = []
+
+        # stone groups as cell -> group node and group node -> member cells
+        self.group = {}
+        self.members = {}
+        for c in range(self._tables.cells):
+            if self.cells[c] == colour and c not in self.group:
+                self._flood_group(c)
+
+        self._add_base(range(self._tables.cells))
+        self._closure()
+
+    ### NODES
+
+    def _flood_group(self, c):
+        stack, members = [c], []
+        self.group[c] = c
+        while stack:
+            u = stack.pop()
+            members.append(u)
+            for n in self._tables.neighbours[u]:
+                if self.cells[n] == self.colour and n not in self.group:
+                    self.group[n] = c
+                    stack.append(n)
+        self.members[c] = members
+
+    def node(self, cell):
+        """ The node a cell belongs to, None for opponent stones """
+        if self.cells[cell] == self.opp_colour:
+            return None
+        return self.group.get(cell, cell)
+
+    def is_empty_node(self, node):
+        return node < self._tables.cells and self.cells[node] == "0"
+
+    def bit(self, node):
+        return 1 << node if self.is_empty_node(node) else 0
+
+    @staticmethod
+    def key(a, b):
+        return (a, b) if a < b else (b, a)
+
+    ### CONNECTIONS
+
+    def add_full(self, a, b, carrier):
+        """ Records a full connection, returns True if it was new and minimal """
+
+        if a == b or carrier & (self.bit(a) | self.bit(b)):
+            return False
+        if carrier and self.is_empty_node(a) and self.is_empty_node(b):
+            return False
+        k = self.key(a, b)
+        fulls = self.fulls.setdefault(k, [])
+        for existing in fulls:
+            if existing | carrier == carrier:
+                return False
+        fulls[:] = [existing for existing in fulls if existing | carrier != existing]
+        if len(fulls) >= self.max_fulls:
+            largest = max(fulls, key=int.bit_count)
+            if largest.bit_count() <= carrier.bit_count():
+                return False
+            fulls.remove(largest)
+        fulls.append(carrier)
+        self.partners[a].add(b)
+        self.partners[b].add(a)
+        self._worklist.append((a, b, carrier))
+        return True
+
+    def add_semi(self, a, b, carrier, key):
+        """ Records a semi connection keyed at key and applies the OR rule """
+
+        if a == b or carrier & (self.bit(a) | self.bit(b)):
+            return False
+        if self.is_empty_node(a) and self.is_empty_node(b):
+            return False
+        k = self.key(a, b)
+        for full in self.fulls.get(k, []):
+            if full | carrier == carrier:
+                return False
+        semis = self.semis.setdefault(k, [])
+        for existing, existing_key in semis:
+            if existing | carrier == carrier:
+                return False
+        semis[:] = [s for s in semis if s[0] | carrier != s[0]]
+        if len(semis) >= self.max_semis:
+            largest = max(semis, key=lambda s: s[0].bit_count())
+            if largest[0].bit_count() <= carrier.bit_count():
+                return False
+            semis.remove(largest)
+        semis.append((carrier, key))
+
+        # OR rule, greedily shrinking the intersection starting from the new semi
+        intersection, union = carrier, carrier
+        for other, other_key in sorted(semis, key=lambda s: s[0].bit_count()):
+            if intersection & other != intersection:
+                intersection &= other
+                union |= other
+                if intersection == 0:
+                    self.add_full(a, b, union)
+                    break
+        return True
+
+    def _add_base(self, cells):
+        """ Full connections with empty carriers between adjacent nodes """
+
+        front_cells, back_cells = self._tables.edges[self.colour]
+        for c in cells:
+            u = self.node(c)
+            if u is None:
+                continue
+            for n in self._tables.neighbours[c]:
+                v = self.node(n)
+                if v is not None and v != u:
+                    self.add_full(u, v, 0)
+        for edge, edge_cells in [(self.front, front_cells), (self.back, back_cells)]:
+            for c in edge_cells:
+                u = self.node(c)
+                if u is not None and c in cells:
+                    self.add_full(edge, u, 0)
+
+    def _closure(self):
+        """ Applies the AND rule to every queued full connection until no new
+            connection is found """
+
+        while self._worklist:
+            a, b, carrier = self._worklist.pop()
+            if carrier not in self.fulls.get(self.key(a, b), []):
+                continue
+            for mid, other in [(a, b), (b, a)]:
+                if mid >= self._tables.cells:
+                    continue
+                mid_is_group = self.cells[mid] == self.colour
+                for z in list(self.partners[mid]):
+                    if z == other:
+                        continue
+                    for carrier2 in list(self.fulls.get(self.key(mid, z), [])):
+                        if carrier & carrier2:
+                            continue
+                        if mid_is_group:
+                            self.add_full(other, z, carrier | carrier2)
+                        else:
+                            self.add_semi(other, z, carrier | carrier2 | (1 << mid), mid)
+
+    ### INCREMENTAL UPDATES
+
+    def play(self, i, j, colour):
+        """ Updates the connections after a stone of colour is placed at (i, j) """
+
+        c = i * self.size + j
+        bit = 1 << c
+        if colour == self.opp_colour:
+            # the cell stops being a node and every carrier through it breaks
+            self.cells[c] = colour
+            self.partners.pop(c, None)
+            touched = set()
+            for table in [self.fulls, self.semis]:
+                for k in list(table.keys()):
+                    if c in k:
+                        del table[k]
+                        touched.update(k)
+                        continue
+                    entries = table[k]
+                    kept = [e for e in entries if not (e if table is self.fulls else e[0]) & bit]
+                    if len(kept) != len(entries):
+                        touched.update(k)
+                        table[k] = kept
+            self._rebuild_partners()
+            touched.discard(c)
+            # re-derive around the nodes that lost connections
+            for k, fulls in self.fulls.items():
+                if k[0] in touched or k[1] in touched:
+                    for carrier in fulls:
+                        self._worklist.append((k[0], k[1], carrier))
+            self._closure()
+            return
+
+        # own stone: merge the cell with adjacent groups
+        self.cells[c] = colour
+        merged = {c} | {self.group[n] for n in self._tables.neighbours[c] if n in self.group}
+        members = [c]
+        for g in merged:
+            members += [m for m in self.members.pop(g, []) if m != c]
+        for m in members:
+            self.group[m] = c
+        self.members[c] = members
+
+        old_fulls, old_semis = self.fulls, self.semis
+        self.fulls, self.semis = {}, {}
+        self.partners = defaultdict(set)
+        self._worklist = []
+
+        def relabel(node):
+            return c if node in merged else node
+
+        for (a, b), fulls in old_fulls.items():
+            a, b = relabel(a), relabel(b)
+            for carrier in fulls:
+                self.add_full(a, b, carrier & ~bit)
+        for (a, b), semis in old_semis.items():
+            a, b = relabel(a), relabel(b)
+            for carrier, key in semis:
+                if key == c:
+                    self.add_full(a, b, carrier & ~bit)
+                else:
+                    self.add_semi(a, b, carrier & ~bit, key)
+        self._add_base([c])
+        self._closure()
+
+    def _rebuild_partners(self):
+        self.partners = defaultdict(set)
+        for (a, b), fulls in self.fulls.items():
+            if fulls:
+                self.partners[a].add(b)
+                self.partners[b].add(a)
+
+    ### QUERIES
+
+    def edge_fulls(self):
+        return self.fulls.get(self.key(self.front, self.back), [])
+
+    def edge_semis(self):
+        return self.semis.get(self.key(self.front, self.back), [])
+
+    def has_win(self):
+        """ True if the colour is connected even with the opponent to move """
+        return len(self.edge_fulls()) > 0
+
+    def winning_move(self):
+        """ Key of an edge to edge semi connection, which wins when played """
+        semis = self.edge_semis()
+        if len(semis) == 0:
+            return None
+        carrier, key = min(semis, key=lambda s: s[0].bit_count())
+        return self._tables.coords[key]
+
+    def mustplay(self):
+        """ Cells where the opponent must play to stop this colour's edge to edge
+            connections, as a list of (row, column). None if there is no such
+            connection, an empty list if it cannot be stopped """
+        if self.has_win():
+            return []
+        carriers = [carrier for carrier, key in self.edge_semis()]
+        if len(carriers) == 0:
+            return None
+        intersection = self._tables.full_mask
+        for carrier in carriers:
+            intersection &= carrier
+        return [self._tables.coords[c] for c in range(self._tables.cells) if intersection >> c & 1]
+
+    ### MOVE PRUNING
+
+    @staticmethod
+    def prune_moves(board, player, moves):
+        """ Filters moves for player using both colours' connections.
+            Returns (moves, True) with moves that keep or complete a winning
+            connection if player has one. Otherwise returns the moves inside the
+            opponent's mustplay region (all moves if there is none or the
+            opponent has already won virtually) and False """
+
+        own = VirtualConnections(board, player)
+        if own.has_win():
+            # filling our own carrier can never break the connection
+            carrier = min(own.edge_fulls(), key=int.bit_count)
+            inside = [m for m in moves if carrier >> (m[0] * own.size + m[1]) & 1]
+            return (inside or moves), True
+        win = own.winning_move()
+        if win is not None:
+            return [win], True
+
+        opp = VirtualConnections(board, BoardSupport.opp_player(player))
+        mustplay = opp.mustplay()
+        if mustplay:
+            allowed = set(mustplay)
+            pruned = [m for m in moves if m in allowed]
+            if pruned:
+                return pruned, False
+        return moves, False
+
+
+if (__name__ == "__main__"):
+    from time import perf_counter
+
+    board = BoardSupport.create_board(11)
+    board[2][3] = "R"
+    board[4][2] = "R"
+    start_time = perf_counter()
+    vc = VirtualConnections(board, "R")
+    print(f"built in {perf_counter() - start_time:.3f}s")
+    print(vc.fulls.get(vc.key(vc.node(2 * 11 + 3), vc.node(4 * 11 + 2))))
+    print(vc.has_win(), vc.winning_move())
@@ -0,0 +1,330 @@
+"""Benchmarks for the engine and agent hot paths.
+
+Every case runs on a fixed corpus of positions per board size. The corpus
+is generated from a seed by playing random legal moves until a target share
+of the board is filled, stopping short of any win, so it is identical on
+every run. Each measurement is warmed up first, then timed as several
+samples. A sample repeats the call enough times to last at least
+MIN_SAMPLE_TIME. The report gives the median, mean, standard deviation
+and minimum of the samples.
+
+Possible arguments:
+* "sizes=5,11,19,27" board sizes to run (default all four).
+* "repeats=n" samples per case (default 7).
+* "seed=n" corpus and search seed (default 2024).
+* "only=name,name" runs only the named cases, eg. only=dijkstra.make_path.
+* "out=path" writes the results as JSON.
+* "baseline=path" compares against a stored results file and reports
+every case that got more than "tolerance=x" (default 0.1) worse.
+* "-save" writes the results to the baseline path (default
+benchmarks/baseline.json) instead of comparing.
+* "-strict" exits with status 1 if any case regressed.
+* "-cache" keeps the PositionCache on. It is off by default, as every
+case evaluates the same few positions over and over and would only
+measure cache hits.
+
+Baselines are machine specific, so refresh one with -save before
+comparing runs on a new host.
+"""
+import json
+import random
+import statistics
+import sys
+from datetime import datetime
+from os.path import realpath, sep
+from platform import platform, python_version
+from time import perf_counter
+
+ROOT = sep.join(realpath(__file__).split(sep)[:-2])
+sys.path.insert(0, f"{ROOT}{sep}src")
+sys.path.insert(0, f"{ROOT}{sep}agents{sep}Group027")
+
+from Board import Board
+from BoardSupport import BoardSupport
+from Bitboard import Bitboard
+from Resistance import Resistance
+from Dijkstra import Dijkstra
+from TwoDistance import TwoDistance
+from MCTS import MCTS
+from AlphaBeta import AlphaBeta
+from PositionCache import PositionCache
+from PolicyValueNet import PolicyValueNet
+
+SIZES = [5, 11, 19, 27]
+# share of the board filled in each corpus position
+FILLS = [0.1, 0.3, 0.5]
+MIN_SAMPLE_TIME = 0.05
+WARMUP_TIME = 0.1
+# search time for one MCTS sample
+SEARCH_TIME = 0.25
+# positions per forward pass of the network case
+NET_BATCH = 16
+DEFAULT_BASELINE = f"{ROOT}{sep}benchmarks{sep}baseline.json"
+
+
+def make_corpus(size, seed):
+    """Returns one protocol board string per fill share for size."""
+    rng = random.Random(f"{seed}:{size}")
+    corpus = []
+    for fill in FILLS:
+        bb = Bitboard(size)
+        cells = [(i, j) for i in range(size) for j in range(size)]
+        rng.shuffle(cells)
+        colour = "R"
+        placed = 0
+        for i, j in cells:
+            if placed >= int(fill * size * size):
+                break
+            trial = bb.copy()
+            trial.play(i, j, colour)
+            if trial.winner() != 0:
+                continue
+            bb = trial
+            placed += 1
+            colour = "B" if colour == "R" else "R"
+        corpus.append(bb.to_string())
+    return corpus
+
+
+### CASES
+# each case maps (board string, size) to a callable doing one unit of work
+# and returns the work it did: 1 for timed calls, a count for rate cases
+
+
+def case_has_ended(position, size):
+    board = Board.from_string(position, board_size=size)
+
+    def run():
+        board.has_ended()
+        return 1
+    return run
+
+
+def case_print_board(position, size):
+    board = Board.from_string(position, board_size=size)
+
+    def run():
+        board.print_board()
+        return 1
+    return run
+
+
+def case_check_winner(position, size):
+    board = [list(line) for line in position.split(",")]
+
+    def run():
+        BoardSupport.check_winner(board)
+        return 1
+    return run
+
+
+def case_resistance(position, size):
+    board = [list(line) for line in position.split(",")]
+    resistance = Resistance(size)
+
+    def run():
+        resistance.evaluate_board(board, "R")
+        return 1
+    return run
+
+
+def case_dijkstra(position, size):
+    board = [list(line) for line in position.split(",")]
+    dijkstra = Dijkstra()
+
+    def run():
+        dijkstra.make_path(board, "R")
+        return 1
+    return run
+
+
+def case_mcts(position, size):
+    board = [list(line) for line in position.split(",")]
+
+    def run():
+        mcts = MCTS(size)
+        mcts.make_move(board, "R", max_time=SEARCH_TIME, use_vc=False)
+        return mcts.iterations
+    return run
+
+
+def case_alphabeta(position, size):
+    board = [list(line) for line in position.split(",")]
+    evaluator = TwoDistance(size)
+
+    def run():
+        ab = AlphaBeta(size)
+        ab.make_move(board, "R", evaluator.evaluate_board, depth=1, use_vc=False)
+        return ab.node_count
+    return run
+
+
+def case_net(position, size):
+    board = [list(line) for line in position.split(",")]
+    # untrained, the cost of a forward pass does not depend on the weights
+    net = PolicyValueNet.random(seed=0)
+
+    def run():
+        net.evaluate([board] * NET_BATCH, ["R", "B"] * (NET_BATCH // 2))
+        return NET_BATCH
+    return run
+
+
+# name -> (setup, unit, largest board size it is run on)
+# "s" cases report seconds per call, "/s" cases work done per second
+CASES = {
+    "board.has_ended": (case_has_ended, "s", None),
+    "board.print_board": (case_print_board, "s", None),
+    "boardsupport.check_winner": (case_check_winner, "s", None),
+    "resistance.evaluate_board": (case_resistance, "s", 19),
+    "dijkstra.make_path": (case_dijkstra, "s", None),
+    "mcts.iterations": (case_mcts, "/s", None),
+    "alphabeta.nodes": (case_alphabeta, "/s", 11),
+    "policyvaluenet.positions": (case_net, "/s", None)
+}
+
+
+### MEASURING
+
+
+def sample(run, number):
+    """Runs run number times, returns (seconds, work done)."""
+    work = 0
+    start_time = perf_counter()
+    for k in range(number):
+        work += run()
+    return perf_counter() - start_time, work
+
+
+def measure(run, unit, repeats):
+    """Returns the samples of run in its unit after a warmup."""
+    # warm up and find how many calls make a long enough sample
+    number = 1
+    end_time = perf_counter() + WARMUP_TIME
+    while True:
+        elapsed, work = sample(run, number)
+        if elapsed >= MIN_SAMPLE_TIME and perf_counter() >= end_time:
+            break
+        if elapsed < MIN_SAMPLE_TIME:
+            number *= 2
+
+    samples = []
+    for k in range(repeats):
+        elapsed, work = sample(run, number)
+        samples.append(elapsed / number if unit == "s" else work / elapsed)
+    return samples
+
+
+def summarise(samples, unit):
+    return {
+        "unit": unit,
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "samples": samples
+    }
+
+
+def run_suite(sizes, repeats, seed, only=None):
+    results = {}
+    for size in sizes:
+        corpus = make_corpus(size, seed)
+        for name, (setup, unit, max_size) in CASES.items():
+            if (only and name not in only) or (max_size is not None and size > max_size):
+                continue
+            for fill, position in zip(FILLS, corpus):
+                random.seed(seed)
+                key = f"{name}@{size}x{size}/{int(fill * 100)}%"
+                results[key] = summarise(measure(setup(position, size), unit, repeats), unit)
+                print(f"{key:<44} {format_value(results[key])}")
+    return results
+
+
+def format_value(result):
+    if result["unit"] == "s":
+        return f"{result['median'] * 1e6:>12.1f}us  +-{result['stdev'] * 1e6:.1f}"
+    return f"{result['median']:>12.0f}/s  +-{result['stdev']:.0f}"
+
+
+### BASELINES
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of every case against baseline, returns the keys
+    of the cases that got more than tolerance worse."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old, new = baseline[key]["median"], result["median"]
+        # positive change is always an improvement
+        change = (old - new) / old if result["unit"] == "s" else (new - old) / old
+        flag = ""
+        if change < -tolerance:
+            flag = "REGRESSION"
+            regressions.append(key)
+        elif change > tolerance:
+            flag = "faster"
+        print(f"{key:<44} {change * 100:>+8.1f}%  {flag}")
+    return regressions
+
+
+def main(argv):
+    sizes, repeats, seed, only = SIZES, 7, 2024, None
+    out, baseline_path, tolerance = None, None, 0.1
+    for argument in argv[1:]:
+        if "=" not in argument:
+            continue
+        key, value = argument.split("=", 1)
+        if key == "sizes":
+            sizes = [int(x) for x in value.split(",")]
+        elif key == "repeats":
+            repeats = int(value)
+        elif key == "seed":
+            seed = int(value)
+        elif key == "only":
+            only = set(value.split(","))
+        elif key == "out":
+            out = value
+        elif key == "baseline":
+            baseline_path = value
+        elif key == "tolerance":
+            tolerance = float(value)
+
+    PositionCache.ENABLED = "-cache" in argv
+    results = run_suite(sizes, repeats, seed, only)
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(),
+            "python": python_version(),
+            "platform": platform(),
+            "seed": seed,
+            "repeats": repeats,
+            "sizes": sizes
+        },
+        "results": results
+    }
+
+    if out is not None:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if "-save" in argv:
+        with open(baseline_path or DEFAULT_BASELINE, "w") as f:
+            json.dump(report, f, indent=1)
+        return 0
+
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["seed"] != seed:
+            print("NOTICE: baseline was run with a different seed, positions differ.")
+        regressions = compare(results, baseline["results"], tolerance)
+        if regressions and "-strict" in argv:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,173 @@
+"""Game throughput benchmark for the engine.
+
+This script plays many full matches between two StubAgents. Those agents
+answer each move in O(1), so nearly all the time measured is the
+engine's. The matches run in this process through Game, exactly as
+src/main.py runs them. For every board size it reports:
+* games and moves per second, counting agent start-up;
+* the engine's overhead per move, which is the whole turn minus the time
+spent waiting for the agent, plus its phases: win check, move
+validation, applying the move, building the protocol's board string,
+sending the change to the agents, printing the board (verbose only)
+and, with -log, CSV logging.
+Reading the results across sizes gives the scaling curve of each phase.
+
+Possible arguments:
+* "games=n" matches per board size (default 100).
+* "sizes=3,5,11" board sizes to run (default 3,5,7,11,15,19,27).
+* "seed=n" seeds the stub agents, so every run plays the same games.
+* "out=path" writes the results as JSON.
+* "-forkserver" forks the agents from a preloaded server, see
+src/Launcher.py.
+* "-log" enables the CSV log, to include its cost. Each match writes
+its own file under logs/, as a normal match would.
+"""
+import json
+import os
+import sys
+from os.path import realpath, sep
+from tempfile import mkstemp
+from time import perf_counter
+
+ROOT = sep.join(realpath(__file__).split(sep)[:-2])
+sys.path.insert(0, f"{ROOT}{sep}src")
+
+from Game import Game
+
+SIZES = [3, 5, 7, 11, 15, 19, 27]
+# the phases Game records, in the order of a turn
+PHASES = [
+    "turn", "win_check", "validate", "make_move", "board_string", "send",
+    "board_print", "log"
+]
+STUB_PATH = f"{ROOT}{sep}agents{sep}DefaultAgents{sep}StubAgent.py"
+
+
+def stub(name, seed):
+    # -S skips site imports, the stub only needs the standard library
+    command = f"{sys.executable} -S {STUB_PATH}"
+    if (seed is not None):
+        command += f" seed={seed}"
+    return {"name": name, "run string": command}
+
+
+def run_size(size, games, seed, log, forkserver=False):
+    """Plays games matches on a size x size board, returns their summary."""
+    handle, metrics_path = mkstemp(suffix=".jsonl")
+    os.close(handle)
+
+    # Game prints each result to stderr, silence it at the descriptor as
+    # Game holds its own reference to the stream
+    sys.stderr.flush()
+    saved_stderr = os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+
+    start_time = perf_counter()
+    try:
+        for k in range(games):
+            game_seed = None if seed is None else seed + k
+            g = Game(
+                board_size=size,
+                player1=stub("Red", game_seed),
+                player2=stub("Blue", None if seed is None else game_seed + games),
+                log=log,
+                metrics_path=metrics_path,
+                forkserver=forkserver
+            )
+            g.run()
+    finally:
+        elapsed = perf_counter() - start_time
+        os.dup2(saved_stderr, 2)
+        os.close(saved_stderr)
+
+    # gather every match's overhead samples
+    overhead = {phase: [] for phase in PHASES}
+    moves = 0
+    with open(metrics_path) as f:
+        for line in f:
+            match = json.loads(line)
+            moves += sum(
+                agent["latency"]["count"] for agent in match["agents"].values()
+            )
+            for phase, summary in match["overhead"].items():
+                if (phase in overhead):
+                    overhead[phase].append(summary)
+    os.remove(metrics_path)
+
+    # the per match quantiles are averaged, weighted by their count
+    phases = {}
+    for phase, summaries in overhead.items():
+        count = sum(s["count"] for s in summaries)
+        if (count == 0):
+            continue
+        phases[phase] = {
+            "count": count,
+            "mean": sum(s["total"] for s in summaries) / count,
+            "p50": sum(s["p50"] * s["count"] for s in summaries) / count,
+            "p99": sum(s["p99"] * s["count"] for s in summaries) / count,
+            "max": max(s["max"] for s in summaries)
+        }
+
+    return {
+        "games": games,
+        "moves": moves,
+        "seconds": elapsed,
+        "games_per_second": games / elapsed,
+        "moves_per_second": moves / elapsed,
+        "overhead_ns": phases
+    }
+
+
+def print_table(results):
+    header = f"{'size':>5} {'games/s':>9} {'moves/s':>9}"
+    for phase in PHASES:
+        header += f" {phase:>12}"
+    print(header + "   (mean overhead per move, us)")
+    for size, result in results.items():
+        line = (
+            f"{size:>5} {result['games_per_second']:>9.2f} " +
+            f"{result['moves_per_second']:>9.0f}"
+        )
+        for phase in PHASES:
+            if (phase in result["overhead_ns"]):
+                line += f" {result['overhead_ns'][phase]['mean'] / 10**3:>12.1f}"
+            else:
+                line += f" {'-':>12}"
+        print(line)
+
+
+def main(argv):
+    games, sizes, seed, out = 100, SIZES, None, None
+    log = "-log" in argv
+    for argument in argv[1:]:
+        if ("=" not in argument):
+            continue
+        key, value = argument.split("=", 1)
+        if (key == "games"):
+            games = int(value)
+        elif (key == "sizes"):
+            sizes = [int(x) for x in value.split(",")]
+        elif (key == "seed"):
+            seed = int(value)
+        elif (key == "out"):
+            out = value
+
+    results = {}
+    for size in sizes:
+        results[size] = run_size(size, games, seed, log, "-forkserver" in argv)
+        print(
+            f"{size}x{size}: {games} games in {results[size]['seconds']:.2f}s",
+            file=sys.stderr
+        )
+    print_table(results)
+
+    if (out is not None):
+        with open(out, "w") as f:
+            json.dump({"seed": seed, "log": log, "sizes": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
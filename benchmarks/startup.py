@@ -0,0 +1,153 @@
+"""Startup budget check for the engine.
+
+Short matches are dominated by launch latency, so this script measures
+it and fails when it grows past a budget:
+* import: the time src/main.py and everything it imports add to a bare
+interpreter start;
+* match: launching Hex.py for a whole 1x1 match between two StubAgents,
+where Red wins with its first move;
+* default match: launching Hex.py with no agents, so two NaiveAgents
+play on a small board. This is repeated and fails if any run hangs,
+since batched protocol messages have deadlocked agents that read one
+recv at a time.
+Each is the median of several runs, in fresh interpreters. When the
+import budget is blown, the slowest modules are listed from
+python -X importtime.
+
+Possible arguments:
+* "runs=n" runs per measurement (default 15).
+* "import_budget=ms" (default IMPORT_BUDGET_MS).
+* "match_budget=ms" (default MATCH_BUDGET_MS).
+* "default_runs=n" default matches to play (default 20).
+* "default_timeout=s" seconds before a default match counts as hung
+(default DEFAULT_MATCH_TIMEOUT).
+
+Exits with status 1 if either budget is exceeded or a default match
+hangs. The budgets leave
+headroom for slower machines; tighten them if the project moves to one.
+"""
+import os
+import signal
+import statistics
+import subprocess
+import sys
+from os.path import realpath, sep
+from time import perf_counter
+
+ROOT = sep.join(realpath(__file__).split(sep)[:-2])
+SRC = f"{ROOT}{sep}src"
+STUB = f"{ROOT}{sep}agents{sep}DefaultAgents{sep}StubAgent.py"
+
+IMPORT_BUDGET_MS = 40
+MATCH_BUDGET_MS = 400
+DEFAULT_MATCH_BOARD = 5
+DEFAULT_MATCH_TIMEOUT = 30
+
+
+def median_time(command, runs, cwd=ROOT):
+    """Returns the median wall time of command in milliseconds."""
+    times = []
+    for k in range(runs):
+        start_time = perf_counter()
+        subprocess.run(
+            command, cwd=cwd,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+        )
+        times.append((perf_counter() - start_time) * 1000)
+    return statistics.median(times)
+
+
+def hung_matches(command, runs, timeout, cwd=ROOT):
+    """Returns how many of runs launches of command took over timeout
+    seconds. Hung matches are killed along with their agents.
+    """
+    hung = 0
+    for k in range(runs):
+        process = subprocess.Popen(
+            command, cwd=cwd, start_new_session=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            hung += 1
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+    return hung
+
+
+def slowest_imports(count=10):
+    """Returns the count imports with the largest cumulative time."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in output.split("\n")[1:]:
+        fields = line.split("|")
+        if (len(fields) == 3):
+            rows.append((int(fields[1]), fields[2].rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(argv):
+    runs = 15
+    default_runs, default_timeout = 20, DEFAULT_MATCH_TIMEOUT
+    import_budget, match_budget = IMPORT_BUDGET_MS, MATCH_BUDGET_MS
+    for argument in argv[1:]:
+        if ("=" not in argument):
+            continue
+        key, value = argument.split("=", 1)
+        if (key == "runs"):
+            runs = int(value)
+        elif (key == "import_budget"):
+            import_budget = float(value)
+        elif (key == "match_budget"):
+            match_budget = float(value)
+        elif (key == "default_runs"):
+            default_runs = int(value)
+        elif (key == "default_timeout"):
+            default_timeout = float(value)
+
+    bare = median_time([sys.executable, "-c", "pass"], runs)
+    imported = median_time([sys.executable, "-c", "import main"], runs, SRC)
+    import_time = imported - bare
+    stub = f"{sys.executable} -S {STUB}"
+    match_time = median_time(
+        [
+            sys.executable, f"{ROOT}{sep}Hex.py",
+            f"agent=Red;{stub}", f"agent=Blue;{stub}",
+            "board_size=1", "-k"
+        ],
+        runs
+    )
+    hung = hung_matches(
+        [
+            sys.executable, f"{ROOT}{sep}Hex.py",
+            f"board_size={DEFAULT_MATCH_BOARD}", "-k"
+        ],
+        default_runs, default_timeout
+    )
+
+    print(f"interpreter  {bare:>8.1f}ms")
+    print(f"import       {import_time:>8.1f}ms  (budget {import_budget}ms)")
+    print(f"1x1 match    {match_time:>8.1f}ms  (budget {match_budget}ms)")
+    print(f"default match {hung}/{default_runs} hung  (timeout {default_timeout}s)")
+
+    failed = False
+    if (import_time > import_budget):
+        failed = True
+        print("FAILED: import budget exceeded. Slowest imports (us):")
+        for cumulative, name in slowest_imports():
+            print(f"{cumulative:>10} {name}")
+    if (match_time > match_budget):
+        failed = True
+        print("FAILED: match budget exceeded.")
+    if (hung > 0):
+        failed = True
+        print("FAILED: default matches hung.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,6 +1,5 @@
 from Tile import Tile
 from Colour import Colour
-from colorama import Fore, Back, Style
 
 
 class Board:
@@ -17,6 +16,7 @@ class Board:
             for j in range(board_size):
                 new_line.append(Tile(i, j))
             self._tiles.append(new_line)
+        self._neighbours = Tile.get_neighbour_table(board_size)
 
         self._winner = None
 
@@ -98,15 +98,11 @@ class Board:
             return
 
         # visit neighbours
-        for idx in range(Tile.NEIGHBOUR_COUNT):
-            x_n = x + Tile.I_DISPLACEMENTS[idx]
-            y_n = y + Tile.J_DISPLACEMENTS[idx]
-            if (x_n >= 0 and x_n < self._board_size and
-                    y_n >= 0 and y_n < self._board_size):
-                neighbour = self._tiles[x_n][y_n]
-                if (not neighbour.is_visited() and
-                        neighbour.get_colour() == colour):
-                    self.DFS_colour(x_n, y_n, colour)
+        for x_n, y_n in self._neighbours[x][y]:
+            neighbour = self._tiles[x_n][y_n]
+            if (not neighbour.is_visited() and
+                    neighbour.get_colour() == colour):
+                self.DFS_colour(x_n, y_n, colour)
 
     def print_board(self, bnf=True):
         """Returns the string representation of a board. If bnf=True, the
@@ -121,6 +117,9 @@ class Board:
                 output += ","
             output = output[:-1]
         else:
+            # only needed for verbose output, so imported on first use
+            from colorama import Fore, Back, Style
+
             leading_spaces = ""
             for line in self._tiles:
                 output += leading_spaces
@@ -1,15 +1,16 @@
 from sys import stderr
 from time import time_ns as time
+from os import makedirs
 from os.path import realpath, sep
 from os.path import exists
-from datetime import datetime
-from pathlib import Path
 
 from Colour import Colour
 from Board import Board
 from Move import Move
 from Protocol import Protocol
 from EndState import EndState
+from Metrics import Metrics
+from ProcessClock import ProcessClock
 
 
 class Game():
@@ -21,6 +22,14 @@ class Game():
     # 1 second in nanoseconds
     # MAXIMUM_TIME = 10**9
 
+    # which time agents are charged against MAXIMUM_TIME: the wall time
+    # they take to answer, the CPU time their processes use meanwhile, or
+    # both, where whichever runs out first ends the match
+    CLOCKS = ["wall", "cpu", "both"]
+    # under the CPU clock alone, agents that block without using the CPU
+    # are still stopped after this multiple of MAXIMUM_TIME of wall time
+    WALL_SLACK = 3
+
     def __init__(
         self,
         board_size=11,
@@ -36,7 +45,11 @@ class Game():
         log=True,
         print_protocol=False,
         kill_bots=True,
-        silent_bots=True
+        silent_bots=True,
+        metrics_path=None,
+        clock="wall",
+        port=None,
+        forkserver=False
     ):
         self._turn = 1  # current turn count
         self._board = Board(board_size)
@@ -48,20 +61,39 @@ class Game():
             Colour.RED: {
                 'name': None,
                 'run string': None,
+                'sandbox': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'cpu_time': 0
             },
             Colour.BLUE: {
                 'name': None,
                 'run string': None,
+                'sandbox': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'cpu_time': 0
             }
         }
         self._players[Colour.RED]['name'] = player1['name']
         self._players[Colour.RED]['run string'] = player1['run string']
         self._players[Colour.BLUE]['name'] = player2['name']
         self._players[Colour.BLUE]['run string'] = player2['run string']
+        # optional Sandbox limiting each agent's cores and memory
+        self._players[Colour.RED]['sandbox'] = player1.get('sandbox')
+        self._players[Colour.BLUE]['sandbox'] = player2.get('sandbox')
+
+        # matches sharing a machine each need their own port
+        if (port is not None):
+            Protocol.PORT = port
+        Protocol.forkserver = forkserver
+
+        if (clock not in Game.CLOCKS):
+            raise ValueError(f"Unknown clock {clock}.")
+        if (clock != "wall" and ProcessClock.NS_PER_TICK is None):
+            print("NOTICE: CPU time is not available. Using the wall clock.")
+            clock = "wall"
+        self._clock = clock
 
         self._kill_bots = kill_bots
         self._silent_bots = silent_bots
@@ -71,6 +103,11 @@ class Game():
         self._log = log
         self._start_log()
 
+        # per-move latency, traffic and engine overhead, written at the end
+        # of the match if a path is given
+        self._metrics = Metrics()
+        self._metrics_path = metrics_path
+
     def run(self):
         """Runs the match."""
         try:
@@ -97,7 +134,9 @@ class Game():
             self._players[Colour.RED]['run string'],
             self._players[Colour.RED]['name'],
             self._players[Colour.BLUE]['run string'],
-            self._players[Colour.BLUE]['name']
+            self._players[Colour.BLUE]['name'],
+            self._players[Colour.RED]['sandbox'],
+            self._players[Colour.BLUE]['sandbox']
         )
         # test the connection
         if (not self._has_connected):
@@ -116,41 +155,85 @@ class Game():
         self._start_time = time()
         end_state = EndState.WIN
 
-        while (not self._board.has_ended()):
+        while (not self._has_ended()):
+            turn_time = time()
+
             # get a move from the agents
-            m, move_time = self._get_move()
+            m, move_time, cpu_time = self._get_move()
 
             # This message is sent after reading a move because it
             # is a time-consuming operation. Changing the order
             # will decrease the accuracy with which move time is
             # recorded.
-            self._send_message(
-                verbose_message=self._board.print_board(bnf=False)
-            )
+            # the coloured board is only drawn for the verbose output
+            if (self._verbose):
+                overhead_time = time()
+                self._send_message(
+                    verbose_message=self._board.print_board(bnf=False)
+                )
+                self._metrics.record_overhead(
+                    "board_print", time() - overhead_time
+                )
 
             # timeout
             if (move_time == -1):
                 end_state = EndState.TIMEOUT
-                self._players[self._player]['time'] = Game.MAXIMUM_TIME
+                if (self._clock == "wall"):
+                    self._players[self._player]['time'] = Game.MAXIMUM_TIME
+                else:
+                    # charge the wait, and the CPU allowance unless the
+                    # wall limit is what ran out
+                    self._players[self._player]['time'] += time() - turn_time
+                    if (self._players[self._player]['time'] <
+                            self._wall_limit()):
+                        self._players[self._player]['cpu_time'] = \
+                            Game.MAXIMUM_TIME
+                break
+
+            # out of CPU time, the move arrived too late to count
+            if (self._clock != "wall" and
+                    self._players[self._player]['cpu_time'] + cpu_time >
+                    Game.MAXIMUM_TIME):
+                end_state = EndState.TIMEOUT
+                self._players[self._player]['time'] += move_time
+                self._players[self._player]['cpu_time'] += cpu_time
                 break
 
             # illegal move
-            if (not m.is_valid_move(self)):
+            overhead_time = time()
+            is_valid = m.is_valid_move(self)
+            self._metrics.record_overhead("validate", time() - overhead_time)
+            if (not is_valid):
                 end_state = EndState.BAD_MOVE
-                self._flip_turn(move_time)
+                self._flip_turn(move_time, cpu_time)
                 break
 
             # If all checks passed, proceed normally
             self._make_move(m)
-            self._flip_turn(move_time)
+            self._flip_turn(move_time, cpu_time)
+
+            # everything the engine spent on the turn besides waiting for
+            # the agent, the win check that follows belongs to the next turn
+            self._metrics.record_overhead(
+                "turn", time() - turn_time - move_time
+            )
 
         self._end_game(end_state)
 
+    def _has_ended(self):
+        """Checks for a winner, recording the time the check took."""
+        overhead_time = time()
+        ended = self._board.has_ended()
+        self._metrics.record_overhead("win_check", time() - overhead_time)
+        return ended
+
     def _make_move(self, m):
         """Performs a valid move on the board, then prints its
-        results.
+        results. Applying the move, building the board string and
+        sending the change are recorded as separate overhead phases.
         """
 
+        overhead_time = time()
         verbose_message = ""  # for the user
         protocol_message = "CHANGE;"  # for the agents
 
@@ -171,9 +254,16 @@ class Game():
         verbose_message = (
             f"{self._players[self._player]['name']} {verbose_message}"
         )
-        protocol_message += f"{self._board.print_board()};{next_player}\n"
+        self._metrics.record_overhead("make_move", time() - overhead_time)
 
+        overhead_time = time()
+        board_string = self._board.print_board()
+        self._metrics.record_overhead("board_string", time() - overhead_time)
+        protocol_message += f"{board_string};{next_player}\n"
+
+        overhead_time = time()
         self._send_message(verbose_message, protocol_message)
+        self._metrics.record_overhead("send", time() - overhead_time)
 
     def get_next_player(self):
         """Returns END if the game is over or the opposite player
@@ -216,24 +306,45 @@ class Game():
                     Colour.BLUE, protocol_message
                 )
 
+    def _wall_limit(self):
+        """Returns the wall time an agent may take in the match."""
+        if (self._clock == "cpu"):
+            return Game.MAXIMUM_TIME * Game.WALL_SLACK
+        return Game.MAXIMUM_TIME
+
     def _get_move(self):
         """Receives a move from the currently playing agent.
 
-        Returns a tuple (move, time). move is a Move object, and
-        time is either an integer representing the time taken in
-        nanoseconds, or False if the agent times out. Snapshot
+        Returns a tuple (move, time, cpu time). move is a Move object,
+        and time is either an integer representing the time taken in
+        nanoseconds, or -1 if the agent times out. Snapshot
         error is less than 1/100s, but it reflects in the logs.
         The default agent is sometimes too fast to be recorded.
+        cpu time is the CPU time the agent's processes used meanwhile,
+        which is only as precise as the kernel's clock tick. Where it
+        can not be read, the wall time stands in for it.
         """
 
-        time_left = Game.MAXIMUM_TIME - self._players[self._player]['time']
+        time_left = self._wall_limit() - self._players[self._player]['time']
         time_left = max(time_left, 0)
+        cpu_left = None
+        if (self._clock != "wall"):
+            cpu_left = Game.MAXIMUM_TIME - self._players[self._player]['cpu_time']
+            cpu_left = max(cpu_left, 0)
 
-        answer, move_time = Protocol.get_message(
+        answer, move_time, cpu_time = Protocol.get_message(
             self._player,
             time_left,
-            self._print_protocol
+            self._print_protocol,
+            cpu_left
         )
+        if (cpu_time == -1):
+            cpu_time = move_time
+
+        if (move_time != -1):
+            self._metrics.record_move(
+                self._players[self._player]['name'], move_time, cpu_time
+            )
 
         move, log_message = None, 0
         try:
@@ -244,7 +355,7 @@ class Game():
                 log_message = (
                     f"{self._turn}," +
                     f"{self._players[self._player]['name']}," +
-                    f"{x},{y},{move_time}"
+                    f"{x},{y},{move_time},{cpu_time}"
                 )
                 move = Move(self._player, x, y)
 
@@ -253,7 +364,7 @@ class Game():
                 log_message = (
                     f"{self._turn}," +
                     f"{self._players[self._player]['name']}," +
-                    f"-1,SWAP,{move_time}"
+                    f"-1,SWAP,{move_time},{cpu_time}"
                 )
                 move = Move(self._player, -1, -1)
 
@@ -264,12 +375,12 @@ class Game():
             log_message = (
                 f"{self._turn}," +
                 f"{self._players[self._player]['name']}," +
-                f"-2,{''.join(answer)},{move_time}"
+                f"-2,{''.join(answer)},{move_time},{cpu_time}"
             )
             move = Move(self._player, -2, -2)
 
         self._write_log(log_message)
-        return (move, move_time)
+        return (move, move_time, cpu_time)
 
     def _swap(self):
         """Swaps the players' colours in Game and in Protocol."""
@@ -283,13 +394,14 @@ class Game():
 
         Protocol.swap()
 
-    def _flip_turn(self, move_time):
+    def _flip_turn(self, move_time, cpu_time):
         """Increments the statistics of the current player, then
         changes the current player.
         """
 
         self._players[self._player]['turns'] += 1
         self._players[self._player]['time'] += move_time
+        self._players[self._player]['cpu_time'] += cpu_time
 
         self._turn += 1
         self._player = Colour.opposite(self._player)
@@ -300,9 +412,10 @@ class Game():
         """
 
         # print the board again
-        self._send_message(
-            verbose_message=self._board.print_board(bnf=False)
-        )
+        if (self._verbose):
+            self._send_message(
+                verbose_message=self._board.print_board(bnf=False)
+            )
 
         # calculate total time elapsed
         total_time = time() - self._start_time
@@ -313,6 +426,10 @@ class Game():
             Colour.RED: 0,
             Colour.BLUE: 0
         }
+        cpu_means = {
+            Colour.RED: 0,
+            Colour.BLUE: 0
+        }
         self._turn -= 1  # last move overcounts
         if (self._turn > 0):
             # the real mean move time will be slightly shorter
@@ -323,6 +440,10 @@ class Game():
                     self._players[colour]['time'] /
                     self._players[colour]['turns']
                 )
+                cpu_means[colour] = int(
+                    self._players[colour]['cpu_time'] /
+                    self._players[colour]['turns']
+                )
 
         verbose_message = ""
         protocol_message = "END"
@@ -383,7 +504,8 @@ class Game():
         verbose_message += (
             f"The game took {self._turn} turns and lasted for " +
             f"{Game.ns_to_s(total_time)}s. The mean move time " +
-            f"was {Game.ns_to_s(means['Total'])}s.\n"
+            f"was {Game.ns_to_s(means['Total'])}s. Agents were " +
+            f"timed by the {self._clock} clock.\n"
         )
         log_message += (
             f"0,Total,{self._turn},{total_time},{means['Total']}\n"
@@ -396,12 +518,16 @@ class Game():
                 f"{self._players[colour]['turns']} turns in " +
                 f"{Game.ns_to_s(self._players[colour]['time'])}s. " +
                 "Their average move time was " +
-                f"{Game.ns_to_s(means[colour])}s.\n"
+                f"{Game.ns_to_s(means[colour])}s. They used " +
+                f"{Game.ns_to_s(self._players[colour]['cpu_time'])}s " +
+                "of CPU time, on average " +
+                f"{Game.ns_to_s(cpu_means[colour])}s per move.\n"
             )
             log_message += (
                 f"0,{self._players[colour]['name']}," +
                 f"{self._players[colour]['turns']}," +
-                f"{self._players[colour]['time']},{means[colour]}\n"
+                f"{self._players[colour]['time']},{means[colour]}," +
+                f"{self._players[colour]['cpu_time']},{cpu_means[colour]}\n"
             )
 
         self._send_message(verbose_message, protocol_message)
@@ -410,6 +536,9 @@ class Game():
         if (self._log):
             print(f"Saved log to {self._log_path}")
 
+        if (self._metrics_path is not None):
+            self._metrics.write(self._metrics_path)
+
         # short-form results; easier to read than verbose option
         red_end_s = (str(self._player == Colour.RED) + " " +
                      str(self._players[Colour.RED]['time']) + " " +
@@ -430,26 +559,43 @@ class Game():
             verbose=self._print_protocol
         )
 
-    def _start_protocol(self, s1, name1, s2, name2):
-        """Sets up the TCP server, then starts the agents and
-        connects to them. If either connection fails, the game
-        will not start.
+    def _start_protocol(
+        self, s1, name1, s2, name2, sandbox1=None, sandbox2=None
+    ):
+        """Sets up the TCP server, then starts both agents and connects
+        to them. They are started at once where the engine can tell
+        which agent a connection comes from, otherwise one after the
+        other. If either connection fails, the game will not start.
         """
         Protocol.start()
+        Protocol.metrics = self._metrics
 
-        self._has_connected = Protocol.accept_connection(
-            s1, name1, Game.MAXIMUM_TIME,
-            self._silent_bots, self._print_protocol
-        )
-        if (not self._has_connected):
-            self._players[Colour.RED]['time'] = Game.MAXIMUM_TIME
-            return
+        if (Protocol.identifies_connections()):
+            Protocol.launch(
+                s1, name1, self._silent_bots, self._print_protocol, sandbox1
+            )
+            Protocol.launch(
+                s2, name2, self._silent_bots, self._print_protocol, sandbox2
+            )
+            connected = Protocol.accept_connections(
+                Game.MAXIMUM_TIME, self._print_protocol
+            )
+        else:
+            # connections are matched to agents by their order
+            connected = {}
+            for colour, s, name, sandbox in [
+                (Colour.RED, s1, name1, sandbox1),
+                (Colour.BLUE, s2, name2, sandbox2)
+            ]:
+                connected[colour] = Protocol.accept_connection(
+                    s, name, Game.MAXIMUM_TIME, self._silent_bots,
+                    self._print_protocol, sandbox
+                )
 
-        self._has_connected = Protocol.accept_connection(
-            s2, name2, Game.MAXIMUM_TIME,
-            self._silent_bots, self._print_protocol
-        )
-        if (not self._has_connected):
+        self._has_connected = all(connected.values())
+        if (not connected[Colour.RED]):
+            self._players[Colour.RED]['time'] = Game.MAXIMUM_TIME
+        elif (not connected[Colour.BLUE]):
             self._players[Colour.BLUE]['time'] = Game.MAXIMUM_TIME
             self._player = self._player.opposite()
 
@@ -464,7 +610,7 @@ class Game():
         log_path += f"{sep}logs{sep}"
 
         # create the log directory if it doesn't exist
-        Path(log_path).mkdir(parents=True, exist_ok=True)
+        makedirs(log_path, exist_ok=True)
 
         # create a new log file
         self._log_path = log_path + "log.csv"
@@ -474,21 +620,24 @@ class Game():
             idx += 1
 
         # submit the start message
+        from datetime import datetime
         with open(self._log_path, "w") as f:
             f.write(f"Start log at {datetime.now()}\n")
             f.write(
                 f"Board is {self._board.get_size()}x" +
                 f"{self._board.get_size()}.\n"
             )
-            f.write("No,Player,X,Y,Time\n")
+            f.write("No,Player,X,Y,Time,CPU\n")
 
     def _write_log(self, message):
         """Writes the specified message and a newline to the log file."""
         if (not self._log):
             return
 
+        overhead_time = time()
         with open(self._log_path, "a") as f:
             f.write(message + "\n")
+        self._metrics.record_overhead("log", time() - overhead_time)
 
     def get_board(self):
         return self._board
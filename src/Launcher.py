@@ -0,0 +1,430 @@
+"""Forkserver for Python agents.
+
+Starting an agent with Popen costs an interpreter start and all of the
+agent's imports on every match, hundreds of milliseconds for agents that
+use numpy. A Launcher instead keeps one server per agent script. The
+server imports the script once as a module, along with everything it
+imports, then forks a copy of itself for every match. The copy runs the
+script as __main__ with the match's arguments, environment, working
+directory, sandbox and output streams. Each agent is still its own
+process, so it is isolated and killed exactly as before.
+
+Servers outlive the engine process that starts them, so later matches
+reuse them. They exit after IDLE_TIMEOUT without work. A server belongs
+to one interpreter, script and version of the script's directory:
+editing any .py file next to the script starts a fresh server, and the
+stale one idles out. Code imported from other directories is not
+tracked, stop the servers after changing it with:
+
+    python3 src/Launcher.py stop
+
+Only run strings of the form "python[3] [options] script.py [args]" can
+be served. Launcher.spawn returns None for anything else, or when the
+server can not be reached, and the caller falls back to Popen. Forking
+needs a POSIX system with socket.send_fds (Python 3.9).
+"""
+import hashlib
+import json
+import os
+import signal
+import socket
+import sys
+from glob import glob
+from os.path import abspath, basename, dirname, getmtime, join
+from tempfile import gettempdir
+from time import sleep, time
+
+from Sandbox import Sandbox
+
+
+class ForkedProcess():
+    """Handle of an agent forked by a server. It offers the parts of
+    Popen the engine uses: pid, returncode, poll, wait, kill and
+    terminate. The exit status arrives over the connection to the
+    server, which is the agent's parent.
+    """
+
+    def __init__(self, conn, pid):
+        self._conn = conn
+        self.pid = pid
+        self.returncode = None
+        self._buffer = b""
+
+    def _read_status(self, timeout):
+        self._conn.settimeout(timeout)
+        try:
+            while (b"\n" not in self._buffer):
+                data = self._conn.recv(1024)
+                if (not data):
+                    # the server died, so did the report of the exit
+                    self.returncode = -signal.SIGKILL
+                    return
+                self._buffer += data
+        except (socket.timeout, BlockingIOError):
+            return
+        self.returncode = json.loads(self._buffer.split(b"\n")[0])["exit"]
+        self._conn.close()
+
+    def poll(self):
+        if (self.returncode is None):
+            self._read_status(0)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if (self.returncode is None):
+            self._read_status(timeout)
+        return self.returncode
+
+    def exit_fileno(self):
+        """A descriptor that becomes readable once the exit status has
+        arrived, for use with select.
+        """
+        return self._conn.fileno()
+
+    def send_signal(self, sig):
+        if (self.returncode is None):
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+
+class Launcher():
+    """Client side of the forkservers, see the module docstring."""
+
+    # seconds a server waits without children or requests before exiting
+    IDLE_TIMEOUT = 600
+    # seconds to wait for a new server to preload its script
+    START_TIMEOUT = 60
+
+    @staticmethod
+    def supported():
+        return (hasattr(os, "fork") and hasattr(socket, "send_fds") and
+                hasattr(socket, "AF_UNIX"))
+
+    @staticmethod
+    def parse(argv):
+        """Returns (interpreter, interpreter options, script, script
+        arguments) for a Python run string split into argv, or None.
+        """
+
+        if (len(argv) < 2 or not basename(argv[0]).startswith("python")):
+            return None
+        for k in range(1, len(argv)):
+            if (argv[k].endswith(".py") and not argv[k].startswith("-")):
+                options = argv[1:k]
+                # options taking a value or running other code can't be kept
+                if (any(o in ["-c", "-m", "-W", "-X"] for o in options)):
+                    return None
+                return argv[0], options, abspath(argv[k]), argv[k + 1:]
+        return None
+
+    @staticmethod
+    def _socket_path(interpreter, options, script):
+        """Names the server of a script by everything that changes what
+        it preloads.
+        """
+
+        directory = dirname(script)
+        version = max(
+            [getmtime(path) for path in glob(join(directory, "*.py"))],
+            default=0
+        )
+        key = json.dumps([interpreter, options, script, version])
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return join(gettempdir(), f"hex-forkserver-{os.getuid()}-{digest}.sock")
+
+    @staticmethod
+    def _connect(path):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(path)
+            return conn
+        except OSError:
+            conn.close()
+            return None
+
+    @staticmethod
+    def _start_server(path, interpreter, options, script):
+        """Starts a detached server and waits for it to accept."""
+
+        import subprocess
+        subprocess.Popen(
+            [interpreter] + options + [abspath(__file__), "serve", path, script],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        end_time = time() + Launcher.START_TIMEOUT
+        while (time() < end_time):
+            conn = Launcher._connect(path)
+            if (conn is not None):
+                return conn
+            sleep(0.01)
+        return None
+
+    @staticmethod
+    def spawn(argv, env=None, stdout=None, stderr=None, sandbox=None):
+        """Starts the agent argv through its server. stdout and stderr
+        are file objects, file descriptors or None to inherit this
+        process's streams, and env defaults to this process's
+        environment. Returns a ForkedProcess, or None if the agent can
+        not be forked.
+        """
+
+        parsed = Launcher.parse(argv)
+        if (parsed is None or not Launcher.supported()):
+            return None
+        interpreter, options, script, arguments = parsed
+
+        try:
+            path = Launcher._socket_path(interpreter, options, script)
+        except OSError:
+            return None
+        conn = Launcher._connect(path)
+        if (conn is None):
+            conn = Launcher._start_server(path, interpreter, options, script)
+            if (conn is None):
+                return None
+
+        request = {
+            "argv": [script] + arguments,
+            "cwd": os.getcwd(),
+            "env": dict(os.environ if env is None else env)
+        }
+        if (sandbox is not None):
+            request["sandbox"] = {
+                "cpus": sorted(sandbox.cpus) if sandbox.cpus else None,
+                "memory": sandbox.memory,
+                "nice": sandbox.nice
+            }
+
+        fds = []
+        for stream, default in [(stdout, 1), (stderr, 2)]:
+            if (stream is None):
+                fds.append(default)
+            elif (isinstance(stream, int) and stream < 0):
+                # subprocess.DEVNULL
+                fds.append(os.open(os.devnull, os.O_WRONLY))
+            elif (isinstance(stream, int)):
+                fds.append(stream)
+            else:
+                fds.append(stream.fileno())
+
+        try:
+            socket.send_fds(
+                conn, [json.dumps(request).encode("utf-8") + b"\n"], fds
+            )
+            reply = b""
+            conn.settimeout(Launcher.START_TIMEOUT)
+            while (b"\n" not in reply):
+                data = conn.recv(1024)
+                if (not data):
+                    raise ConnectionError("server closed the connection")
+                reply += data
+        except OSError:
+            conn.close()
+            return None
+        finally:
+            for stream, fd in zip([stdout, stderr], fds):
+                if (isinstance(stream, int) and stream < 0):
+                    os.close(fd)
+
+        line, rest = reply.split(b"\n", 1)
+        process = ForkedProcess(conn, json.loads(line)["pid"])
+        process._buffer = rest
+        return process
+
+    @staticmethod
+    def stop_all():
+        """Stops every server of this user."""
+
+        pattern = join(gettempdir(), f"hex-forkserver-{os.getuid()}-*.sock")
+        for path in glob(pattern):
+            conn = Launcher._connect(path)
+            if (conn is None):
+                os.remove(path)
+                continue
+            conn.sendall(b'{"stop": true}\n')
+            conn.close()
+
+
+### SERVER
+
+
+def _preload(script):
+    """Imports script under its module name, without running its main."""
+
+    import importlib.util
+
+    sys.path[0] = dirname(script)
+    name = basename(script)[:-3]
+    spec = importlib.util.spec_from_file_location(name, script)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+
+def _run_child(request, fds):
+    """Becomes the agent. Never returns."""
+
+    code = 1
+    try:
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in fds:
+            os.close(fd)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        if ("sandbox" in request):
+            limits = request["sandbox"]
+            Sandbox(limits["cpus"], None, limits["memory"], limits["nice"]).apply()
+
+        # random reseeds itself after a fork, numpy's global state does not
+        if ("numpy" in sys.modules):
+            sys.modules["numpy"].random.seed()
+
+        import runpy
+        sys.argv = request["argv"]
+        runpy.run_path(request["argv"][0], run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        if (e.code is None):
+            code = 0
+        elif (isinstance(e.code, int)):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(path, script):
+    """Preloads script, then forks it for every request on the unix
+    socket at path until stopped or idle for IDLE_TIMEOUT.
+    """
+
+    import selectors
+
+    _preload(script)
+
+    if (os.path.exists(path)):
+        os.remove(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)
+    listener.listen()
+
+    # SIGCHLD writes to wakeup, so exits are reported as they happen
+    wakeup, wakeup_write = socket.socketpair()
+    wakeup.setblocking(False)
+    wakeup_write.setblocking(False)
+    signal.set_wakeup_fd(wakeup_write.fileno())
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wakeup, selectors.EVENT_READ)
+    # pid -> connection awaiting its exit status
+    children = {}
+    last_active = time()
+
+    while (True):
+        for key, events in selector.select(timeout=1):
+            if (key.fileobj is wakeup):
+                try:
+                    while (wakeup.recv(1024)):
+                        pass
+                except BlockingIOError:
+                    pass
+                continue
+
+            conn, addr = listener.accept()
+            last_active = time()
+            try:
+                conn.settimeout(5)
+                data, fds, flags, addr = socket.recv_fds(conn, 1 << 20, 2)
+                while (not data.endswith(b"\n")):
+                    more = conn.recv(1 << 20)
+                    if (not more):
+                        raise ConnectionError("incomplete request")
+                    data += more
+                request = json.loads(data)
+            except (OSError, ValueError):
+                conn.close()
+                continue
+
+            if (request.get("stop")):
+                listener.close()
+                os.remove(path)
+                return
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if (pid == 0):
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                selector.close()
+                wakeup.close()
+                wakeup_write.close()
+                listener.close()
+                for other in children.values():
+                    other.close()
+                conn.close()
+                _run_child(request, fds)
+
+            for fd in fds:
+                os.close(fd)
+            try:
+                conn.sendall(json.dumps({"pid": pid}).encode("utf-8") + b"\n")
+                children[pid] = conn
+            except OSError:
+                conn.close()
+
+        # report the children that exited
+        while (len(children) > 0):
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if (pid == 0):
+                break
+            conn = children.pop(pid, None)
+            if (conn is not None):
+                try:
+                    code = os.waitstatus_to_exitcode(status)
+                    conn.sendall(json.dumps({"exit": code}).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+                conn.close()
+            last_active = time()
+
+        if (len(children) == 0 and time() - last_active > Launcher.IDLE_TIMEOUT):
+            listener.close()
+            if (os.path.exists(path)):
+                os.remove(path)
+            return
+
+
+if (__name__ == "__main__"):
+    if (len(sys.argv) == 4 and sys.argv[1] == "serve"):
+        serve(sys.argv[2], sys.argv[3])
+    elif (len(sys.argv) == 2 and sys.argv[1] == "stop"):
+        Launcher.stop_all()
+    else:
+        print("Usage: python3 src/Launcher.py stop")
@@ -0,0 +1,177 @@
+class Metrics():
+    """This class collects performance metrics for a match.
+
+    Agents are tracked by name, so their figures survive a swap:
+    * move latency: the time each move took, as reported by Protocol
+    * move CPU time: the CPU time the agent's processes used for each move
+    * bytes in and out: protocol traffic to and from each agent
+    * connect time: from starting the agent's process to its connection
+    Engine overhead is tracked per phase of a turn, such as the win check
+    and producing the board string. All times are in nanoseconds.
+    """
+
+    QUANTILES = [0.5, 0.9, 0.99]
+
+    def __init__(self):
+        self._agents = {}
+        self._overhead = {}
+
+    def _agent(self, name):
+        if (name not in self._agents):
+            self._agents[name] = {
+                'moves': [],
+                'cpu': [],
+                'bytes_in': 0,
+                'bytes_out': 0,
+                'messages_in': 0,
+                'messages_out': 0,
+                'connect_time': None
+            }
+        return self._agents[name]
+
+    def record_move(self, name, move_time, cpu_time=None):
+        agent = self._agent(name)
+        agent['moves'].append(move_time)
+        if (cpu_time is not None):
+            agent['cpu'].append(cpu_time)
+
+    def record_received(self, name, size):
+        agent = self._agent(name)
+        agent['bytes_in'] += size
+        agent['messages_in'] += 1
+
+    def record_sent(self, name, size):
+        agent = self._agent(name)
+        agent['bytes_out'] += size
+        agent['messages_out'] += 1
+
+    def record_connect(self, name, connect_time):
+        self._agent(name)['connect_time'] = connect_time
+
+    def record_overhead(self, phase, elapsed):
+        self._overhead.setdefault(phase, []).append(elapsed)
+
+    @staticmethod
+    def quantile(values, q):
+        """Nearest-rank quantile of a list of numbers."""
+        if (len(values) == 0):
+            return 0
+        ordered = sorted(values)
+        rank = max(0, min(len(ordered) - 1, int(q * len(ordered) + 0.5) - 1))
+        return ordered[rank]
+
+    @staticmethod
+    def summarise(values):
+        summary = {
+            'count': len(values),
+            'total': sum(values),
+            'max': max(values) if values else 0
+        }
+        for q in Metrics.QUANTILES:
+            summary[f"p{int(q * 100)}"] = Metrics.quantile(values, q)
+        return summary
+
+    def to_dict(self):
+        """Returns the metrics with distributions reduced to summaries."""
+        agents = {}
+        for name, agent in self._agents.items():
+            agents[name] = {
+                'latency': Metrics.summarise(agent['moves']),
+                'cpu': Metrics.summarise(agent['cpu']),
+                'bytes_in': agent['bytes_in'],
+                'bytes_out': agent['bytes_out'],
+                'messages_in': agent['messages_in'],
+                'messages_out': agent['messages_out'],
+                'connect_time': agent['connect_time']
+            }
+        overhead = {
+            phase: Metrics.summarise(values)
+            for phase, values in self._overhead.items()
+        }
+        return {'agents': agents, 'overhead': overhead}
+
+    def to_json(self):
+        # most matches never write metrics, so json is loaded on demand
+        import json
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format,
+        with times in seconds."""
+
+        def seconds(t):
+            return f"{t / 10**9:.9f}"
+
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+        lines = []
+        data = self.to_dict()
+
+        for metric, key, text in [
+            ("hex_move_latency_seconds", 'latency', "Time taken by an agent per move."),
+            ("hex_move_cpu_seconds", 'cpu', "CPU time used by an agent per move.")
+        ]:
+            lines.append(f"# HELP {metric} {text}")
+            lines.append(f"# TYPE {metric} summary")
+            for name, agent in data['agents'].items():
+                summary = agent[key]
+                for q in Metrics.QUANTILES:
+                    lines.append(
+                        f'{metric}{{agent="{label(name)}",quantile="{q}"}} ' +
+                        seconds(summary[f"p{int(q * 100)}"])
+                    )
+                lines.append(f'{metric}_sum{{agent="{label(name)}"}} {seconds(summary["total"])}')
+                lines.append(f'{metric}_count{{agent="{label(name)}"}} {summary["count"]}')
+
+        for metric, key, text in [
+            ("hex_received_bytes_total", 'bytes_in', "Bytes received from an agent."),
+            ("hex_sent_bytes_total", 'bytes_out', "Bytes sent to an agent."),
+            ("hex_received_messages_total", 'messages_in', "Messages received from an agent."),
+            ("hex_sent_messages_total", 'messages_out', "Messages sent to an agent.")
+        ]:
+            lines.append(f"# HELP {metric} {text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, agent in data['agents'].items():
+                lines.append(f'{metric}{{agent="{label(name)}"}} {agent[key]}')
+
+        lines.append("# HELP hex_connect_seconds Time from starting an agent to its connection.")
+        lines.append("# TYPE hex_connect_seconds gauge")
+        for name, agent in data['agents'].items():
+            if (agent['connect_time'] is not None):
+                lines.append(f'hex_connect_seconds{{agent="{label(name)}"}} {seconds(agent["connect_time"])}')
+
+        lines.append("# HELP hex_engine_overhead_seconds Engine time per turn phase.")
+        lines.append("# TYPE hex_engine_overhead_seconds summary")
+        for phase, summary in data['overhead'].items():
+            for q in Metrics.QUANTILES:
+                lines.append(
+                    f'hex_engine_overhead_seconds{{phase="{label(phase)}",quantile="{q}"}} ' +
+                    seconds(summary[f"p{int(q * 100)}"])
+                )
+            lines.append(f'hex_engine_overhead_seconds_sum{{phase="{label(phase)}"}} {seconds(summary["total"])}')
+            lines.append(f'hex_engine_overhead_seconds_count{{phase="{label(phase)}"}} {summary["count"]}')
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the metrics to path. Files ending in .prom get the
+        Prometheus format and are overwritten, anything else gets one JSON
+        line per match appended, so a tournament builds up a single file.
+        """
+        if (path.endswith(".prom")):
+            with open(path, "w") as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, "a") as f:
+                f.write(self.to_json() + "\n")
+
+
+if __name__ == "__main__":
+    metrics = Metrics()
+    for t in [10**6, 2 * 10**6, 5 * 10**7]:
+        metrics.record_move("Alice", t, t // 2)
+    metrics.record_sent("Alice", 20)
+    metrics.record_overhead("win_check", 3000)
+    print(metrics.to_json())
+    print(metrics.to_prometheus())
@@ -1,8 +1,11 @@
+import os
+import selectors
 import socket
 import subprocess
-from sys import platform, stdout
+from sys import platform, stderr, stdout
 from time import time_ns
 from Colour import Colour
+from ProcessClock import ProcessClock
 import shlex
 
 
@@ -15,6 +18,12 @@ class Protocol():
     PORT = 1234
     s = None
     sockets = {Colour.RED: {}, Colour.BLUE: {}}
+    # optional Metrics object recording traffic and connect times
+    metrics = None
+    # how often an agent's CPU time is checked while waiting on it
+    CPU_POLL_NS = 10**8
+    # fork Python agents from a preloaded server instead of starting them
+    forkserver = False
 
     @staticmethod
     def start():
@@ -35,11 +44,26 @@ class Protocol():
         name,
         timeout_ns=30*10**9,
         silent=True,
-        verbose=False
+        verbose=False,
+        sandbox=None
     ):
         """Starts a subprocess with the specified string then waits for the
         new process to connect to the socket. Returns True if the connection
-        was made, False otherwise.
+        was made, False otherwise. See launch and accept_connections, which
+        start several agents at once.
+        """
+
+        colour = Protocol.launch(run_s, name, silent, verbose, sandbox)
+        return Protocol.accept_connections(timeout_ns, verbose)[colour]
+
+    @staticmethod
+    def launch(run_s, name, silent=True, verbose=False, sandbox=None):
+        """Starts an agent with the specified string without waiting for
+        it to connect, and returns the colour it was given. The agent finds
+        the port in HEX_PORT and runs within the limits of sandbox, a
+        Sandbox, if one is given. With Protocol.forkserver set, Python
+        agents are forked by a Launcher, falling back to a new process if
+        that fails.
         """
 
         # separate run_s into a list of arguments to be used in a linux shell
@@ -61,39 +85,290 @@ class Protocol():
             output = subprocess.DEVNULL
 
         # start the agent
-        t = subprocess.Popen(run_s, stdout=output, stderr=output, shell=False)
-
-        # wait for a connection
+        env = dict(os.environ, HEX_PORT=str(Protocol.PORT))
+        popen_args = {"env": env}
+        if (sandbox is not None):
+            popen_args = sandbox.popen_args(env)
+        launch_time = time_ns()
+        t = None
         try:
-            Protocol.s.settimeout(timeout_ns/10**9)
-            conn, addr = Protocol.s.accept()
-            Protocol.s.settimeout(socket.getdefaulttimeout())
-            if verbose:
-                print(f"Connected {name} at {addr}")
-        except socket.timeout:
-            conn, addr = None, None
+            if (Protocol.forkserver and platform != "win32"):
+                from Launcher import Launcher
+                t = Launcher.spawn(
+                    run_s, popen_args["env"], output, output, sandbox
+                )
+            if (t is None):
+                t = subprocess.Popen(
+                    run_s, stdout=output, stderr=output, shell=False,
+                    **popen_args
+                )
+        except (OSError, subprocess.SubprocessError) as e:
             if (verbose):
-                print(f"{name} never connected.")
+                print(f"{name} could not be started: {e}")
 
         # set up associated arguments
         Protocol.sockets[colour]['name'] = name
         Protocol.sockets[colour]['thread'] = t
+        Protocol.sockets[colour]['conn'] = None
+        Protocol.sockets[colour]['addr'] = None
+        Protocol.sockets[colour]['launch_time'] = launch_time
+
+        return colour
+
+    @staticmethod
+    def accept_connections(timeout_ns=30*10**9, verbose=False):
+        """Waits until every launched agent has connected or exited, or
+        timeout_ns passes. Both the listening socket and the agents' exits
+        are watched, so an agent that dies at launch is noticed at once.
+        Connections are matched to agents by the process that owns them,
+        so agents may connect in any order where identifies_connections
+        is True. Elsewhere launch one agent at a time. Returns
+        {colour: connected} for the agents that were waited for.
+        """
+
+        pending = [
+            colour for colour in Colour
+            if len(Protocol.sockets[colour].keys()) > 0 and
+            Protocol.sockets[colour]['conn'] is None
+        ]
+        waiting = [
+            colour for colour in pending
+            if Protocol.sockets[colour]['thread'] is not None
+        ]
+
+        selector = selectors.DefaultSelector()
+        selector.register(Protocol.s, selectors.EVENT_READ)
+        watches = {}
+        for colour in waiting:
+            watches[colour] = Protocol._exit_watch(
+                Protocol.sockets[colour]['thread']
+            )
+            if (watches[colour][0] is not None):
+                selector.register(watches[colour][0], selectors.EVENT_READ)
+
+        deadline = time_ns() + timeout_ns
+        try:
+            while (len(waiting) > 0):
+                remaining = (deadline - time_ns()) / 10**9
+                if (remaining <= 0):
+                    break
+                # without an exit descriptor the process is polled
+                if (any(watches[c][0] is None for c in waiting)):
+                    remaining = min(remaining, 0.01)
+                events = selector.select(remaining)
+
+                # connections first, an agent may connect just before ending
+                if (any(key.fileobj is Protocol.s for key, mask in events)):
+                    Protocol.s.settimeout(None)
+                    conn, addr = Protocol.s.accept()
+                    Protocol.s.settimeout(socket.getdefaulttimeout())
+                    colour = Protocol._connection_owner(addr, waiting)
+                    if (colour is None):
+                        # owner unknown, only safe with a single agent waiting
+                        if (len(waiting) > 1):
+                            print(
+                                "WARNING: could not tell which agent " +
+                                f"connected from {addr}, assuming " +
+                                f"{Protocol.sockets[waiting[0]]['name']}.",
+                                file=stderr
+                            )
+                        colour = waiting[0]
+                    Protocol._connected(colour, conn, addr, verbose)
+                    waiting.remove(colour)
+                    Protocol._unwatch(selector, watches.pop(colour))
+
+                for colour in list(waiting):
+                    t = Protocol.sockets[colour]['thread']
+                    if (t.poll() is not None):
+                        if (verbose):
+                            print(
+                                f"{Protocol.sockets[colour]['name']} exited " +
+                                f"with code {t.poll()} before connecting."
+                            )
+                        waiting.remove(colour)
+                        Protocol._unwatch(selector, watches.pop(colour))
+        finally:
+            for watch in watches.values():
+                Protocol._unwatch(selector, watch)
+            selector.close()
+
+        connected = {}
+        for colour in pending:
+            connected[colour] = Protocol.sockets[colour]['conn'] is not None
+            if (colour in waiting and verbose):
+                print(f"{Protocol.sockets[colour]['name']} never connected.")
+        return connected
+
+    @staticmethod
+    def _connected(colour, conn, addr, verbose=False):
+        """Records the connection of an agent."""
+
+        # agents often get two messages in a row, with Nagle's algorithm
+        # the second waits on their delayed acknowledgement of the first
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        name = Protocol.sockets[colour]['name']
+        connect_time = time_ns() - Protocol.sockets[colour]['launch_time']
         Protocol.sockets[colour]['conn'] = conn
         Protocol.sockets[colour]['addr'] = addr
+        if (Protocol.metrics is not None):
+            Protocol.metrics.record_connect(name, connect_time)
+        if verbose:
+            print(f"Connected {name} at {addr}")
+
+    @staticmethod
+    def _exit_watch(process):
+        """Returns (descriptor, owned) where the descriptor becomes
+        readable once process exits, and owned says it must be closed
+        after use. The descriptor is None where there is none to watch.
+        """
+
+        if (hasattr(process, "exit_fileno")):
+            fd = process.exit_fileno()
+            return (fd if fd >= 0 else None, False)
+        try:
+            return (os.pidfd_open(process.pid), True)
+        except (AttributeError, OSError):
+            return (None, False)
+
+    @staticmethod
+    def _unwatch(selector, watch):
+        """Stops watching an exit descriptor from _exit_watch."""
+
+        fd, owned = watch
+        if (fd is None):
+            return
+        try:
+            selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        if (owned):
+            os.close(fd)
+
+    @staticmethod
+    def identifies_connections():
+        """Checks whether _connection_owner works on this system, so that
+        both agents can be started at once. The server must be listening.
+        This process connects to it and looks its own end of the
+        connection up the way an agent's would be.
+        """
+
+        pid = os.getpid()
+        if (not os.path.exists(
+            f"{ProcessClock.PROC}/{pid}/task/{pid}/children"
+        )):
+            return False
+        try:
+            probe = socket.create_connection(
+                (Protocol.HOST, Protocol.PORT), timeout=1
+            )
+        except OSError:
+            return False
+        try:
+            Protocol.s.settimeout(1)
+            conn, addr = Protocol.s.accept()
+            conn.close()
+            target = Protocol._connection_socket(addr)
+            return target is not None and Protocol._owns(pid, target)
+        except OSError:
+            return False
+        finally:
+            Protocol.s.settimeout(socket.getdefaulttimeout())
+            probe.close()
+
+    @staticmethod
+    def _connection_owner(addr, colours):
+        """Returns which of the agents of colours opened the connection
+        from addr, or None if that can not be told.
+        """
+
+        target = Protocol._connection_socket(addr)
+        if (target is None):
+            return None
+        for colour in colours:
+            if (Protocol._owns(Protocol.sockets[colour]['thread'].pid, target)):
+                return colour
+        return None
+
+    @staticmethod
+    def _connection_socket(addr):
+        """Returns the "socket:[inode]" link of the client end of the
+        connection from addr, found in /proc/net/tcp, or None.
+        """
 
-        return conn is not None
+        try:
+            with open(f"{ProcessClock.PROC}/net/tcp") as f:
+                for line in f.readlines()[1:]:
+                    fields = line.split()
+                    local_port = int(fields[1].split(":")[1], 16)
+                    remote_port = int(fields[2].split(":")[1], 16)
+                    if (local_port == addr[1] and remote_port == Protocol.PORT):
+                        return f"socket:[{fields[9]}]"
+        except (OSError, IndexError, ValueError):
+            return None
+        return None
 
     @staticmethod
-    def get_message(colour, timeout_ns=30*10**9, verbose=False):
+    def _owns(pid, target):
+        """Checks if process pid or one of its descendants has the socket
+        target open.
+        """
+
+        pending = [pid]
+        while (len(pending) > 0):
+            pid = pending.pop()
+            try:
+                fd_path = f"{ProcessClock.PROC}/{pid}/fd"
+                for fd in os.listdir(fd_path):
+                    if (os.readlink(f"{fd_path}/{fd}") == target):
+                        return True
+            except OSError:
+                continue
+            pending += ProcessClock._children(pid)
+        return False
+
+    @staticmethod
+    def get_message(
+        colour,
+        timeout_ns=30*10**9,
+        verbose=False,
+        cpu_timeout_ns=None
+    ):
         """Waits for a message from the given colour agent for the specified
-        length of time. Returns the text and the associated wait time.
+        length of time. If cpu_timeout_ns is given, it also stops waiting
+        once the agent's processes have used that much CPU time. Returns
+        the text, the associated wait time and the CPU time used meanwhile,
+        or -1 if that could not be read. Returns ("NO MESSAGE", -1, -1) if
+        nothing arrived.
         """
 
         try:
-            Protocol.sockets[colour]['conn'].settimeout(timeout_ns/10**9)
+            conn = Protocol.sockets[colour]['conn']
+            pid = Protocol.sockets[colour]['thread'].pid
+            cpu_time = ProcessClock.cpu_time(pid)
             move_time = time_ns()
-            data = Protocol.sockets[colour]['conn'].recv(1024)
+            deadline = move_time + timeout_ns
+            while (True):
+                wait = deadline - time_ns()
+                if (cpu_timeout_ns is not None and cpu_time is not None):
+                    wait = min(wait, Protocol.CPU_POLL_NS)
+                if (wait <= 0):
+                    raise socket.timeout()
+                conn.settimeout(wait/10**9)
+                try:
+                    data = conn.recv(1024)
+                    break
+                except socket.timeout:
+                    if (time_ns() >= deadline):
+                        raise
+                    used = ProcessClock.cpu_time(pid)
+                    if (used is None or used - cpu_time >= cpu_timeout_ns):
+                        raise
             move_time = time_ns() - move_time
+            cpu_end = ProcessClock.cpu_time(pid)
+            if (cpu_time is None or cpu_end is None):
+                cpu_time = -1
+            else:
+                cpu_time = cpu_end - cpu_time
             Protocol.sockets[colour]['conn'].settimeout(
                 socket.getdefaulttimeout()
             )
@@ -104,19 +379,24 @@ class Protocol():
                     f"{Protocol.sockets[colour]['name']} timed out. " +
                     "Nothing received."
                 )
-            return ("NO MESSAGE", -1)
+            return ("NO MESSAGE", -1, -1)
         except ConnectionResetError:
             if verbose:
                 print(
                     f"{Protocol.sockets[colour]['name']} disconnected early.")
-            return ("NO MESSAGE", -1)
+            return ("NO MESSAGE", -1, -1)
         except Exception:
             if verbose:
                 print(
                     f"{Protocol.sockets[colour]['name']} socket " +
                     "ended unexpectedly."
                 )
-            return ("NO MESSAGE", -1)
+            return ("NO MESSAGE", -1, -1)
+
+        if (Protocol.metrics is not None):
+            Protocol.metrics.record_received(
+                Protocol.sockets[colour]['name'], len(data)
+            )
 
         if verbose:
             print(
@@ -125,14 +405,19 @@ class Protocol():
                 f"~{int(move_time/10**4)/10**5}s."
             )
 
-        return (data.decode("utf-8"), move_time)
+        return (data.decode("utf-8"), move_time, cpu_time)
 
     @staticmethod
     def send_message(colour, message, verbose=False):
         """Sends the specified message to the specified colour agent."""
 
         try:
-            Protocol.sockets[colour]['conn'].sendall(bytes(message, "utf-8"))
+            data = bytes(message, "utf-8")
+            Protocol.sockets[colour]['conn'].sendall(data)
+            if (Protocol.metrics is not None):
+                Protocol.metrics.record_sent(
+                    Protocol.sockets[colour]['name'], len(data)
+                )
             if verbose:
                 print("Sent", message, end="")
 
@@ -193,6 +478,9 @@ class Protocol():
             if (verbose):
                 print("Socket was not open.")
 
+        # forget the agents so another match can run in this process
+        Protocol.sockets = {Colour.RED: {}, Colour.BLUE: {}}
+
 
 if __name__ == "__main__":
     commands = [
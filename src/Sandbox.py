@@ -0,0 +1,141 @@
+import os
+from sys import platform
+
+
+class Sandbox():
+    """Describes the resources an agent may use, so several matches can
+    share a machine predictably. Every limit is optional:
+    * cpus: the set of cores the agent's processes are pinned to.
+    * threads: a hint for how many threads the agent should run, exported
+    as HEX_THREADS and the usual OMP/BLAS variables. It defaults to the
+    number of pinned cores.
+    * memory: an address space cap in bytes, applied with RLIMIT_AS to
+    each of the agent's processes. Virtual memory counts, so multithreaded
+    engines need headroom for their thread stacks and malloc arenas.
+    * nice: the niceness the agent runs at.
+    Limits are applied in the child between fork and exec, so they are
+    inherited by anything the agent starts. They are ignored on Windows.
+    """
+
+    THREAD_VARIABLES = [
+        "HEX_THREADS",
+        "OMP_NUM_THREADS",
+        "OPENBLAS_NUM_THREADS",
+        "MKL_NUM_THREADS"
+    ]
+
+    def __init__(self, cpus=None, threads=None, memory=None, nice=None):
+        self.cpus = set(cpus) if cpus else None
+        self.threads = threads
+        if (self.threads is None and self.cpus is not None):
+            self.threads = len(self.cpus)
+        self.memory = memory
+        self.nice = nice
+
+    def __repr__(self):
+        return (
+            f"Sandbox(cpus={Sandbox.format_cpus(self.cpus)}, " +
+            f"threads={self.threads}, memory={self.memory}, nice={self.nice})"
+        )
+
+    @staticmethod
+    def parse_cpus(string):
+        """Parses a list of cores such as "0-3,8,10-11"."""
+
+        cpus = set()
+        for part in string.split(","):
+            if ("-" in part):
+                first, last = part.split("-")
+                cpus.update(range(int(first), int(last) + 1))
+            elif (part != ""):
+                cpus.add(int(part))
+        return cpus
+
+    @staticmethod
+    def format_cpus(cpus):
+        """Inverse of parse_cpus."""
+
+        if (not cpus):
+            return ""
+        ranges = []
+        for cpu in sorted(cpus):
+            if (len(ranges) > 0 and ranges[-1][1] == cpu - 1):
+                ranges[-1][1] = cpu
+            else:
+                ranges.append([cpu, cpu])
+        return ",".join(
+            str(a) if a == b else f"{a}-{b}" for a, b in ranges
+        )
+
+    @staticmethod
+    def parse_memory(string):
+        """Parses a size in bytes with an optional K, M or G suffix."""
+
+        units = {"K": 2**10, "M": 2**20, "G": 2**30}
+        string = string.strip().upper().rstrip("B")
+        if (string[-1] in units):
+            return int(float(string[:-1]) * units[string[-1]])
+        return int(string)
+
+    @staticmethod
+    def available_cpus():
+        """Returns the cores this process may run on."""
+
+        try:
+            return os.sched_getaffinity(0)
+        except AttributeError:
+            return set(range(os.cpu_count() or 1))
+
+    def env(self, base=None):
+        """Returns the environment for the agent: base, or this process's
+        environment, with the thread hints set.
+        """
+
+        env = dict(os.environ if base is None else base)
+        if (self.threads is not None):
+            for variable in Sandbox.THREAD_VARIABLES:
+                env[variable] = str(self.threads)
+        return env
+
+    def apply(self):
+        """Applies the limits to the calling process. Meant to run in the
+        child as Popen's preexec_fn, errors there abort the launch.
+        """
+
+        if (self.cpus is not None):
+            os.sched_setaffinity(0, self.cpus)
+        if (self.memory is not None):
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory, self.memory))
+        if (self.nice is not None):
+            os.nice(self.nice)
+
+    def popen_args(self, env=None):
+        """Returns the keyword arguments that start a Popen in this
+        sandbox, on top of the environment env.
+        """
+
+        args = {"env": self.env(env)}
+        if (platform != "win32"):
+            args["preexec_fn"] = self.apply
+        return args
+
+
+if (__name__ == "__main__"):
+    import subprocess
+
+    sandbox = Sandbox(
+        cpus=Sandbox.parse_cpus("0"),
+        memory=Sandbox.parse_memory("512M"),
+        nice=5
+    )
+    print(sandbox)
+    subprocess.run(
+        [
+            "python3", "-c",
+            "import os, resource; print(os.sched_getaffinity(0), " +
+            "os.environ['HEX_THREADS'], os.nice(0), " +
+            "resource.getrlimit(resource.RLIMIT_AS))"
+        ],
+        **sandbox.popen_args()
+    )
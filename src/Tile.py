@@ -11,6 +11,34 @@ class Tile:
     I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
     J_DISPLACEMENTS = [0, 1, 1, 0, -1, -1]
 
+    # neighbour coordinate tables cached per board size
+    _neighbour_tables = {}
+
+    @staticmethod
+    def get_neighbour_table(board_size):
+        """Returns a table where [x][y] holds the coordinates of the on-board
+        neighbours of tile x,y, built once per board size. The ordering
+        matches the agents' HexTables.
+        """
+
+        table = Tile._neighbour_tables.get(board_size)
+        if (table is None):
+            table = []
+            for x in range(board_size):
+                line = []
+                for y in range(board_size):
+                    neighbours = []
+                    for idx in range(Tile.NEIGHBOUR_COUNT):
+                        x_n = x + Tile.I_DISPLACEMENTS[idx]
+                        y_n = y + Tile.J_DISPLACEMENTS[idx]
+                        if (x_n >= 0 and x_n < board_size and
+                                y_n >= 0 and y_n < board_size):
+                            neighbours.append((x_n, y_n))
+                    line.append(tuple(neighbours))
+                table.append(line)
+            Tile._neighbour_tables[board_size] = table
+        return table
+
     def __init__(self, x, y, colour=None):
         super().__init__()
 
@@ -0,0 +1,230 @@
+"""This script runs a round robin tournament, several matches at a time.
+
+Usage: python3 src/Tournament.py config.json
+
+The config is a JSON object. Only "agents" is required:
+* "agents": a list of {"name": ..., "run string": ...}.
+* "board_size": the board size (default 11).
+* "rounds": how many times each pair plays with each colour (default 1).
+* "cpus_per_agent": the cores each agent is pinned to (default 1).
+* "slots": how many matches run at once. Defaults to as many as the
+available cores allow. Available cores are the ones this process may run
+on and, inside a cgroup with a CPU quota, no more than the quota.
+* "memory": the address space cap of each agent process, eg. "4G".
+* "nice": the niceness agents run at.
+* "clock": "wall", "cpu" or "both", see Hex.py (default "cpu", which keeps
+results fair while matches share the machine).
+* "base_port": matches use consecutive ports from here (default 1234).
+Agents must connect to the port in HEX_PORT; those that always use 1234
+need "slots": 1.
+* "results": a file that gets one JSON line per match
+(default tournament.jsonl).
+* "forkserver": true forks Python agents from preloaded servers, see
+src/Launcher.py.
+* "timeout": seconds after which a match that has not ended is killed
+with its agents and counted with no winner (default the longest a match
+can last under its clock, plus a minute).
+
+Each slot owns its own cores and port. Its matches run one after the
+other through src/main.py, with each agent pinned to half of the slot's
+cores and told to use that many threads.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import permutations
+from math import ceil
+from os.path import realpath, sep
+from queue import Empty, Queue
+from threading import Lock
+
+from EndState import EndState
+from Game import Game
+from Sandbox import Sandbox
+
+
+class Tournament():
+    """Schedules the matches of a round robin over slots, each with its
+    own cores and port, and collects the results.
+    """
+
+    def __init__(self, config):
+        self._agents = config["agents"]
+        self._board_size = config.get("board_size", 11)
+        self._rounds = config.get("rounds", 1)
+        self._cpus_per_agent = config.get("cpus_per_agent", 1)
+        self._memory = config.get("memory")
+        self._nice = config.get("nice")
+        self._clock = config.get("clock", "cpu")
+        self._base_port = config.get("base_port", 1234)
+        self._results_path = config.get("results", "tournament.jsonl")
+        self._forkserver = config.get("forkserver", False)
+
+        longest = 2 * Game.MAXIMUM_TIME / 10**9
+        if (self._clock == "cpu"):
+            longest *= Game.WALL_SLACK
+        self._timeout = config.get("timeout", longest + 60)
+
+        cpus = sorted(Sandbox.available_cpus())
+        quota = Tournament.cpu_quota()
+        if (quota is not None):
+            cpus = cpus[:max(1, ceil(quota))]
+        per_slot = 2 * self._cpus_per_agent
+        self._slots = config.get("slots", max(1, len(cpus) // per_slot))
+        if (self._slots * per_slot > len(cpus)):
+            print(
+                f"NOTICE: {self._slots} slots need {self._slots * per_slot} " +
+                f"cores but {len(cpus)} are available. Cores will be shared."
+            )
+
+        # each slot's (red cores, blue cores), wrapping around if short
+        self._slot_cpus = []
+        for k in range(self._slots):
+            slot = [cpus[(k * per_slot + i) % len(cpus)] for i in range(per_slot)]
+            self._slot_cpus.append((
+                set(slot[:self._cpus_per_agent]),
+                set(slot[self._cpus_per_agent:])
+            ))
+
+        self._lock = Lock()
+        self._results = []
+
+    @staticmethod
+    def cpu_quota():
+        """Returns the number of cores the cgroup v2 CPU quota allows, or
+        None if there is no quota.
+        """
+
+        try:
+            with open("/sys/fs/cgroup/cpu.max") as f:
+                quota, period = f.read().split()
+            if (quota == "max"):
+                return None
+            return int(quota) / int(period)
+        except (OSError, ValueError):
+            return None
+
+    def matches(self):
+        """Returns every (red, blue) pairing, rounds times."""
+
+        return [
+            pair for k in range(self._rounds)
+            for pair in permutations(self._agents, 2)
+        ]
+
+    def _command(self, slot, red, blue):
+        main_path = sep.join(realpath(__file__).split(sep)[:-1])
+        main_path += f"{sep}main.py"
+
+        red_cpus, blue_cpus = self._slot_cpus[slot]
+        command = [
+            sys.executable, main_path,
+            f"agent={red['name']};{red['run string']}",
+            f"agent={blue['name']};{blue['run string']}",
+            f"board_size={self._board_size}",
+            f"clock={self._clock}",
+            f"port={self._base_port + slot}",
+            f"cpus={Sandbox.format_cpus(red_cpus)}:" +
+            f"{Sandbox.format_cpus(blue_cpus)}",
+            "-k"
+        ]
+        if (self._memory is not None):
+            command.append(f"memory={self._memory}")
+        if (self._nice is not None):
+            command.append(f"nice={self._nice}")
+        if (self._forkserver):
+            command.append("-forkserver")
+        return command
+
+    def _play(self, slot, red, blue):
+        """Plays one match in slot, returns its result."""
+
+        # in its own session, so a stuck match can be killed with its agents
+        process = subprocess.Popen(
+            self._command(slot, red, blue),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            start_new_session=True
+        )
+        try:
+            stderr = process.communicate(timeout=self._timeout)[1]
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            stderr = ""
+
+        # Game ends by printing the end state, then "won time turns" for
+        # Red and for Blue
+        result = {
+            "red": red["name"],
+            "blue": blue["name"],
+            "winner": None,
+            "status": EndState.get_text(None)
+        }
+        lines = stderr.strip().split("\n")[-3:]
+        if (len(lines) == 3 and len(lines[1].split()) == 3):
+            result["status"] = lines[0]
+            for colour, line in zip(["red", "blue"], lines[1:]):
+                won, time, turns = line.split()
+                result[f"{colour}_time"] = int(time)
+                result[f"{colour}_turns"] = int(turns)
+                if (won == "True"):
+                    result["winner"] = result[colour]
+        return result
+
+    def _worker(self, slot, queue):
+        while (True):
+            try:
+                red, blue = queue.get_nowait()
+            except Empty:
+                return
+            result = self._play(slot, red, blue)
+            with self._lock:
+                self._results.append(result)
+                with open(self._results_path, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+                print(
+                    f"[{len(self._results)}] {result['red']} vs " +
+                    f"{result['blue']}: {result['winner']} " +
+                    f"({result['status']})"
+                )
+
+    def run(self):
+        """Plays every match, returns the results."""
+
+        queue = Queue()
+        for pair in self.matches():
+            queue.put(pair)
+
+        with ThreadPoolExecutor(max_workers=self._slots) as executor:
+            for slot in range(self._slots):
+                executor.submit(self._worker, slot, queue)
+        return self._results
+
+    def standings(self):
+        """Returns (name, wins, games) sorted by wins."""
+
+        wins = {agent["name"]: [0, 0] for agent in self._agents}
+        for result in self._results:
+            for colour in ["red", "blue"]:
+                wins[result[colour]][1] += 1
+            if (result["winner"] is not None):
+                wins[result["winner"]][0] += 1
+        return sorted(
+            [(name, w, g) for name, (w, g) in wins.items()],
+            key=lambda x: -x[1]
+        )
+
+
+if (__name__ == "__main__"):
+    if (len(sys.argv) < 2):
+        print("Usage: python3 src/Tournament.py config.json")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        tournament = Tournament(json.load(f))
+    tournament.run()
+    for name, wins, games in tournament.standings():
+        print(f"{name:<24} {wins:>4} / {games}")
@@ -3,13 +3,20 @@
 This is effectively what starts the game. This script may work when run
 directly, with the same specification as Hex.py, but it is not recommended.
 """
-from sys import argv, platform
+from sys import argv as command_line, platform
 from os.path import realpath, sep
 
 from Game import Game
+from Sandbox import Sandbox
 
 
-def main():
+def main(argv=None):
+    """Runs a match. argv holds the arguments as listed in Hex.py, after
+    the script's name, and defaults to the command line.
+    """
+    if (argv is None):
+        argv = command_line
+
     verbose = ("-v" in argv or "-verbose" in argv)
     log = ("-l" in argv or "-log" in argv)
     print_protocol = ("-p" in argv or "-print_protocol" in argv)
@@ -17,11 +24,49 @@ def main():
     silent_bots = ("-sb" in argv or "-silent_bots" in argv)
     java_ref_agent = ("-j" in argv or "-java" in argv)
     double = ("-d" in argv or "-double" in argv)
+    forkserver = ("-fs" in argv or "-forkserver" in argv)
 
     board_size = 11
+    metrics_path = None
+    clock = "wall"
+    port = None
+    # sandbox limits, cpus holds one set per agent
+    cpus = [None, None]
+    threads, memory, nice = None, None, None
     agents = []
 
     for argument in argv:
+        if (argument.startswith("metrics=")):
+            metrics_path = argument.split("=", 1)[1]
+            continue
+        if (argument.startswith("clock=")):
+            clock = argument.split("=", 1)[1]
+            if (clock not in Game.CLOCKS):
+                print(
+                    "ERROR: Clock must be one of",
+                    ", ".join(Game.CLOCKS) + ". Aborted."
+                )
+                return
+            continue
+        if (argument.split("=")[0] in ["cpus", "threads", "memory", "nice", "port"]):
+            key, value = argument.split("=", 1)
+            try:
+                if (key == "cpus"):
+                    # "0-1:2-3" pins each agent, "0-3" pins both to the same cores
+                    sets = [Sandbox.parse_cpus(x) for x in value.split(":")]
+                    cpus = sets * 2 if len(sets) == 1 else sets[:2]
+                elif (key == "threads"):
+                    threads = int(value)
+                elif (key == "memory"):
+                    memory = Sandbox.parse_memory(value)
+                elif (key == "nice"):
+                    nice = int(value)
+                elif (key == "port"):
+                    port = int(value)
+            except Exception as e:
+                print(f"ERROR: {key} argument is not in valid format. Aborted.")
+                return
+            continue
         if ("agent=" in argument or "a=" in argument):
             agents.append(argument)
         if ("board_size=" in argument or "b=" in argument):
@@ -95,6 +140,10 @@ def main():
     if ("-switch" in argv or "-s" in argv):
         player1, player2 = player2, player1
 
+    if (cpus != [None, None] or threads or memory or nice is not None):
+        player1["sandbox"] = Sandbox(cpus[0], threads, memory, nice)
+        player2["sandbox"] = Sandbox(cpus[1], threads, memory, nice)
+
     g = Game(
         board_size=board_size,
         player1=player1, player2=player2,
@@ -102,7 +151,11 @@ def main():
         log=log,
         print_protocol=print_protocol,
         kill_bots=kill_bots,
-        silent_bots=silent_bots
+        silent_bots=silent_bots,
+        metrics_path=metrics_path,
+        clock=clock,
+        port=port,
+        forkserver=forkserver
     )
     g.run()
 